@@ -4,6 +4,18 @@ Purpose: Automatically categorize expenses based on merchant names
 Uses: Rule-based logic with ML-ready structure for future enhancement
 """
 
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from category_cache import CategoryCache, normalize_merchant
+from keyword_matcher import KeywordMatcher
+from merchant_classifier import MerchantClassifier
+from merchant_index import canonical_name
+
 class ExpenseCategorizer:
     """
     Categorizes expenses into predefined categories based on merchant names.
@@ -45,14 +57,49 @@ class ExpenseCategorizer:
     }
     
 
-    
-    def __init__(self):
-        """Initialize with Gemini API"""
-        import os
+    # Merchants sent to the LLM per bulk prompt
+    LLM_BATCH_SIZE = 50
+    # Manual corrections outweigh ordinary training examples
+    CORRECTION_WEIGHT = 3.0
+    # Save the local model after this many incremental updates
+    SAVE_EVERY = 50
+    # Compiled per-user rule matchers and correction maps kept in memory (LRU)
+    MAX_USER_MATCHERS = 256
+    # Per-user correction models kept in memory (LRU); each is a dense
+    # MerchantClassifier, so fewer of them
+    MAX_USER_MODELS = 64
+    # A user's model predicts once it has corrections in two categories
+    USER_MODEL_MIN_SAMPLES = 2 * CORRECTION_WEIGHT
+
+    def __init__(self, cache=None, classifier=None, rule_store=None, merchant_index=None, user_model_dir=None):
+        """
+        Initialize with Gemini API
+        Args:
+            cache (CategoryCache) - Merchant -> category cache (default from env)
+            classifier (MerchantClassifier) - Local model (default loaded from MERCHANT_MODEL_PATH)
+            rule_store (FirebaseService) - Persistence for per-user custom rules
+            merchant_index (MerchantIndex) - Canonical merchant ids used as cache keys
+            user_model_dir (str) - Directory for per-user correction models
+                (default MERCHANT_MODEL_DIR or 'merchant_models')
+        """
         import google.generativeai as genai
         
         self.api_key = os.getenv('GOOGLE_GEMINI_API_KEY')
         self.use_ai = False
+        self.cache = cache if cache is not None else CategoryCache.from_env()
+        self.classifier = classifier if classifier is not None else \
+            MerchantClassifier(os.getenv('MERCHANT_MODEL_PATH', 'merchant_classifier.npz'))
+        self.llm_calls = 0
+        self.tier_counts = {'cache': 0, 'rules': 0, 'model': 0, 'llm': 0, 'fallback': 0}
+        self._matcher = None
+        self._unsaved = 0
+        self.rule_store = rule_store
+        self.merchant_index = merchant_index
+        self._user_matchers = OrderedDict()  # user_id -> KeywordMatcher or None (no custom rules)
+        self._user_corrections = OrderedDict()  # user_id -> { canonical merchant: category }
+        self._user_models = OrderedDict()       # user_id -> MerchantClassifier trained on their corrections
+        self.user_model_dir = user_model_dir or os.getenv('MERCHANT_MODEL_DIR', 'merchant_models')
+        self._user_lock = threading.Lock()
         
         if self.api_key and len(self.api_key) > 20:
             try:
@@ -63,67 +110,404 @@ class ExpenseCategorizer:
             except Exception as e:
                 print(f"⚠️ AI Categorizer init failed: {e}")
 
-    def categorize(self, merchant_name):
+    def categorize(self, merchant_name, user_id=None):
         """
-        Categorize expense using AI, falling back to rules.
+        Categorize expense: the user's own rules, cache, default rules and
+        the local model first, then the LLM only for merchants none of them
+        resolves confidently.
         """
         if not merchant_name:
             return 'Uncategorized'
-            
-        # 1. Try AI first
-        if self.use_ai:
+
+        category, guess, cached = self._resolve_locally(merchant_name, user_id)
+        if category:
+            return category
+
+        # 'Other' is cached too: the model had no category, so don't ask again
+        if self.use_ai and cached is None:
+            category = self._llm_categorize(merchant_name)
+            if category:
+                return category
+
+        self.tier_counts['fallback'] += 1
+        return guess or 'Uncategorized'
+
+    def _resolve_locally(self, merchant_name, user_id=None):
+        """
+        Tiers that need no LLM: user rules, cache, default keyword rules,
+        confident local model.
+        Returns: tuple - (category or None, low-confidence model guess, cached value)
+        """
+        category = self._match_user_rules(merchant_name, user_id)
+        if category:
+            self.tier_counts['rules'] += 1
+            return category, None, None
+
+        # The user's own correction model outranks answers shared across users
+        user_model = self._user_model(user_id)
+        if user_model is not None:
+            predicted, confidence = user_model.predict(merchant_name)
+            if predicted and confidence >= user_model.MIN_CONFIDENCE:
+                self.tier_counts['model'] += 1
+                return predicted, None, None
+
+        cached = self.cache.get(self.merchant_key(merchant_name))
+        if cached in self.CATEGORY_RULES:
+            self.tier_counts['cache'] += 1
+            return cached, None, cached
+
+        category = self.match_rules(merchant_name)
+        if category != 'Uncategorized':
+            self.tier_counts['rules'] += 1
+            return category, None, cached
+
+        predicted, confidence = self.classifier.predict(merchant_name)
+        if predicted in self.CATEGORY_RULES and confidence >= self.classifier.MIN_CONFIDENCE:
+            self.tier_counts['model'] += 1
+            return predicted, None, cached
+        return None, predicted if predicted in self.CATEGORY_RULES else None, cached
+
+    def _llm_categorize(self, merchant_name):
+        """
+        Single-merchant LLM call. Valid answers are cached and train the local model.
+        Returns: str or None
+        """
+        try:
+            self.llm_calls += 1
+            prompt = (
+                f"Categorize this transaction merchant: '{merchant_name}' "
+                f"into one of these exact categories: "
+                f"{', '.join(self.CATEGORY_RULES.keys())}, Other. "
+                f"Return ONLY the category word."
+            )
+            response = self.model.generate_content(prompt)
+            category = response.text.strip().replace('.', '')
+        except Exception as e:
+            return None # Fallback silent
+
+        if category in self.CATEGORY_RULES or category == 'Other':
+            self.cache.set(self.merchant_key(merchant_name), category)
+        if category in self.CATEGORY_RULES:
+            self.tier_counts['llm'] += 1
+            self.learn([merchant_name], [category])
+            return category
+        return None
+
+    def quick_categorize(self, merchant_name, user_id=None):
+        """
+        Category available without an LLM call (cache, rules, local model).
+        Returns: tuple - (category, needs_refinement) where needs_refinement
+                 is True if the LLM could still improve the answer
+        """
+        if not merchant_name:
+            return 'Uncategorized', False
+        category, guess, cached = self._resolve_locally(merchant_name, user_id)
+        if category:
+            return category, False
+        return guess or 'Uncategorized', self.use_ai and cached is None
+
+    # ========================================================================
+    # LOCAL MODEL TRAINING
+    # ========================================================================
+
+    def learn(self, merchants, categories, weight=1.0):
+        """
+        Incrementally train the local model; saved every SAVE_EVERY examples.
+        Returns: int - Examples used
+        """
+        used = self.classifier.partial_fit(merchants, categories, weight)
+        self._unsaved += used
+        if self._unsaved >= self.SAVE_EVERY:
+            self.classifier.save()
+            self._unsaved = 0
+        return used
+
+    def train_from_expenses(self, expenses):
+        """
+        Train the local model on already categorized expenses.
+        Args: expenses (list) - Expense records with merchant and category
+        Returns: int - Examples used
+        """
+        labelled = [
+            (e.get('merchant'), e.get('category')) for e in expenses
+            if e.get('merchant') and e.get('category') in self.CATEGORY_RULES and not e.get('category_pending')
+        ]
+        if not labelled:
+            return 0
+        merchants, categories = zip(*labelled)
+        return self.learn(merchants, categories)
+
+    def record_correction(self, merchant_name, category, user_id=None):
+        """
+        Learn from a user's manual category fix. With a rule store the fix
+        is saved as that user's exact correction for the canonical merchant
+        name: it applies to their future expenses from the same merchant only
+        (never as a substring of other names) and replaces any earlier
+        correction of it. It also trains that user's own correction model
+        with extra weight, which generalizes to other spellings of merchants
+        they keep correcting. Without a rule store (single-user setups) it
+        overrides the shared cache and trains the shared local model instead.
+        Returns: str - The canonical merchant name recorded, or None
+        """
+        keyword = canonical_name(merchant_name)
+        if not keyword:
+            return None
+        if self.rule_store is not None and user_id is not None:
+            self.rule_store.save_category_correction(keyword, category, user_id)
+            with self._user_lock:
+                self._user_corrections.pop(user_id, None)
+            model = self._user_model(user_id)
+            model.partial_fit([merchant_name], [category], self.CORRECTION_WEIGHT)
             try:
-                prompt = (
-                    f"Categorize this transaction merchant: '{merchant_name}' "
-                    f"into one of these exact categories: "
-                    f"{', '.join(self.CATEGORY_RULES.keys())}, Other. "
-                    f"Return ONLY the category word."
-                )
-                response = self.model.generate_content(prompt)
-                category = response.text.strip().replace('.', '')
-                
-                # Check if valid category returned
-                if category in self.CATEGORY_RULES:
-                    return category
-            except Exception as e:
-                pass # Fallback silent
+                os.makedirs(self.user_model_dir, exist_ok=True)
+                model.save()
+            except OSError as e:
+                print(f"⚠️ Could not save correction model for {user_id}: {e}")
+            return keyword
 
-        # 2. Fallback to Rule-based logic
-        normalized_name = merchant_name.lower().strip()
-        
-        for category, keywords in self.CATEGORY_RULES.items():
-            for keyword in keywords:
-                if keyword in normalized_name:
-                    return category
-        
-        return 'Uncategorized'
+        if category in self.CATEGORY_RULES:
+            self.cache.set(self.merchant_key(merchant_name), category, source='user')
+            self.classifier.partial_fit([merchant_name], [category], self.CORRECTION_WEIGHT)
+            self.classifier.save()
+            self._unsaved = 0
+        return keyword
+
+    def merchant_key(self, merchant_name):
+        """Cache key: the canonical merchant id when an index is set, so spellings share one entry."""
+        if self.merchant_index is None:
+            return merchant_name
+        return self.merchant_index.resolve(merchant_name) or merchant_name
+
+    def match_rules(self, merchant_name, user_id=None):
+        """
+        Rule-based category: every keyword is matched in one pass over the
+        name; on several matches the category listed first wins. A user's
+        custom rules take precedence over the defaults.
+        Returns: str - Category or 'Uncategorized'
+        """
+        category = self._match_user_rules(merchant_name, user_id)
+        if category:
+            return category
+        if self._matcher is None:
+            self._matcher = KeywordMatcher(self.CATEGORY_RULES)
+        return self._matcher.match(merchant_name.strip()) or 'Uncategorized'
+
+    # ========================================================================
+    # PER-USER RULES
+    # ========================================================================
+
+    def _match_user_rules(self, merchant_name, user_id):
+        """
+        Category from the user's own corrections (exact canonical merchant
+        name) or, failing that, the keyword rules they entered.
+        Returns: str or None
+        """
+        if user_id is None or self.rule_store is None:
+            return None
+        category = self._corrections(user_id).get(canonical_name(merchant_name))
+        if category:
+            return category
+        user_matcher = self._user_matcher(user_id)
+        return user_matcher.match(merchant_name) if user_matcher is not None else None
+
+    def _corrections(self, user_id):
+        """
+        A user's { canonical merchant: category } corrections, loaded from
+        the rule store on first use and kept in a bounded LRU.
+        """
+        with self._user_lock:
+            if user_id in self._user_corrections:
+                self._user_corrections.move_to_end(user_id)
+                return self._user_corrections[user_id]
+
+        corrections = self.rule_store.get_category_corrections(user_id)
+        with self._user_lock:
+            self._user_corrections[user_id] = corrections
+            while len(self._user_corrections) > self.MAX_USER_MATCHERS:
+                self._user_corrections.popitem(last=False)
+        return corrections
+
+    def _user_matcher(self, user_id):
+        """
+        Compiled matcher for a user's custom rules, loaded from the rule store
+        on first use and kept in a bounded LRU.
+        Returns: KeywordMatcher or None if the user has no custom rules
+        """
+        if user_id is None or self.rule_store is None:
+            return None
+        with self._user_lock:
+            if user_id in self._user_matchers:
+                self._user_matchers.move_to_end(user_id)
+                return self._user_matchers[user_id]
+
+        rules = self.rule_store.get_category_rules(user_id)
+        matcher = KeywordMatcher(rules) if rules else None
+        with self._user_lock:
+            self._user_matchers[user_id] = matcher
+            while len(self._user_matchers) > self.MAX_USER_MATCHERS:
+                self._user_matchers.popitem(last=False)
+        return matcher
+
+    def _user_model(self, user_id):
+        """
+        A user's correction model, loaded from user_model_dir on first use
+        and kept in a bounded LRU.
+        Returns: MerchantClassifier or None without a user or rule store
+        """
+        if user_id is None or self.rule_store is None:
+            return None
+        with self._user_lock:
+            if user_id in self._user_models:
+                self._user_models.move_to_end(user_id)
+                return self._user_models[user_id]
+
+        name = hashlib.sha256(str(user_id).encode('utf-8')).hexdigest()[:32]
+        model = MerchantClassifier(os.path.join(self.user_model_dir, f"{name}.npz"),
+                                   min_samples=self.USER_MODEL_MIN_SAMPLES)
+        with self._user_lock:
+            model = self._user_models.setdefault(user_id, model)
+            self._user_models.move_to_end(user_id)
+            while len(self._user_models) > self.MAX_USER_MODELS:
+                self._user_models.popitem(last=False)
+        return model
+
+    def get_custom_rules(self, user_id):
+        """Returns: dict - The user's { category: [keywords] }"""
+        if self.rule_store is None:
+            return {}
+        return self.rule_store.get_category_rules(user_id)
     
-    def get_all_categories(self):
+    def get_metrics(self):
+        """
+        Cache hit rates and LLM call count.
+        Returns: dict
+        """
+        return {
+            **self.cache.stats(),
+            'llm_calls': self.llm_calls,
+            'tiers': dict(self.tier_counts),
+            'model_samples': self.classifier.sample_count,
+        }
+
+    def get_all_categories(self, user_id=None):
         """
         Get all available expense categories
-        Returns: list of category names
+        Returns: list of category names (defaults, then the user's own)
         """
-        return list(self.CATEGORY_RULES.keys())
+        categories = list(self.CATEGORY_RULES.keys())
+        for category in self.get_custom_rules(user_id) if user_id else {}:
+            if category not in categories:
+                categories.append(category)
+        return categories
     
-    def add_custom_rule(self, category, keywords):
+    def add_custom_rule(self, category, keywords, user_id):
         """
-        Add custom categorization rules (ML-ready).
+        Add custom categorization rules for one user (persisted through the
+        rule store; the shared CATEGORY_RULES defaults are never modified).
         Args:
             category (str) - Category name
             keywords (list) - List of keywords to match
+            user_id (str) - Owner of the rule
+        Returns: dict - The user's updated rules
         """
-        if category not in self.CATEGORY_RULES:
-            self.CATEGORY_RULES[category] = []
-        self.CATEGORY_RULES[category].extend([k.lower() for k in keywords])
+        if self.rule_store is None:
+            raise ValueError('Custom rules need a rule store')
+        rules = self.get_custom_rules(user_id)
+        existing = rules.setdefault(category, [])
+        existing.extend(k.lower().strip() for k in keywords if k and k.strip() and k.lower().strip() not in existing)
+        self.rule_store.save_category_rules(rules, user_id)
+        # Recompile this user's matcher on next use
+        with self._user_lock:
+            self._user_matchers.pop(user_id, None)
+        return rules
     
-    def bulk_categorize(self, merchant_list):
+    def bulk_categorize(self, merchant_list, user_id=None):
         """
         Categorize multiple merchants at once.
+        Merchants resolved by the cache, rules or the local model skip the
+        LLM; the rest are deduplicated (after normalization) and sent
+        LLM_BATCH_SIZE per prompt. Merchants the model skips or answers
+        invalidly fall back to the local model's best guess.
         Args: merchant_list (list) - List of merchant names
         Returns: dict - { merchant: category }
         """
         results = {}
+        guesses = {}
+        pending = {}  # normalized key -> first raw merchant name
         for merchant in merchant_list:
-            results[merchant] = self.categorize(merchant)
+            if not merchant:
+                results[merchant] = 'Uncategorized'
+                continue
+            if merchant in results or merchant in guesses:
+                continue
+            category, guess, cached = self._resolve_locally(merchant, user_id)
+            if category:
+                results[merchant] = category
+                continue
+            guesses[merchant] = guess
+            if cached is None and self.use_ai:
+                pending.setdefault(normalize_merchant(self.merchant_key(merchant)), merchant)
+
+        answers = {}
+        names = list(pending.values())
+        for i in range(0, len(names), self.LLM_BATCH_SIZE):
+            answers.update(self._llm_categorize_batch(names[i:i + self.LLM_BATCH_SIZE]))
+
+        for merchant in merchant_list:
+            if merchant in results:
+                continue
+            category = answers.get(normalize_merchant(self.merchant_key(merchant)))
+            if category in self.CATEGORY_RULES:
+                self.tier_counts['llm'] += 1
+                results[merchant] = category
+            else:
+                self.tier_counts['fallback'] += 1
+                results[merchant] = guesses.get(merchant) or 'Uncategorized'
         return results
 
+    def _llm_categorize_batch(self, merchants):
+        """
+        One LLM call for a batch of merchants, answered as a JSON object.
+        Valid answers (and 'Other') are cached.
+        Args: merchants (list) - Distinct merchant names
+        Returns: dict - { normalized merchant: category } for valid answers
+        """
+        allowed = list(self.CATEGORY_RULES.keys()) + ['Other']
+        prompt = (
+            "Categorize each transaction merchant into one of these exact categories: "
+            f"{', '.join(allowed)}.\n"
+            "Merchants (JSON object of id -> name):\n"
+            f"{json.dumps({str(i): name for i, name in enumerate(merchants)}, ensure_ascii=False)}\n"
+            "Return ONLY a JSON object mapping every id to its category, "
+            'e.g. {"0": "Food", "1": "Other"}.'
+        )
+        try:
+            self.llm_calls += 1
+            response = self.model.generate_content(
+                prompt, generation_config={'response_mime_type': 'application/json'}
+            )
+            text = re.sub(r'^```(?:json)?|```$', '', response.text.strip()).strip()
+            parsed = json.loads(text)
+        except Exception as e:
+            print(f"⚠️ Batch categorization failed, using rules: {e}")
+            return {}
+        if not isinstance(parsed, dict):
+            return {}
+
+        answers, learned = {}, []
+        for key, category in parsed.items():
+            if not str(key).isdigit() or int(key) >= len(merchants) or not isinstance(category, str):
+                continue
+            category = category.strip().replace('.', '')
+            if category in allowed:
+                merchant = merchants[int(key)]
+                key = self.merchant_key(merchant)
+                self.cache.set(key, category)
+                answers[normalize_merchant(key)] = category
+                if category in self.CATEGORY_RULES:
+                    learned.append((merchant, category))
+
+        # LLM answers double as training data for the local model
+        if learned:
+            self.learn(*zip(*learned))
+        return answers
@@ -0,0 +1,164 @@
+"""
+Alert Threshold Index
+Purpose: Find triggered price alerts with binary search instead of linear scans
+Provides: Per-symbol sorted threshold arrays split into above and below sides
+"""
+
+import threading
+from bisect import bisect_left, bisect_right
+
+
+class AlertIndex:
+    """
+    Active price alerts grouped by symbol. Each symbol keeps two sorted
+    threshold arrays (with a parallel array of alert keys):
+      - above: 'target' alerts, triggered when price >= value
+      - below: 'below' alerts, triggered when price <= value
+    A new price finds every crossed alert with one bisect per side.
+    """
+
+    ABOVE_TYPES = ('target',)
+    BELOW_TYPES = ('below',)
+
+    def __init__(self):
+        self._above = {}   # symbol -> ([thresholds], [alert keys])
+        self._below = {}
+        self._alerts = {}  # alert key -> alert dict
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def alert_key(alert):
+        """Alerts are unique per (user_id, alert id)."""
+        return (alert.get('user_id'), alert.get('id'))
+
+    @staticmethod
+    def normalize_symbol(symbol):
+        return (symbol or '').strip().upper()
+
+    def supports(self, alert):
+        """True if the alert type is a plain price threshold this index can hold."""
+        return alert.get('type') in self.ABOVE_TYPES + self.BELOW_TYPES
+
+    def _side(self, alert_type):
+        return self._above if alert_type in self.ABOVE_TYPES else self._below
+
+    # ========================================================================
+    # UPDATES
+    # ========================================================================
+
+    def add(self, alert):
+        """
+        Insert an active alert. Triggered alerts, alerts without a symbol or
+        value and unsupported types are ignored.
+        Args: alert (dict) - Alert with id, user_id, symbol, type, value
+        Returns: bool - True if the alert was indexed
+        """
+        symbol = self.normalize_symbol(alert.get('symbol'))
+        if alert.get('triggered') or not symbol or alert.get('value') is None or not self.supports(alert):
+            return False
+
+        key = self.alert_key(alert)
+        value = float(alert['value'])
+        with self._lock:
+            if key in self._alerts:
+                self._remove_locked(key)
+            thresholds, keys = self._side(alert['type']).setdefault(symbol, ([], []))
+            pos = bisect_right(thresholds, value)
+            thresholds.insert(pos, value)
+            keys.insert(pos, key)
+            self._alerts[key] = {**alert, 'symbol': symbol, 'value': value}
+        return True
+
+    def remove(self, user_id, alert_id):
+        """
+        Drop an alert from the index.
+        Returns: bool - True if it was present
+        """
+        with self._lock:
+            return self._remove_locked((user_id, alert_id))
+
+    def _remove_locked(self, key):
+        alert = self._alerts.pop(key, None)
+        if alert is None:
+            return False
+
+        side = self._side(alert['type'])
+        thresholds, keys = side[alert['symbol']]
+        pos = bisect_left(thresholds, alert['value'])
+        while keys[pos] != key:
+            pos += 1
+        del thresholds[pos]
+        del keys[pos]
+        if not thresholds:
+            del side[alert['symbol']]
+        return True
+
+    def get(self, user_id, alert_id):
+        """Indexed alert dict, or None."""
+        with self._lock:
+            return self._alerts.get((user_id, alert_id))
+
+    def rebuild(self, alerts):
+        """
+        Replace the index contents with the given active alerts.
+        Returns: int - Number of alerts indexed
+        """
+        with self._lock:
+            self._above, self._below, self._alerts = {}, {}, {}
+        return sum(1 for alert in alerts if self.add(alert))
+
+    # ========================================================================
+    # QUERIES
+    # ========================================================================
+
+    def symbols(self):
+        """Symbols that have at least one active alert."""
+        with self._lock:
+            return sorted(set(self._above) | set(self._below))
+
+    def crossed(self, symbol, price):
+        """
+        Alerts on a symbol whose threshold the price has reached.
+        Args:
+            symbol (str) - Symbol the price is for
+            price (float) - Latest price
+        Returns: list of alert dicts
+        """
+        symbol = self.normalize_symbol(symbol)
+        with self._lock:
+            hits = []
+            if symbol in self._above:
+                thresholds, keys = self._above[symbol]
+                hits.extend(keys[:bisect_right(thresholds, price)])
+            if symbol in self._below:
+                thresholds, keys = self._below[symbol]
+                hits.extend(keys[bisect_left(thresholds, price):])
+            return [self._alerts[key] for key in hits]
+
+    def nearest_distance(self, symbol, price):
+        """
+        Relative distance from price to the closest threshold not yet crossed.
+        Args:
+            symbol (str) - Symbol the price is for
+            price (float) - Latest price
+        Returns: float or None if the symbol has no pending thresholds
+        """
+        symbol = self.normalize_symbol(symbol)
+        if not price:
+            return None
+        distances = []
+        with self._lock:
+            if symbol in self._above:
+                thresholds = self._above[symbol][0]
+                pos = bisect_right(thresholds, price)
+                if pos < len(thresholds):
+                    distances.append((thresholds[pos] - price) / price)
+            if symbol in self._below:
+                thresholds = self._below[symbol][0]
+                pos = bisect_left(thresholds, price) - 1
+                if pos >= 0:
+                    distances.append((price - thresholds[pos]) / price)
+        return min(distances) if distances else None
+
+    def __len__(self):
+        return len(self._alerts)
@@ -3,130 +3,500 @@
 Alert Monitor Service
 Purpose: Continuously check stock prices and send push notifications for triggered alerts.
 """
+import sys
+import threading
 import time
-import firebase_admin
-from firebase_admin import credentials, firestore, messaging
-import yfinance as yf
+from firebase_admin import messaging
+from firebase_service import FirebaseService
+from stock_service import StockService
+from crypto_service import CryptoService
+from alert_index import AlertIndex
+from portfolio_alerts import PortfolioAlertBook
+from alert_shards import ShardCoordinator, lease_store_for
+from quote_feed import QuoteFeed
+from poll_scheduler import AdaptivePollScheduler
 from datetime import datetime
 import os
 
-# Initialize Firebase if not already initialized
-try:
-    if not firebase_admin._apps:
-        cred = credentials.Certificate('credentials.json')
-        firebase_admin.initialize_app(cred)
-except ValueError:
-    # App already exists
-    pass
-
-db = firestore.client()
-
-def get_live_price(symbol):
-    try:
-        ticker = yf.Ticker(symbol)
-        # Try fast fetch first
-        data = ticker.history(period="1d")
-        if not data.empty:
-            return data['Close'].iloc[-1]
-        return None
-    except Exception as e:
-        print(f"Error fetching price for {symbol}: {e}")
-        return None
-
-def send_push_notification(token, title, body):
-    try:
-        message = messaging.Message(
-            notification=messaging.Notification(
-                title=title,
-                body=body,
-            ),
-            token=token,
+# FCM caps a multicast batch at 500 messages
+FCM_BATCH_SIZE = 500
+
+
+def send_push_notifications(notifications):
+    """
+    Send notifications through the FCM batch API, FCM_BATCH_SIZE per request.
+    Args: notifications (list) - (token, title, body) tuples
+    Returns: list of bool - delivery success for each notification, in order
+    """
+    results = []
+    for i in range(0, len(notifications), FCM_BATCH_SIZE):
+        chunk = notifications[i:i + FCM_BATCH_SIZE]
+        messages = [
+            messaging.Message(
+                notification=messaging.Notification(title=title, body=body),
+                token=token,
+            )
+            for token, title, body in chunk
+        ]
+        try:
+            response = messaging.send_each(messages)
+            results.extend(r.success for r in response.responses)
+            print(f"FCM batch: {response.success_count} sent, {response.failure_count} failed")
+        except Exception as e:
+            print(f"Error sending FCM batch: {e}")
+            results.extend([False] * len(chunk))
+    return results
+
+
+def log_notifications(notifications):
+    """
+    Offline stand-in for FCM used with the local store: logs each
+    notification and reports it delivered.
+    Args: notifications (list) - (token, title, body) tuples
+    Returns: list of bool
+    """
+    for _token, title, body in notifications:
+        print(f"🔔 [local] {title}: {body}")
+    return [True] * len(notifications)
+
+
+def alert_message(alert):
+    """Notification text for a triggered alert."""
+    symbol = alert.get('symbol')
+    target_value = alert.get('value')
+    alert_type = alert.get('type')
+    if alert_type == 'below':
+        return f"📉 {symbol} dropped to your target of ${target_value}!"
+    if alert_type == 'profit':
+        return f"📈 {symbol} is up {alert.get('profit_loss_percentage')}%, past your profit target of {target_value}%!"
+    if alert_type == 'loss':
+        return f"📉 {symbol} is down {abs(alert.get('profit_loss_percentage') or 0)}%, past your loss threshold of -{target_value}%"
+    if alert_type == 'profit_amount':
+        return f"📈 {symbol} profit reached {alert.get('profit_loss')}, above your target of {target_value}!"
+    if alert_type == 'loss_amount':
+        return f"📉 {symbol} loss reached {abs(alert.get('profit_loss') or 0)}, beyond your limit of {target_value}"
+    if alert_type == 'percent_move':
+        return f"⚡ {symbol} moved {target_value}% or more to {alert.get('price')}"
+    return f"🚀 {symbol} hit your target of ${target_value}!"
+
+
+def evaluate_prices(index, prices):
+    """
+    Binary-search each symbol's thresholds for crossed alerts.
+    Args:
+        index (AlertIndex) - Active alerts
+        prices (dict) - { symbol: price }
+    Returns: list of triggered alert dicts
+    """
+    triggered = []
+    for symbol, current_price in prices.items():
+        if current_price:
+            triggered.extend(index.crossed(symbol, current_price))
+    return triggered
+
+
+class AssetPriceSource:
+    """
+    Batched quotes routed by asset class. Crypto holdings are stored under
+    plain symbols ('BTC') with an INR buy price, so their quotes come from
+    the crypto source by coin_id, never from a stock ticker lookup that
+    would resolve 'BTC' to an unrelated USD listing.
+    """
+
+    def __init__(self, stock_source, crypto_source, asset_class, coin_id):
+        """
+        Args:
+            stock_source - Object with get_batch_prices(symbols) -> { symbol: price }
+            crypto_source - Object with get_batch_prices(coin_ids) -> { coin_id: price }
+            asset_class - Callable symbol -> 'stock', 'crypto' or None
+            coin_id - Callable symbol -> CoinGecko coin ID or None
+        """
+        self.stock_source = stock_source
+        self.crypto_source = crypto_source
+        self.asset_class = asset_class
+        self.coin_id = coin_id
+
+    def get_batch_prices(self, symbols):
+        stocks, coins = [], {}
+        for symbol in symbols:
+            if self.asset_class(symbol) != 'crypto':
+                stocks.append(symbol)
+            elif self.coin_id(symbol):
+                coins.setdefault(self.coin_id(symbol), []).append(symbol)
+            # Crypto without a coin_id is left unpriced rather than priced as a stock
+
+        prices = dict(self.stock_source.get_batch_prices(stocks) or {}) if stocks else {}
+        if coins:
+            for coin_id, price in (self.crypto_source.get_batch_prices(list(coins)) or {}).items():
+                for symbol in coins.get(coin_id, ()):
+                    prices[symbol] = price
+        return prices
+
+
+class AlertMonitor:
+    """
+    Alert pipeline over an alert store (FirebaseService, Firestore or local
+    mode): index active alerts, evaluate prices, notify and retire alerts.
+    Nothing touches Firestore at import time, so the monitor also runs
+    offline against the local store, inside the Flask process or standalone.
+    Price thresholds live in an AlertIndex; profit/loss and percentage-move
+    alerts live in a PortfolioAlertBook joined to the owners' holdings.
+    With a ShardCoordinator, only symbols in the shards this worker leases
+    are polled, evaluated and notified.
+    """
+
+    # Max age of the holdings joined to portfolio alerts in event-driven mode
+    HOLDINGS_REFRESH_SECONDS = 60
+
+    def __init__(self, store, price_source=None, index=None, notifier=None, shards=None, crypto_source=None):
+        """
+        Args:
+            store (FirebaseService) - Alert, token and trigger persistence
+            price_source - Object with get_batch_prices(symbols) (default StockService)
+            index (AlertIndex) - Index to keep up to date (default a new one)
+            notifier - Callable [(token, title, body)] -> [bool]; defaults to
+                FCM with Firestore and to log_notifications with the local store
+            shards (ShardCoordinator) - Optional share of the symbol space
+            crypto_source - Object with get_batch_prices(coin_ids) for crypto
+                symbols (default CryptoService)
+        """
+        self.store = store
+        self.price_source = price_source or StockService()
+        self.index = index if index is not None else AlertIndex()
+        if notifier is None:
+            notifier = log_notifications if store.use_local or not store.db else send_push_notifications
+        self.notifier = notifier
+        self.shards = shards
+        self.portfolio_alerts = PortfolioAlertBook()
+        self._holdings_loaded = 0.0
+        self._asset_classes = {}    # symbol -> 'stock' / 'crypto', from alerts and joined holdings
+        self._coin_ids = {}         # crypto symbol -> CoinGecko coin ID
+        self.quotes = AssetPriceSource(self.price_source, crypto_source or CryptoService(),
+                                       self.asset_class, self.coin_id)
+
+    def load_index(self):
+        """
+        Rebuild the index and the portfolio alert book from every active
+        alert in the store.
+        Returns: AlertIndex
+        """
+        alerts = [alert for alert in self.store.get_active_alerts() if alert.get('symbol')]
+        count = self.index.rebuild(alert for alert in alerts if self.index.supports(alert))
+
+        portfolio = [alert for alert in alerts if self.portfolio_alerts.supports(alert)]
+        holdings = self.store.get_holdings({alert['user_id'] for alert in portfolio}) if portfolio else {}
+        joined = self.portfolio_alerts.rebuild(portfolio, holdings)
+        self._holdings_loaded = time.time()
+        self._learn_asset_classes(alerts + self.portfolio_alerts.alerts())
+        print(f"Indexed {count} price alerts and {joined} portfolio alerts")
+        return self.index
+
+    def refresh_holdings(self, max_age=0):
+        """
+        Re-join portfolio alerts to their owners' current holdings (one
+        holdings load per user), if the last join is older than max_age seconds.
+        """
+        if time.time() - self._holdings_loaded < max_age or not len(self.portfolio_alerts):
+            return
+        alerts = self.portfolio_alerts.alerts()
+        holdings = self.store.get_holdings({alert['user_id'] for alert in alerts})
+        self.portfolio_alerts.rebuild(alerts, holdings)
+        self._holdings_loaded = time.time()
+        self._learn_asset_classes(self.portfolio_alerts.alerts())
+
+    def add_alert(self, alert):
+        """
+        Track a new active alert (alert dict with id and user_id).
+        Returns: bool - True if the alert is now monitored
+        """
+        return self.add_alerts([alert]) == 1
+
+    def add_alerts(self, alerts):
+        """
+        Track new or modified active alerts. Portfolio alerts are joined
+        with one holdings load for all their owners.
+        Returns: int - Alerts now monitored
+        """
+        portfolio = [alert for alert in alerts if self.portfolio_alerts.supports(alert)]
+        holdings = self.store.get_holdings({alert['user_id'] for alert in portfolio}) if portfolio else {}
+        added = 0
+        for alert in alerts:
+            # A modified alert may have moved between the index and the book
+            self.remove_alert(alert['user_id'], alert['id'])
+            if self.index.supports(alert):
+                added += self.index.add(alert)
+            elif self.portfolio_alerts.supports(alert):
+                added += self.portfolio_alerts.add(alert, holdings.get(alert['user_id'], []))
+        self._learn_asset_classes(alerts)
+        self._learn_asset_classes(filter(None, (self.portfolio_alerts.get(alert['user_id'], alert['id'])
+                                                for alert in portfolio)))
+        return added
+
+    def is_indexed(self, alert):
+        """True if the alert is already monitored with the same trigger fields."""
+        stored = self.index.get(alert.get('user_id'), alert.get('id')) or \
+            self.portfolio_alerts.get(alert.get('user_id'), alert.get('id'))
+        if stored is None or alert.get('triggered') or alert.get('value') is None:
+            return False
+        reference = alert.get('reference_price')
+        return (
+            stored['symbol'] == AlertIndex.normalize_symbol(alert.get('symbol'))
+            and stored.get('type') == alert.get('type')
+            and stored['value'] == float(alert['value'])
+            and stored.get('investmentId') == alert.get('investmentId')
+            and (reference is None or stored.get('reference_price') == float(reference))
         )
-        response = messaging.send(message)
-        print(f"Successfully sent message: {response}")
-        return True
-    except Exception as e:
-        print(f"Error sending message: {e}")
-        return False
-
-def check_alerts():
-    print(f"--- Checking Alerts at {datetime.now()} ---")
-    
-    # 1. Get all users
-    users_ref = db.collection('users').stream()
-    
-    for user_doc in users_ref:
-        user_data = user_doc.to_dict()
-        user_id = user_doc.id
-        fcm_token = user_data.get('fcm_token')
-        
-        # We process alerts even if no token (maybe for future email logging), 
-        # but for now we need token to notify.
-        if not fcm_token:
-            continue
-            
-        print(f"Checking alerts for user: {user_id}")
-        
-        # 2. Get active alerts for this user
-        alerts_ref = db.collection('users').document(user_id).collection('alerts').stream()
-        
-        for alert_doc in alerts_ref:
-            alert = alert_doc.to_dict()
-            alert_id = alert_doc.id
-            
-            if alert.get('triggered'):
-                continue
-                
-            symbol = alert.get('symbol')
-            if not symbol:
-                print(f"Skipping alert {alert_id}: No symbol found")
-                continue
-
-            # Fetch current price
-            current_price = get_live_price(symbol)
-            if not current_price:
-                continue
-
-            # Check condition
-            should_trigger = False
-            message = ""
-            
-            alert_type = alert.get('type')
-            target_value = alert.get('value')
-            
-            # Use basic logic for 'target' type for now (simplest)
-            # Logic from frontend: 
-            # target -> if current >= target (if target > buy?) OR current <= target (if target < buy?)
-            # Actually frontend says: "if currentPrice >= alert.value" for target.
-            # But what if I want to buy when it drops? 
-            # The frontend logic seems to assume "target price" is a "Upper Target".
-            # Let's stick to frontend logic: 
-            # target: current >= value
-            
-            if alert_type == 'target':
-                if current_price >= target_value:
-                    should_trigger = True
-                    message = f"🚀 {symbol} hit your target of ${target_value}!"
-            
-            # We can expand for profit/loss if we fetch buy_price from stock list. 
-            # For MVP backend monitor, let's stick to simple price target 
-            # or we need to look up the investment details.
-            
-            if should_trigger:
-                print(f"!!! TRIGGERING ALERT for {symbol} !!!")
-                # Send Push Notification
-                success = send_push_notification(fcm_token, "Price Alert", message)
-                
-                if success:
-                    # Mark as triggered in DB
-                    db.collection('users').document(user_id)\
-                      .collection('alerts').document(alert_id).update({'triggered': True})
 
+    def remove_alert(self, user_id, alert_id):
+        removed = self.index.remove(user_id, alert_id)
+        return self.portfolio_alerts.remove(user_id, alert_id) or removed
+
+    def _learn_asset_classes(self, alerts):
+        """Remember which symbols are crypto (and their coin_id), from the alerts or their holdings."""
+        for alert in alerts:
+            symbol = AlertIndex.normalize_symbol(alert.get('symbol'))
+            if alert.get('asset_class') and symbol:
+                self._asset_classes[symbol] = alert['asset_class']
+            if alert.get('coin_id') and symbol:
+                self._coin_ids[symbol] = alert['coin_id']
+
+    def asset_class(self, symbol):
+        """'stock', 'crypto' or None if no alert or holding says."""
+        return self._asset_classes.get(AlertIndex.normalize_symbol(symbol))
+
+    def coin_id(self, symbol):
+        """CoinGecko coin ID of a crypto symbol, or None."""
+        return self._coin_ids.get(AlertIndex.normalize_symbol(symbol))
+
+    def symbols(self):
+        """Symbols with at least one active alert of any kind."""
+        symbols = sorted(set(self.index.symbols()) | set(self.portfolio_alerts.symbols()))
+        return self.shards.filter(symbols) if self.shards else symbols
+
+    def evaluate(self, prices):
+        """
+        Triggered alerts for the given prices: bisect the price thresholds and
+        check portfolio alerts in one vectorized pass.
+        Returns: list of triggered alert dicts
+        """
+        if self.shards:
+            owned = set(self.shards.filter(prices))
+            prices = {symbol: price for symbol, price in prices.items() if symbol in owned}
+        return evaluate_prices(self.index, prices) + self.portfolio_alerts.evaluate(prices)
+
+    def dispatch_triggered(self, triggered):
+        """
+        Notify the owners of triggered alerts and retire the delivered ones.
+        Returns: dict - Dispatch stats (notified, failed, batches, dispatch_ms)
+        """
+        stats = {'notified': 0, 'failed': 0, 'batches': 0, 'dispatch_ms': 0.0}
+        if self.shards:
+            # A lease may have moved since evaluation; its new owner will notify
+            triggered = [alert for alert in triggered if self.shards.owns(alert['symbol'])]
+        if not triggered:
+            return stats
+
+        # Only users with triggered alerts need their FCM token
+        dispatch_started = time.perf_counter()
+        tokens = self.store.get_fcm_tokens({alert['user_id'] for alert in triggered})
+        deliverable = [alert for alert in triggered if tokens.get(alert['user_id'])]
+
+        # Send all notifications in batches, then mark them in one pass
+        results = self.notifier([
+            (tokens[alert['user_id']], "Price Alert", alert_message(alert))
+            for alert in deliverable
+        ])
+        sent = [alert for alert, ok in zip(deliverable, results) if ok]
+        if sent:
+            # Retire delivered alerts even if the write fails, so they are not re-sent next cycle
+            try:
+                self.store.mark_alerts_triggered(sent)
+            except Exception as e:
+                print(f"⚠️ Could not mark {len(sent)} alert(s) triggered: {e}")
+            finally:
+                for alert in sent:
+                    self.remove_alert(alert['user_id'], alert['id'])
+
+        stats['notified'] = len(sent)
+        stats['failed'] = len(deliverable) - len(sent)
+        stats['batches'] = -(-len(deliverable) // FCM_BATCH_SIZE)
+        stats['dispatch_ms'] = round((time.perf_counter() - dispatch_started) * 1000, 1)
+        print(f"Dispatched {stats['notified']}/{len(deliverable)} notifications "
+              f"in {stats['batches']} batch(es), {stats['dispatch_ms']} ms")
+        return stats
+
+    def check_alerts(self):
+        """
+        Run one full evaluation cycle (poll every alerted symbol once).
+        Returns: dict - Cycle stats (alert, trigger and dispatch counts, dispatch latency)
+        """
+        print(f"--- Checking Alerts at {datetime.now()} ---")
+
+        # Join portfolio alerts to holdings once per cycle
+        self.refresh_holdings()
+
+        # Fetch each distinct symbol once, in a single batched call
+        symbols = self.symbols()
+        prices = self.quotes.get_batch_prices(symbols) if symbols else {}
+
+        triggered = self.evaluate(prices)
+        alert_count = len(self.index) + len(self.portfolio_alerts)
+        print(f"Checked {alert_count} active alerts across {len(symbols)} symbols, {len(triggered)} triggered")
+
+        stats = {'alerts': alert_count, 'symbols': len(symbols), 'triggered': len(triggered)}
+        stats.update(self.dispatch_triggered(triggered))
+        return stats
+
+    def watch(self, on_change=None):
+        """
+        Keep the index in sync with the store's change feed (Firestore
+        snapshot listener). The local store has no change feed, so it is only
+        supported in-process (RUN_ALERT_MONITOR), where the Flask routes
+        update the index directly.
+        Args: on_change - Optional callback after each applied change, called
+              with the new or modified alerts
+        Returns: Watch handle (call .unsubscribe() to stop), or None
+        """
+        def apply(upserts, removed):
+            for user_id, alert_id in removed:
+                self.remove_alert(user_id, alert_id)
+            # The listener's first snapshot repeats every alert load_index() already
+            # indexed; only new or modified alerts are (re)joined
+            changed = [alert for alert in upserts if not self.is_indexed(alert)]
+            self.add_alerts(changed)
+            if on_change and (removed or changed):
+                on_change(changed)
+
+        return self.store.watch_active_alerts(apply)
+
+
+class AlertEvaluator:
+    """
+    Event-driven alert evaluation. Subscribes to a QuoteFeed and re-checks
+    only the alerts on symbols whose quote changed, dispatching right away.
+    The feed's watchlist follows the symbols that have active alerts.
+    """
+
+    def __init__(self, monitor, feed):
+        self.monitor = monitor
+        self.index = monitor.index
+        self.feed = feed
+        self.last_stats = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Subscribe to quote changes and start watching alerted symbols."""
+        self.feed.subscribe(self.on_quotes)
+        self.sync_watchlist()
+        self.feed.start()
+
+    def sync_watchlist(self):
+        """Point the feed at the symbols that currently have active alerts."""
+        self.feed.watch(self.monitor.symbols())
+
+    def add_alert(self, alert):
+        """Start monitoring a newly created alert and watch its symbol."""
+        added = self.monitor.add_alert(alert)
+        self.sync_watchlist()
+        if added:
+            self.check_new_alerts([alert])
+        return added
+
+    def on_alerts_changed(self, alerts):
+        """Change-feed callback: follow the new symbols and check the new alerts."""
+        self.sync_watchlist()
+        self.check_new_alerts(alerts)
+
+    def check_new_alerts(self, alerts):
+        """
+        Evaluate just-added alerts against the feed's cached quotes. Only
+        quotes that move are published, so an alert whose threshold is
+        already crossed on a flat quote (e.g. market closed) would otherwise
+        wait for the next move.
+        Returns: list of triggered alert dicts
+        """
+        keys = {AlertIndex.alert_key(alert) for alert in alerts}
+        prices = {}
+        for alert in alerts:
+            symbol = AlertIndex.normalize_symbol(alert.get('symbol'))
+            price = self.feed.get(symbol)
+            if price is not None:
+                prices[symbol] = price
+        if not prices:
+            return []
+
+        with self._lock:
+            triggered = [alert for alert in self.monitor.evaluate(prices) if AlertIndex.alert_key(alert) in keys]
+            if triggered:
+                self.monitor.dispatch_triggered(triggered)
+                self.sync_watchlist()
+        return triggered
+
+    def remove_alert(self, user_id, alert_id):
+        removed = self.monitor.remove_alert(user_id, alert_id)
+        self.sync_watchlist()
+        return removed
+
+    def on_quotes(self, changed):
+        """
+        Quote-change callback.
+        Args: changed (dict) - { symbol: price } of quotes that moved
+        """
+        received = time.perf_counter()
+        with self._lock:
+            self.monitor.refresh_holdings(max_age=self.monitor.HOLDINGS_REFRESH_SECONDS)
+            triggered = self.monitor.evaluate(changed)
+            if not triggered:
+                return
+            stats = {'symbols': len(changed), 'triggered': len(triggered)}
+            stats.update(self.monitor.dispatch_triggered(triggered))
+            stats['latency_ms'] = round((time.perf_counter() - received) * 1000, 1)
+            self.last_stats = stats
+            self.sync_watchlist()
+        print(f"Quote change -> notification in {stats['latency_ms']} ms")
+
+
+def start_alert_monitor(store, price_source=None, index=None, notifier=None, shards=None, crypto_source=None):
+    """
+    Start the event-driven monitor on background threads (quote feed plus,
+    with Firestore, the snapshot listener) and return immediately.
+    Args: see AlertMonitor
+    Returns: AlertEvaluator - Call sync_watchlist() after adding/removing alerts
+             and feed.publish() to push externally fetched quotes
+    """
+    monitor = AlertMonitor(store, price_source, index, notifier, shards, crypto_source)
+    monitor.load_index()
+    scheduler = AdaptivePollScheduler(threshold_distance=monitor.index.nearest_distance,
+                                      asset_class=monitor.asset_class)
+    evaluator = AlertEvaluator(monitor, QuoteFeed(monitor.quotes, scheduler=scheduler))
+    if shards:
+        # Follow lease hand-overs with the quote watchlist
+        shards.on_change = lambda _owned: evaluator.sync_watchlist()
+        shards.start()
+    monitor.watch(on_change=evaluator.on_alerts_changed)
+    evaluator.start()
+    mode = 'local store' if store.use_local or not store.db else 'Firestore'
+    alert_count = len(monitor.index) + len(monitor.portfolio_alerts)
+    print(f"✓ Alert monitor running in background ({mode}, {alert_count} alerts)")
+    if shards:
+        print(f"  Worker {shards.worker_id} owns {len(shards.owned_shards())}/{shards.ring.shard_count} shards")
+    return evaluator
 
 
 if __name__ == "__main__":
     print("Starting Alert Monitor Service...")
-    while True:
-        # check_alerts() 
-        # Placeholder loop until we fix persistence
-        time.sleep(60)
+    store = FirebaseService(local_path=os.getenv('LOCAL_STORE_PATH', 'local_store.json'))
+    if store.use_local or not store.db:
+        # A second process would never see alerts added or deleted through Flask,
+        # and its rewrites of the JSON file would race the app's own writes
+        print("❌ The local store can't be shared with a separate monitor process.")
+        print("   Run the monitor inside the backend instead: RUN_ALERT_MONITOR=1 python app.py")
+        sys.exit(1)
+    # ALERT_SHARD_COUNT > 0 runs this process as one of several sharded workers
+    shard_count = int(os.getenv('ALERT_SHARD_COUNT', '0'))
+    shards = None
+    if shard_count > 0:
+        shards = ShardCoordinator(lease_store_for(store), shard_count, os.getenv('ALERT_WORKER_ID'))
+    start_alert_monitor(store, shards=shards)
+    # Everything runs on the listener and quote-feed threads
+    threading.Event().wait()
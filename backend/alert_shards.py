@@ -0,0 +1,244 @@
+"""
+Alert Shards Module
+Purpose: Split alert evaluation across several monitor processes
+Provides: Consistent-hash ring of symbol shards, Firestore shard leases
+          and a per-worker shard coordinator
+"""
+
+import hashlib
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+from bisect import bisect_right
+
+from alert_index import AlertIndex
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent-hash ring mapping symbols to a fixed set of shards. Each shard
+    owns `replicas` points on the ring; growing the shard count only moves
+    about 1/N of the symbols.
+    """
+
+    def __init__(self, shard_count, replicas=64):
+        points = sorted(
+            (_hash(f"shard-{shard}#{replica}"), shard)
+            for shard in range(shard_count)
+            for replica in range(replicas)
+        )
+        self.shard_count = shard_count
+        self._points = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, symbol):
+        pos = bisect_right(self._points, _hash(AlertIndex.normalize_symbol(symbol))) % len(self._points)
+        return self._shards[pos]
+
+
+# ============================================================================
+# LEASE STORE
+# ============================================================================
+
+class FirestoreLeaseStore:
+    """
+    Shard leases as Firestore documents ('alert_shards/{shard}'), taken and
+    renewed inside transactions. Live workers announce themselves in
+    'alert_workers/{worker_id}'.
+    """
+
+    def __init__(self, db, shards_collection='alert_shards', workers_collection='alert_workers'):
+        self.db = db
+        self.shards = db.collection(shards_collection)
+        self.workers = db.collection(workers_collection)
+
+    def acquire(self, shard, worker_id, ttl):
+        """
+        Take or renew a shard lease if it is free, expired or already ours.
+        Returns: float or None - Lease expiry (epoch seconds) if held
+        """
+        from firebase_admin import firestore
+
+        ref = self.shards.document(str(shard))
+
+        @firestore.transactional
+        def claim(transaction):
+            now = time.time()
+            snapshot = ref.get(transaction=transaction)
+            lease = snapshot.to_dict() if snapshot.exists else None
+            if lease and lease.get('worker_id') != worker_id and lease.get('expires_at', 0) > now:
+                return None
+            expires_at = now + ttl
+            transaction.set(ref, {'worker_id': worker_id, 'expires_at': expires_at})
+            return expires_at
+
+        return claim(self.db.transaction())
+
+    def release(self, shard, worker_id):
+        from firebase_admin import firestore
+
+        ref = self.shards.document(str(shard))
+
+        @firestore.transactional
+        def drop(transaction):
+            snapshot = ref.get(transaction=transaction)
+            if snapshot.exists and snapshot.to_dict().get('worker_id') == worker_id:
+                transaction.delete(ref)
+
+        drop(self.db.transaction())
+
+    def heartbeat(self, worker_id, ttl):
+        self.workers.document(worker_id).set({'worker_id': worker_id, 'expires_at': time.time() + ttl})
+
+    def leave(self, worker_id):
+        self.workers.document(worker_id).delete()
+
+    def live_workers(self):
+        docs = self.workers.where('expires_at', '>', time.time()).stream()
+        return sorted(doc.id for doc in docs)
+
+
+def lease_store_for(store):
+    """
+    Lease store for sharded workers, kept next to their alerts in Firestore.
+    Raises: ValueError for the local store: every worker would keep its own
+            stale alert index and rewrite the same JSON file
+    """
+    if store.use_local or not store.db:
+        raise ValueError('Sharded alert workers need Firestore; the local store supports a single in-process monitor')
+    return FirestoreLeaseStore(store.db)
+
+
+# ============================================================================
+# COORDINATOR
+# ============================================================================
+
+class ShardCoordinator:
+    """
+    Keeps this worker's fair share of shard leases. Every heartbeat it
+    renews the leases it holds, claims free or expired shards up to
+    ceil(shards / live workers) and releases any surplus so newly started
+    workers can pick it up. A lease is exclusive, so a symbol is evaluated
+    by one worker at a time; leases of a dead worker expire after
+    lease_seconds and are taken over by the others.
+    """
+
+    DEFAULT_SHARDS = 64
+    LEASE_SECONDS = 30.0
+
+    def __init__(self, lease_store, shard_count=None, worker_id=None, lease_seconds=None, on_change=None):
+        """
+        Args:
+            lease_store - FirestoreLeaseStore (or any object with the same methods)
+            shard_count (int) - Number of shards on the ring (same for all workers)
+            worker_id (str) - Unique worker name (default host-pid-random)
+            lease_seconds (float) - Lease time to live
+            on_change - Optional callback(owned_shards) when ownership changes
+        """
+        self.lease_store = lease_store
+        self.ring = HashRing(shard_count or self.DEFAULT_SHARDS)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds or self.LEASE_SECONDS
+        self.on_change = on_change
+        self._leases = {}  # shard -> expiry
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    # ========================================================================
+    # OWNERSHIP
+    # ========================================================================
+
+    def owned_shards(self):
+        """Shards whose lease is held and not yet expired."""
+        now = time.time()
+        with self._lock:
+            return {shard for shard, expires_at in self._leases.items() if expires_at > now}
+
+    def owns(self, symbol):
+        shard = self.ring.shard_for(symbol)
+        with self._lock:
+            return self._leases.get(shard, 0) > time.time()
+
+    def filter(self, symbols):
+        """The subset of symbols this worker is responsible for."""
+        owned = self.owned_shards()
+        return [symbol for symbol in symbols if self.ring.shard_for(symbol) in owned]
+
+    def heartbeat(self):
+        """
+        Renew, claim and release leases once.
+        Returns: set - Shards owned afterwards
+        """
+        before = self.owned_shards()
+        self.lease_store.heartbeat(self.worker_id, self.lease_seconds)
+        workers = self.lease_store.live_workers() or [self.worker_id]
+        share = math.ceil(self.ring.shard_count / len(workers))
+
+        # Renew what we hold; drop anything another worker took over
+        held = {}
+        for shard in sorted(before):
+            expires_at = self.lease_store.acquire(shard, self.worker_id, self.lease_seconds)
+            if expires_at:
+                held[shard] = expires_at
+
+        # Hand back the surplus above our fair share
+        for shard in sorted(held)[share:]:
+            self.lease_store.release(shard, self.worker_id)
+            del held[shard]
+
+        # Claim free shards, starting at an offset so workers don't all race for shard 0
+        start = _hash(self.worker_id) % self.ring.shard_count
+        for step in range(self.ring.shard_count):
+            if len(held) >= share:
+                break
+            shard = (start + step) % self.ring.shard_count
+            if shard in held:
+                continue
+            expires_at = self.lease_store.acquire(shard, self.worker_id, self.lease_seconds)
+            if expires_at:
+                held[shard] = expires_at
+
+        with self._lock:
+            self._leases = held
+        owned = set(held)
+        if owned != before and self.on_change:
+            self.on_change(owned)
+        return owned
+
+    # ========================================================================
+    # BACKGROUND RENEWAL
+    # ========================================================================
+
+    def start(self):
+        """Take the first leases now and keep renewing them in the background."""
+        self.heartbeat()
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='shard-leases', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop renewing and release every lease so other workers take over at once."""
+        self._stopped.set()
+        for shard in self.owned_shards():
+            self.lease_store.release(shard, self.worker_id)
+        self.lease_store.leave(self.worker_id)
+        with self._lock:
+            self._leases = {}
+
+    def _run(self):
+        # Renew well before expiry so a slow round trip never lets a lease lapse
+        while not self._stopped.wait(self.lease_seconds / 3):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                print(f"Shard lease renewal failed: {e}")
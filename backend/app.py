@@ -10,21 +10,31 @@ import os
 os.environ["PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION"] = "python"
 
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, Request, request, jsonify, make_response
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_cors import CORS
 from datetime import datetime, timedelta
 from collections import defaultdict
 from firebase_service import FirebaseService
 from ai_categorizer import ExpenseCategorizer
+from category_refiner import CategoryRefiner
+from merchant_index import MerchantIndex
 from stock_service import StockService
 from crypto_service import CryptoService
 from chat_service import ChatService
 from budget_service import BudgetService
 from email_service import EmailService
 from receipt_service import ReceiptScanner
+from portfolio_engine import PortfolioValuation, roll_previous_close
+from price_history import PriceHistoryService
+from portfolio_analytics import PortfolioAnalytics
+from alert_index import AlertIndex
+from alert_monitor import start_alert_monitor
+from portfolio_alerts import PortfolioAlertBook
 from validations import validate_transaction, validate_stock_input
 import random
 import string
+import tempfile
 
 def _parse_iso_date(value):
     if not value:
@@ -45,10 +55,16 @@ def _median(values):
     return (ordered[mid - 1] + ordered[mid]) / 2
 
 
-def detect_recurring_subscriptions(expenses, min_occurrences=3, interval_target=30, interval_tolerance=6, amount_tolerance=0.1):
+def detect_recurring_subscriptions(expenses, min_occurrences=3, interval_target=30, interval_tolerance=6, amount_tolerance=0.1, merchant_index=None):
     grouped = defaultdict(list)
     for exp in expenses:
-        merchant = (exp.get('merchant') or '').strip().lower()
+        # Group by canonical merchant id so "NETFLIX.COM" and "netflix*1234" match;
+        # older records without one are resolved through the index
+        merchant = exp.get('merchant_id')
+        if not merchant and merchant_index is not None:
+            merchant = merchant_index.resolve(exp.get('merchant'))
+        if not merchant:
+            merchant = (exp.get('merchant') or '').strip().lower()
         date_val = _parse_iso_date(exp.get('date'))
         amount = exp.get('amount')
         if not merchant or not date_val or amount is None:
@@ -112,14 +128,30 @@ CORS(
 )
 
 # Initialize services
-firebase_service = FirebaseService()
-categorizer = ExpenseCategorizer()
+firebase_service = FirebaseService(local_path=os.getenv('LOCAL_STORE_PATH', 'local_store.json'))
+merchant_index = MerchantIndex()
+merchant_index.rebuild(firebase_service.get_expenses(limit=1000))
+categorizer = ExpenseCategorizer(rule_store=firebase_service, merchant_index=merchant_index)
+category_refiner = CategoryRefiner(categorizer, firebase_service)
+if categorizer.classifier.sample_count == 0:
+    # First run: bootstrap the local merchant model from categorized history
+    categorizer.train_from_expenses(firebase_service.get_expenses(limit=1000))
 stock_service = StockService()
 crypto_service = CryptoService()
 chat_service = ChatService()
 budget_service = BudgetService(firebase_service)
 email_service = EmailService()
 receipt_scanner = ReceiptScanner()
+price_history = PriceHistoryService(stock_service, crypto_service)
+portfolio_analytics = PortfolioAnalytics(price_history)
+alert_index = AlertIndex()
+alert_index.rebuild({**alert, 'user_id': firebase_service.user_id} for alert in firebase_service.get_alerts())
+# Opt-in: run the alert monitor on background threads inside this process,
+# sharing the alert index and store (works offline with the local store)
+alert_evaluator = None
+if os.getenv('RUN_ALERT_MONITOR', '').lower() in ('1', 'true', 'yes'):
+    alert_evaluator = start_alert_monitor(firebase_service, stock_service, alert_index,
+                                          crypto_source=crypto_service)
 
 # ============================================================================
 # STARTUP VERIFICATION
@@ -307,16 +339,19 @@ def add_expense():
         if not validation['valid']:
             return jsonify({'success': False, 'message': validation['error']}), 400
         
-        # AI-based categorization
+        # Cached or rule-based category now; the LLM refines it in the background
         merchant_name = data.get('merchant', '')
-        category = categorizer.categorize(merchant_name)
+        merchant_id = merchant_index.resolve(merchant_name)
+        category, category_pending = categorizer.quick_categorize(merchant_name, firebase_service.user_id)
         
         # Prepare expense record
         expense_record = {
             'amount': float(data.get('amount')),
             'merchant': merchant_name,
+            'merchant_id': merchant_id,
             'description': data.get('description', ''),
             'category': category,
+            'category_pending': category_pending,
             'date': data.get('date', datetime.now().isoformat()),
             'timestamp': datetime.now().isoformat(),
             'type': 'expense'
@@ -324,18 +359,92 @@ def add_expense():
         
         # Save to Firestore
         expense_id = firebase_service.add_expense(expense_record)
+        if category_pending:
+            category_refiner.submit(expense_id, merchant_name, user_id=firebase_service.user_id)
         
         return jsonify({
             'success': True,
             'message': 'Expense added successfully',
             'expense_id': expense_id,
-            'category': category
+            'category': category,
+            'category_pending': category_pending
         }), 201
     
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@app.route('/api/expense/categorizer/metrics', methods=['GET'])
+def get_categorizer_metrics():
+    """
+    Merchant category cache and LLM usage metrics
+    Returns: { success, data: { hit_rate, memory_hits, disk_hits, misses, llm_calls, ... } }
+    """
+    try:
+        metrics = categorizer.get_metrics()
+        metrics['refinement_queue'] = category_refiner.queue_size()
+        metrics['refined'] = category_refiner.refined
+        return jsonify({'success': True, 'data': metrics}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/expense/correct-category', methods=['POST'])
+def correct_expense_category():
+    """
+    Manually fix an expense's category; the fix is remembered for this user's merchant
+    Expected JSON: { expense_id, category, merchant (optional) }
+    Returns: { success, message }
+    """
+    try:
+        data = request.get_json()
+        expense_id = data.get('expense_id')
+        category = data.get('category')
+        if not expense_id or category not in categorizer.get_all_categories(firebase_service.user_id):
+            return jsonify({'success': False, 'message': 'expense_id and a valid category are required'}), 400
+
+        merchant_name = data.get('merchant')
+        if not merchant_name:
+            expense = next((e for e in firebase_service.get_expenses(limit=1000) if e.get('id') == expense_id), None)
+            if expense is None:
+                return jsonify({'success': False, 'message': 'Expense not found'}), 404
+            merchant_name = expense.get('merchant', '')
+
+        if not firebase_service.update_expense(expense_id, {'category': category, 'category_pending': False}):
+            return jsonify({'success': False, 'message': 'Expense not found'}), 404
+        if merchant_name:
+            categorizer.record_correction(merchant_name, category, user_id=firebase_service.user_id)
+
+        return jsonify({'success': True, 'message': 'Category updated'}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/expense/rules', methods=['GET', 'POST'])
+def expense_rules():
+    """
+    GET: the user's custom categorization rules
+    POST: add keywords to a category for this user only
+    Expected JSON (POST): { category, keywords: [str] }
+    Returns: { success, data: { category: [keywords] } }
+    """
+    try:
+        user_id = firebase_service.user_id
+        if request.method == 'GET':
+            return jsonify({'success': True, 'data': categorizer.get_custom_rules(user_id)}), 200
+
+        data = request.get_json()
+        category = (data.get('category') or '').strip()
+        keywords = data.get('keywords') or []
+        if not category or not isinstance(keywords, list) or not keywords:
+            return jsonify({'success': False, 'message': 'category and a list of keywords are required'}), 400
+
+        rules = categorizer.add_custom_rule(category, keywords, user_id)
+        return jsonify({'success': True, 'data': rules}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
 @app.route('/api/expense/list', methods=['GET'])
 def get_expenses():
     """
@@ -380,18 +489,82 @@ def get_subscription_candidates():
     try:
         min_occ = request.args.get('min_occurrences', default=3, type=int)
         expenses = firebase_service.get_expenses()
-        subscriptions = detect_recurring_subscriptions(expenses, min_occurrences=min_occ)
+        subscriptions = detect_recurring_subscriptions(expenses, min_occurrences=min_occ, merchant_index=merchant_index)
         return jsonify({'success': True, 'data': subscriptions}), 200
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+# Largest receipt upload accepted (raw or multipart)
+RECEIPT_MAX_BYTES = int(os.getenv('RECEIPT_MAX_BYTES', str(15 * 1024 * 1024)))
+# Uploads above this spill from memory to a temp file
+RECEIPT_SPOOL_BYTES = 1024 * 1024
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def _upload_too_large():
+    return jsonify({'success': False, 'message': f'Image exceeds {RECEIPT_MAX_BYTES // (1024 * 1024)} MB'}), 413
+
+
+def receipt_body_limit(is_json):
+    """Largest receipt request body: base64 JSON is a third larger than the image it carries."""
+    return RECEIPT_MAX_BYTES * 4 // 3 + 1024 if is_json else RECEIPT_MAX_BYTES + 64 * 1024
+
+
+class UploadLimitedRequest(Request):
+    """
+    Request with a per-endpoint body limit. Werkzeug enforces
+    max_content_length while it reads the body (also for chunked requests
+    without a Content-Length), so oversized multipart uploads are cut off
+    during parsing instead of being written to a temp file first.
+    """
+
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'scan_receipt':
+            return receipt_body_limit(self.is_json)
+        return super().max_content_length
+
+
+app.request_class = UploadLimitedRequest
+
+
+def spool_upload(stream, max_bytes=RECEIPT_MAX_BYTES):
+    """
+    Copy an upload stream into a SpooledTemporaryFile chunk by chunk,
+    stopping as soon as it exceeds max_bytes (also for chunked bodies with
+    no Content-Length).
+    Returns: SpooledTemporaryFile positioned at the start
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=RECEIPT_SPOOL_BYTES)
+    size = 0
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            spool.close()
+            raise UploadTooLarge()
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
 @app.route('/api/receipt/scan', methods=['POST', 'OPTIONS'])
 def scan_receipt():
     """
     Scan a receipt image to extract transaction details
-    Expected JSON: { image_base64 }
-    Returns: { success, data: { merchant, amount, date, category } }
+    Accepts (preferred first):
+      - multipart/form-data with the file in field 'image'
+      - a raw image body (Content-Type image/* or application/octet-stream)
+      - JSON { image_base64 } (legacy)
+    Uploads are capped at RECEIPT_MAX_BYTES (413 above it).
+    Returns: { success, data: { merchant, amount, date, category }, image: { before/after sizes } }
     """
     if request.method == 'OPTIONS':
         response = make_response()
@@ -401,33 +574,57 @@ def scan_receipt():
         response.headers.add("Access-Control-Allow-Credentials", "true")
         return response, 200
 
+    upload = None
     try:
         print("====== INCOMING RECEIPT SCAN REQUEST ======")
-        data = request.get_json()
-        if not data:
-            print("ERROR: No JSON payload received")
-            return jsonify({'success': False, 'message': 'No JSON payload received'}), 400
-            
-        image_base64 = data.get('image_base64')
-        if not image_base64:
-            print("ERROR: image_base64 key is missing or empty")
-            return jsonify({'success': False, 'message': 'Image data is required'}), 400
-            
-        print(f"DEBUG: Received image data. Length: {len(image_base64)}")
-        result = receipt_scanner.scan_receipt(image_base64)
+        if request.content_length and request.content_length > receipt_body_limit(request.is_json):
+            return _upload_too_large()
+
+        mimetype = request.mimetype or ''
+        if mimetype == 'multipart/form-data':
+            # Werkzeug already spools file parts to temp files while parsing
+            file = request.files.get('image') or request.files.get('file')
+            if not file:
+                return jsonify({'success': False, 'message': "Image file is required (form field 'image')"}), 400
+            file.stream.seek(0, os.SEEK_END)
+            if file.stream.tell() > RECEIPT_MAX_BYTES:
+                return _upload_too_large()
+            file.stream.seek(0)
+            image = file.stream
+        elif mimetype.startswith('image/') or mimetype == 'application/octet-stream':
+            upload = spool_upload(request.stream)
+            image = upload
+        else:
+            data = request.get_json(silent=True)
+            if not data:
+                print("ERROR: No JSON payload received")
+                return jsonify({'success': False, 'message': 'No image or JSON payload received'}), 400
+
+            image = data.get('image_base64')
+            if not image:
+                print("ERROR: image_base64 key is missing or empty")
+                return jsonify({'success': False, 'message': 'Image data is required'}), 400
+
+        result = receipt_scanner.scan_receipt(image)
         print(f"DEBUG: scanner result: {result}")
         
         if result and 'error' not in result:
-            return jsonify({'success': True, 'data': result}), 200
+            image_stats = result.pop('image', None)
+            return jsonify({'success': True, 'data': result, 'image': image_stats}), 200
         else:
             print(f"ERROR: Scanner returned error: {result.get('error') if result else 'Unknown'}")
             return jsonify({'success': False, 'message': result.get('error', 'Failed to scan receipt')}), 400
             
+    except (UploadTooLarge, RequestEntityTooLarge):
+        return _upload_too_large()
     except Exception as e:
         import traceback
         print(f"EXCEPTION in scan_receipt: {str(e)}")
         traceback.print_exc()
         return jsonify({'success': False, 'message': str(e)}), 500
+    finally:
+        if upload is not None:
+            upload.close()
 
 
 
@@ -539,6 +736,8 @@ def add_stock():
         
         # Save to Firestore
         stock_id = firebase_service.add_stock(stock_record)
+        if alert_evaluator and not price_warning:
+            alert_evaluator.feed.publish({symbol: current_price})
         print(f"✓ Stock saved to database: {stock_id}")
         print(f"{'='*70}\n")
         
@@ -567,15 +766,14 @@ def get_stocks():
         stocks = firebase_service.get_stocks()
         
         # Calculate portfolio metrics
-        total_investment = sum(s['buy_price'] * s['quantity'] for s in stocks)
-        total_current_value = sum(s['current_price'] * s['quantity'] for s in stocks)
-        total_profit_loss = total_current_value - total_investment
+        metrics = PortfolioValuation.from_holdings(stocks=stocks).totals()
         
         return jsonify({
             'success': True,
             'data': stocks,
-            'total_profit_loss': round(total_profit_loss, 2),
-            'net_worth': round(total_current_value, 2)
+            'total_profit_loss': metrics['total_profit_loss'],
+            'net_worth': metrics['total_current_value'],
+            'day_change': metrics['day_change']
         }), 200
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -621,7 +819,8 @@ def update_stock_prices():
                     firebase_service.update_stock_price(
                         stock['id'],
                         current_price,
-                        profit_loss
+                        profit_loss,
+                        previous_close=roll_previous_close(stock)
                     )
                     
                     updated_stocks.append({
@@ -640,7 +839,11 @@ def update_stock_prices():
                     'symbol': stock['symbol'],
                     'reason': str(e)
                 })
-        
+
+        # Fresh quotes double as alert ticks
+        if alert_evaluator and updated_stocks:
+            alert_evaluator.feed.publish({s['symbol']: s['current_price'] for s in updated_stocks})
+
         return jsonify({
             'success': True,
             'message': f'Updated {len(updated_stocks)} stocks with real live prices',
@@ -756,7 +959,8 @@ def update_crypto_prices():
             
             if current_price:
                 profit_loss = (current_price - coin['buy_price']) * coin['quantity']
-                firebase_service.update_crypto_price(coin['id'], current_price, profit_loss)
+                firebase_service.update_crypto_price(coin['id'], current_price, profit_loss,
+                                                     previous_close=roll_previous_close(coin))
                 updated.append({'id': coin['id'], 'price': current_price})
         
         return jsonify({'success': True, 'updated': len(updated)}), 200
@@ -777,6 +981,134 @@ def delete_crypto(crypto_id):
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+# ============================================================================
+# PORTFOLIO ANALYTICS ENDPOINTS
+# ============================================================================
+
+@app.route('/api/portfolio/history', methods=['GET'])
+def get_portfolio_history():
+    """
+    Daily portfolio value rebuilt from holdings and cached closing prices
+    Query params: range (1m, 3m, 6m, 1y, 2y, 5y; default 1y)
+    Returns: { success, range, data: [{ date, value, invested, profit_loss }] }
+    """
+    try:
+        range_key = request.args.get('range', '1y').lower()
+        if range_key not in PortfolioAnalytics.RANGES:
+            return jsonify({
+                'success': False,
+                'message': f"Invalid range. Use one of: {', '.join(PortfolioAnalytics.RANGES)}"
+            }), 400
+        
+        history = portfolio_analytics.nav_history(
+            firebase_service.user_id,
+            firebase_service.get_stocks(),
+            firebase_service.get_crypto(),
+            range_key
+        )
+        return jsonify({'success': True, 'range': range_key, 'data': history}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/portfolio/risk', methods=['GET'])
+def get_portfolio_risk():
+    """
+    Risk analytics for current holdings: volatility, max drawdown, VaR and beta
+    Query params: range (default 1y), benchmark (default ^NSEI), confidence (default 0.95)
+    Returns: { success, data: { annualized_volatility, max_drawdown, var_*, beta, coverage, excluded, assets } }
+    """
+    try:
+        range_key = request.args.get('range', '1y').lower()
+        if range_key not in PortfolioAnalytics.RANGES:
+            return jsonify({
+                'success': False,
+                'message': f"Invalid range. Use one of: {', '.join(PortfolioAnalytics.RANGES)}"
+            }), 400
+        
+        confidence = request.args.get('confidence', default=0.95, type=float)
+        if not 0.5 <= confidence < 1:
+            return jsonify({'success': False, 'message': 'Confidence must be between 0.5 and 1'}), 400
+        
+        metrics = portfolio_analytics.risk_metrics(
+            firebase_service.user_id,
+            firebase_service.get_stocks(),
+            firebase_service.get_crypto(),
+            range_key,
+            benchmark=request.args.get('benchmark'),
+            confidence=confidence
+        )
+        return jsonify({'success': True, 'data': metrics}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/portfolio/correlation', methods=['GET'])
+def get_portfolio_correlation():
+    """
+    Pairwise return correlation of holdings and a diversification score
+    Query params: range (default 1y), max_assets (default 20)
+    Returns: { success, data: { symbols, matrix, diversification_score, ... } }
+    """
+    try:
+        range_key = request.args.get('range', '1y').lower()
+        if range_key not in PortfolioAnalytics.RANGES:
+            return jsonify({
+                'success': False,
+                'message': f"Invalid range. Use one of: {', '.join(PortfolioAnalytics.RANGES)}"
+            }), 400
+        
+        max_assets = request.args.get('max_assets', default=PortfolioAnalytics.MAX_CORRELATION_ASSETS, type=int)
+        if max_assets < 2:
+            return jsonify({'success': False, 'message': 'max_assets must be at least 2'}), 400
+        
+        result = portfolio_analytics.correlation_matrix(
+            firebase_service.get_stocks(),
+            firebase_service.get_crypto(),
+            range_key,
+            max_assets=max_assets
+        )
+        return jsonify({'success': True, 'data': result}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/portfolio/rebalance', methods=['POST'])
+def rebalance_portfolio():
+    """
+    Optimal long-only target weights and the trades to reach them
+    Expected JSON: { method ('mean_variance' | 'risk_parity'), range, risk_aversion,
+                     min_weight, max_weight, min_trade_value } (all optional)
+    Returns: { success, data: { weights, trades, expected_return, expected_volatility } }
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        range_key = str(data.get('range', '1y')).lower()
+        if range_key not in PortfolioAnalytics.RANGES:
+            return jsonify({
+                'success': False,
+                'message': f"Invalid range. Use one of: {', '.join(PortfolioAnalytics.RANGES)}"
+            }), 400
+        
+        try:
+            result = portfolio_analytics.rebalance(
+                firebase_service.get_stocks(),
+                firebase_service.get_crypto(),
+                method=data.get('method', 'mean_variance'),
+                range_key=range_key,
+                risk_aversion=float(data.get('risk_aversion', 3.0)),
+                min_weight=float(data.get('min_weight', 0.0)),
+                max_weight=float(data.get('max_weight', 1.0)),
+                min_trade_value=float(data.get('min_trade_value', 0.0))
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        return jsonify({'success': True, 'data': result}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
 # ============================================================================
 # ALERT ENDPOINTS & FCM
 # ============================================================================
@@ -800,19 +1132,57 @@ def add_alert():
     """Add new price alert"""
     try:
         data = request.get_json()
-        # Basic validation could go here
+        alert_type = data.get('type')
+        if alert_type not in AlertIndex.ABOVE_TYPES + AlertIndex.BELOW_TYPES + tuple(PortfolioAlertBook.TYPES):
+            return jsonify({'success': False, 'message': f'Unsupported alert type: {alert_type}'}), 400
         
         alert_record = {
             'investmentId': data.get('investmentId'),
             'investmentName': data.get('investmentName'),
             'symbol': data.get('symbol'),
-            'type': data.get('type'),
+            'type': alert_type,
             'value': float(data.get('value')),
             'triggered': False,
             'created_at': datetime.now().isoformat()
         }
+        # The holding the alert refers to (by investmentId, else by symbol)
+        stocks, crypto = firebase_service.get_stocks(), firebase_service.get_crypto()
+        holding = next((h for h in stocks + crypto if h.get('id') == data.get('investmentId')), None) or \
+            next((h for h in stocks + crypto
+                  if AlertIndex.normalize_symbol(h.get('symbol')) == AlertIndex.normalize_symbol(data.get('symbol'))), None)
+
+        # Crypto trades 24/7 under plain symbols like 'BTC'; the monitor's
+        # market calendar needs the asset class to poll it around the clock
+        asset_class = data.get('asset_class')
+        if asset_class not in ('stock', 'crypto') and holding is not None:
+            asset_class = 'crypto' if any(holding is h for h in crypto) else 'stock'
+        if asset_class in ('stock', 'crypto'):
+            alert_record['asset_class'] = asset_class
+        # Crypto quotes are fetched by coin_id, not by the plain symbol
+        coin_id = data.get('coin_id') or (holding or {}).get('coin_id')
+        if asset_class == 'crypto' and coin_id:
+            alert_record['coin_id'] = coin_id
+
+        # Baseline for 'percent_move' alerts, stored so it survives restarts:
+        # the given price, else the holding's current price, else a live quote
+        reference_price = data.get('reference_price')
+        if reference_price is None and alert_type == 'percent_move':
+            reference_price = (holding or {}).get('current_price')
+            if not reference_price and asset_class == 'crypto':
+                reference_price = crypto_service.get_live_price(coin_id) if coin_id else None
+            elif not reference_price:
+                reference_price = stock_service.get_live_price(data.get('symbol'))
+            if not reference_price:
+                return jsonify({'success': False, 'message': 'Could not get a current price for this symbol'}), 400
+        if reference_price is not None:
+            alert_record['reference_price'] = float(reference_price)
         
         alert_id = firebase_service.add_alert(alert_record)
+        alert = {**alert_record, 'id': alert_id, 'user_id': firebase_service.user_id}
+        if alert_evaluator:
+            alert_evaluator.add_alert(alert)
+        else:
+            alert_index.add(alert)
         return jsonify({'success': True, 'id': alert_id}), 201
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -831,6 +1201,11 @@ def delete_alert(alert_id):
     """Delete alert"""
     try:
         success = firebase_service.delete_alert(alert_id)
+        if success:
+            if alert_evaluator:
+                alert_evaluator.remove_alert(firebase_service.user_id, alert_id)
+            else:
+                alert_index.remove(firebase_service.user_id, alert_id)
         return jsonify({'success': success}), 200
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -867,6 +1242,7 @@ def chat():
                 expenses_list = []
                 income_list = []
                 stocks_list = []
+                crypto_list = []
                 
                 # Try to fetch expenses
                 try:
@@ -886,19 +1262,28 @@ def chat():
                 except Exception as e:
                     print(f"Could not fetch stocks: {e}")
                 
+                # Try to fetch crypto
+                try:
+                    crypto_list = firebase_service.get_crypto()
+                except Exception as e:
+                    print(f"Could not fetch crypto: {e}")
+                
+                holdings = stocks_list + crypto_list
+                metrics = PortfolioValuation.from_holdings(stocks_list, crypto_list).totals()
+                
                 # Format data for chat service (expects 'data' key)
                 user_data = {
                     'expenses': {'data': expenses_list} if expenses_list else None,
                     'income': {'data': income_list} if income_list else None,
                     'portfolio': {
-                        'data': stocks_list,
-                        'net_worth': sum(s.get('current_price', 0) * s.get('quantity', 0) for s in stocks_list),
-                        'total_profit_loss': sum(s.get('profit_loss', 0) for s in stocks_list)
-                    } if stocks_list else None
+                        'data': holdings,
+                        'net_worth': metrics['total_current_value'],
+                        'total_profit_loss': metrics['total_profit_loss']
+                    } if holdings else None
                 }
                 
                 # Only send if we have actual data
-                if not any([expenses_list, income_list, stocks_list]):
+                if not any([expenses_list, income_list, holdings]):
                     user_data = None
                     
             except Exception as e:
@@ -0,0 +1,170 @@
+"""
+Alert Engine Benchmark
+Purpose: Measure the alert pipeline at scale without Firestore, FCM or market APIs
+Uses: In-memory FirebaseService store, a synthetic random-walk market and the
+      alert_monitor evaluation path (full polling cycles or quote-change events)
+
+Usage:
+    python benchmark_alerts.py --alerts 100000 --symbols 5000 --users 5000 --ticks 20
+    python benchmark_alerts.py --mode event --portfolio-share 0.5
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from firebase_service import FirebaseService
+from alert_monitor import AlertMonitor, AlertEvaluator, FCM_BATCH_SIZE
+from quote_feed import QuoteFeed
+
+
+class SyntheticMarket:
+    """
+    Stand-in for StockService: every symbol follows a geometric random walk,
+    advanced one step per tick().
+    """
+
+    def __init__(self, symbols, volatility=0.01, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.symbols = list(symbols)
+        self.volatility = volatility
+        self._prices = self.rng.uniform(50, 5000, len(self.symbols))
+        self.calls = 0
+
+    def prices(self):
+        return dict(zip(self.symbols, self._prices.tolist()))
+
+    def tick(self):
+        shocks = self.rng.normal(0, self.volatility, len(self.symbols))
+        self._prices = self._prices * np.exp(shocks)
+
+    def get_batch_prices(self, symbols):
+        self.calls += 1
+        current = self.prices()
+        return {symbol: current.get(symbol) for symbol in symbols}
+
+
+class CountingNotifier:
+    """Stand-in for FCM: accepts everything and records the batch sizes sent."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, notifications):
+        for i in range(0, len(notifications), FCM_BATCH_SIZE):
+            self.batch_sizes.append(len(notifications[i:i + FCM_BATCH_SIZE]))
+        return [True] * len(notifications)
+
+
+def build_store(args, market):
+    """
+    Seed an in-memory store with users, holdings, FCM tokens and alerts.
+    Price thresholds sit within a few percent of the starting price so a share
+    of them triggers over the run.
+    """
+    rng = np.random.default_rng(args.seed + 1)
+    store = FirebaseService(local_path=FirebaseService.MEMORY_STORE)
+    start_prices = market.prices()
+    symbols = market.symbols
+
+    users = {}
+    for u in range(args.users):
+        users[f"user{u}"] = {'income': [], 'expenses': [], 'stocks': [], 'alerts': {}, 'fcm_token': f"token{u}"}
+
+    portfolio_types = ['profit', 'loss', 'profit_amount', 'loss_amount', 'percent_move']
+    for a in range(args.alerts):
+        user_id = f"user{rng.integers(args.users)}"
+        symbol = symbols[rng.integers(len(symbols))]
+        price = start_prices[symbol]
+        bucket = users[user_id]
+        alert = {'id': f"alert{a}", 'symbol': symbol, 'triggered': False}
+
+        if rng.random() < args.portfolio_share:
+            holding_id = f"h{a}"
+            buy_price = price * rng.uniform(0.9, 1.1)
+            quantity = float(rng.integers(1, 100))
+            bucket['stocks'].append({'id': holding_id, 'symbol': symbol, 'quantity': quantity,
+                                     'buy_price': buy_price, 'current_price': price})
+            alert_type = portfolio_types[a % len(portfolio_types)]
+            value = float(rng.uniform(1, 15))
+            if alert_type.endswith('_amount'):
+                value = round(value / 100 * buy_price * quantity, 2)
+            alert.update({'investmentId': holding_id, 'type': alert_type, 'value': value})
+        elif a % 2:
+            alert.update({'type': 'target', 'value': price * rng.uniform(1.005, 1.1)})
+        else:
+            alert.update({'type': 'below', 'value': price * rng.uniform(0.9, 0.995)})
+        bucket['alerts'][alert['id']] = alert
+
+    store._write_local({'users': users})
+    return store
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 2) if values else 0.0
+
+
+def run(args):
+    symbols = [f"SYM{i}.NS" for i in range(args.symbols)]
+    market = SyntheticMarket(symbols, args.volatility, args.seed)
+
+    started = time.perf_counter()
+    store = build_store(args, market)
+    seed_ms = (time.perf_counter() - started) * 1000
+
+    notifier = CountingNotifier()
+    monitor = AlertMonitor(store, market, notifier=notifier)
+    started = time.perf_counter()
+    monitor.load_index()
+    load_ms = (time.perf_counter() - started) * 1000
+
+    cycle_ms, evaluated, triggered = [], 0, 0
+    if args.mode == 'event':
+        evaluator = AlertEvaluator(monitor, QuoteFeed(market))
+        evaluator.feed.subscribe(evaluator.on_quotes)
+        evaluator.sync_watchlist()
+
+    for _ in range(args.ticks):
+        market.tick()
+        alerts_before = len(monitor.index) + len(monitor.portfolio_alerts)
+        started = time.perf_counter()
+        if args.mode == 'event':
+            evaluator.last_stats = None
+            evaluator.feed.refresh()
+            triggered += (evaluator.last_stats or {}).get('triggered', 0)
+        else:
+            triggered += monitor.check_alerts()['triggered']
+        cycle_ms.append((time.perf_counter() - started) * 1000)
+        evaluated += alerts_before
+
+    total_s = sum(cycle_ms) / 1000
+    batches = notifier.batch_sizes
+    print("\n" + "=" * 70)
+    print(f"ALERT ENGINE BENCHMARK ({args.mode} mode)")
+    print("=" * 70)
+    print(f"Scale:            {args.alerts} alerts, {args.symbols} symbols, {args.users} users, {args.ticks} ticks")
+    print(f"Seed / index:     {seed_ms:.0f} ms / {load_ms:.0f} ms")
+    print(f"Cycle time (ms):  p50 {percentile(cycle_ms, 50)}  p95 {percentile(cycle_ms, 95)}  max {percentile(cycle_ms, 100)}")
+    print(f"Throughput:       {evaluated / total_s:,.0f} alerts evaluated/s" if total_s else "Throughput: n/a")
+    print(f"Triggered:        {triggered} ({len(monitor.index) + len(monitor.portfolio_alerts)} still active)")
+    print(f"Dispatch batches: {len(batches)}  sizes p50 {percentile(batches, 50)}  max {max(batches) if batches else 0}")
+    print(f"Market calls:     {market.calls}")
+    print("=" * 70)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the alert engine against synthetic data')
+    parser.add_argument('--alerts', type=int, default=100000)
+    parser.add_argument('--symbols', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--ticks', type=int, default=20)
+    parser.add_argument('--volatility', type=float, default=0.01, help='Per-tick log-return standard deviation')
+    parser.add_argument('--portfolio-share', type=float, default=0.3, help='Share of profit/loss and percent-move alerts')
+    parser.add_argument('--mode', choices=['cycle', 'event'], default='cycle')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,283 @@
+"""
+Categorizer Benchmark
+Purpose: Measure speed and accuracy of every ExpenseCategorizer tier on labelled data
+Uses: A synthetic labelled merchant corpus (or a CSV of merchant,category), an
+      in-memory cache and a local HTTP stand-in for the LLM, so nothing
+      leaves the machine
+
+Usage:
+    python benchmark_categorizer.py --samples 4000 --llm-latency 200
+    python benchmark_categorizer.py --corpus labelled_expenses.csv --llm-error-rate 0.05
+"""
+
+import argparse
+import csv
+import json
+import random
+import re
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import numpy as np
+
+from ai_categorizer import ExpenseCategorizer
+from category_cache import CategoryCache, normalize_merchant
+from merchant_classifier import MerchantClassifier
+from merchant_index import MerchantIndex
+
+
+# Brands per category; most are deliberately absent from the keyword rules so
+# the cache, local model and LLM tiers have work to do
+BRANDS = {
+    'Food': ['Swiggy', 'Zomato', 'Haldiram', 'Barbeque Nation', 'Chaayos', 'Starbucks', 'Dominos',
+             'Burger King', 'Faasos', 'Wow Momo', 'Behrouz Biryani', 'Third Wave Coffee'],
+    'Transport': ['Rapido', 'IRCTC', 'IndiGo', 'Indian Oil', 'Uber', 'Ola Cabs', 'BluSmart',
+                  'FASTag', 'Namma Yatri', 'Vistara', 'Bharat Petroleum', 'RedBus'],
+    'Shopping': ['Myntra', 'Ajio', 'Nykaa', 'DMart', 'Amazon', 'Flipkart', 'Croma',
+                 'Decathlon', 'Meesho', 'Reliance Trends', 'IKEA', 'Lenskart'],
+    'Entertainment': ['BookMyShow', 'Hotstar', 'PVR', 'Netflix', 'Spotify', 'JioCinema',
+                      'Prime Video', 'SonyLIV', 'INOX', 'Zee5', 'Gaana', 'Steam'],
+    'Utilities': ['Airtel', 'Jio', 'BSNL', 'Tata Power', 'BESCOM', 'ACT Fibernet',
+                  'Mahanagar Gas', 'Vodafone Idea', 'Adani Electricity', 'Hathway', 'Tata Play', 'MSEDCL'],
+    'Healthcare': ['Apollo Pharmacy', 'Tata 1mg', 'PharmEasy', 'Practo', 'Cult Fit', 'Max Healthcare',
+                   'Fortis', 'Netmeds', 'Medplus', 'Manipal Hospitals', 'Lal PathLabs', 'Cureja'],
+    'Education': ['Byjus', 'Unacademy', 'Coursera', 'Udemy', 'Vedantu', 'upGrad',
+                  'Physics Wallah', 'Scaler', 'Simplilearn', 'Khan Academy', 'Great Learning', 'Toppr'],
+}
+
+# How merchants appear on statements
+TEMPLATES = [
+    '{name}', '{upper}', '{upper} PVT LTD', '{name} Inc', 'UPI-{upper}-{ref}', '{lower}*{digits}',
+    'POS {upper} {city}', '{lower}.com', '{name} #{store}', '{typo}',
+]
+CITIES = ['MUMBAI', 'BENGALURU', 'DELHI', 'PUNE', 'CHENNAI', 'HYDERABAD']
+
+
+def generate_corpus(samples, seed=0):
+    """
+    Labelled statement-style merchant strings.
+    Returns: list - [(merchant, category)]
+    """
+    rng = random.Random(seed)
+    brands = [(name, category) for category, names in BRANDS.items() for name in names]
+    corpus = []
+    for _ in range(samples):
+        name, category = rng.choice(brands)
+        drop = rng.randrange(len(name))
+        merchant = rng.choice(TEMPLATES).format(
+            name=name, upper=name.upper(), lower=name.lower().replace(' ', ''),
+            ref=rng.randrange(10 ** 8, 10 ** 9), digits=rng.randrange(1000, 99999),
+            city=rng.choice(CITIES), store=rng.randrange(100, 9999),
+            typo=name[:drop] + name[drop + 1:] if len(name) > 5 else name,
+        )
+        corpus.append((merchant, category))
+    return corpus
+
+
+def load_corpus(path):
+    """Labelled corpus from a CSV with merchant and category columns."""
+    with open(path, newline='', encoding='utf-8') as f:
+        return [(row['merchant'], row['category']) for row in csv.DictReader(f)
+                if row.get('merchant') and row.get('category')]
+
+
+# ============================================================================
+# LLM STAND-IN
+# ============================================================================
+
+class StandInLLM:
+    """
+    Local HTTP server answering the categorizer's prompts from the corpus
+    labels after a fixed delay, with a configurable share of wrong answers.
+    """
+
+    def __init__(self, labels, latency_ms=150, error_rate=0.0, seed=0):
+        self.labels = labels          # normalized merchant -> category
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.categories = sorted(set(labels.values()))
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/generate"
+
+    def _handler(self):
+        llm = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                text = llm.answer(body['prompt'])
+                time.sleep(llm.latency)
+                payload = json.dumps({'text': text}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _label(self, merchant):
+        category = self.labels.get(normalize_merchant(merchant), 'Other')
+        if self.error_rate and self.rng.random() < self.error_rate:
+            category = self.rng.choice([c for c in self.categories if c != category] or ['Other'])
+        return category
+
+    def answer(self, prompt):
+        """Reply to a single-merchant prompt with a word, a batch prompt with JSON."""
+        self.requests += 1
+        batch = re.search(r'^(\{.*\})$', prompt, re.MULTILINE)
+        if batch:
+            merchants = json.loads(batch.group(1))
+            return json.dumps({key: self._label(name) for key, name in merchants.items()})
+        single = re.search(r"merchant: '(.*)' into", prompt)
+        return self._label(single.group(1)) if single else 'Other'
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class StandInModel:
+    """Client with the generate_content() shape of the Gemini model object."""
+
+    def __init__(self, url):
+        self.url = url
+
+    def generate_content(self, prompt, generation_config=None):
+        request = urllib.request.Request(
+            self.url, data=json.dumps({'prompt': prompt}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return SimpleNamespace(text=json.loads(response.read())['text'])
+
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+
+def build_categorizer(llm_url=None):
+    """Categorizer with in-memory cache, untrained model and a merchant index."""
+    categorizer = ExpenseCategorizer(
+        cache=CategoryCache(':memory:'), classifier=MerchantClassifier(), merchant_index=MerchantIndex(),
+    )
+    if llm_url:
+        categorizer.model = StandInModel(llm_url)
+        categorizer.use_ai = True
+    return categorizer
+
+
+def measure(name, samples, resolve):
+    """
+    Time resolve(merchant) for every sample and score its answers.
+    resolve returns a category, or None when the tier has no answer.
+    Returns: dict - Tier statistics
+    """
+    latencies, answered, correct = [], 0, 0
+    started = time.perf_counter()
+    for merchant, expected in samples:
+        call_started = time.perf_counter()
+        category = resolve(merchant)
+        latencies.append((time.perf_counter() - call_started) * 1e6)
+        if category:
+            answered += 1
+            correct += category == expected
+    elapsed = time.perf_counter() - started
+    return {
+        'tier': name,
+        'samples': len(samples),
+        'throughput': len(samples) / elapsed if elapsed else 0.0,
+        'p50_us': float(np.percentile(latencies, 50)) if latencies else 0.0,
+        'p95_us': float(np.percentile(latencies, 95)) if latencies else 0.0,
+        'p99_us': float(np.percentile(latencies, 99)) if latencies else 0.0,
+        'coverage': answered / len(samples) if samples else 0.0,
+        'accuracy': correct / answered if answered else 0.0,
+    }
+
+
+def run(args):
+    corpus = load_corpus(args.corpus) if args.corpus else generate_corpus(args.samples, args.seed)
+    random.Random(args.seed).shuffle(corpus)
+    split = int(len(corpus) * args.train_share)
+    train, test = corpus[:split], corpus[split:]
+    labels = {normalize_merchant(merchant): category for merchant, category in corpus}
+    valid = set(ExpenseCategorizer.CATEGORY_RULES)
+
+    llm = StandInLLM(labels, args.llm_latency, args.llm_error_rate, args.seed).start()
+    results = []
+    try:
+        # Rules: default keyword automaton only
+        categorizer = build_categorizer()
+        results.append(measure('rules', test, lambda m: (
+            lambda c: None if c == 'Uncategorized' else c)(categorizer.match_rules(m))))
+
+        # Cache: warmed with the training split; test spellings hit via canonical ids
+        for merchant, category in train:
+            categorizer.cache.set(categorizer.merchant_key(merchant), category)
+        results.append(measure('cache', test, lambda m: categorizer.cache.get(categorizer.merchant_key(m))))
+
+        # Local model: trained on the training split, confident answers only
+        categorizer.learn(*zip(*train))
+        classifier = categorizer.classifier
+        results.append(measure('model', test, lambda m: (
+            lambda p: p[0] if p[1] >= classifier.MIN_CONFIDENCE else None)(classifier.predict(m))))
+
+        # LLM: one stand-in HTTP round trip per merchant
+        llm_sample = test[:args.llm_samples]
+        categorizer = build_categorizer(llm.url)
+        results.append(measure('llm', llm_sample, categorizer._llm_categorize))
+
+        # Full pipeline: trained model, cold cache, LLM for what the local tiers miss
+        categorizer = build_categorizer(llm.url)
+        categorizer.learn(*zip(*train))
+        results.append(measure('pipeline', llm_sample, lambda m: (
+            lambda c: c if c in valid else None)(categorizer.categorize(m))))
+        pipeline_tiers = dict(categorizer.tier_counts)
+    finally:
+        llm.stop()
+
+    print("\n" + "=" * 78)
+    print("CATEGORIZER BENCHMARK")
+    print("=" * 78)
+    print(f"Corpus:   {len(corpus)} labelled merchants ({len(train)} train / {len(test)} test)"
+          f"{' from ' + args.corpus if args.corpus else ' (synthetic)'}")
+    print(f"LLM:      local stand-in, {args.llm_latency:.0f} ms latency, {args.llm_error_rate:.0%} wrong answers, "
+          f"{llm.requests} requests")
+    print("-" * 78)
+    print(f"{'tier':<10}{'samples':>8}{'ops/s':>12}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}"
+          f"{'coverage':>10}{'accuracy':>10}")
+    for r in results:
+        print(f"{r['tier']:<10}{r['samples']:>8}{r['throughput']:>12,.0f}{r['p50_us']:>10.1f}"
+              f"{r['p95_us']:>10.1f}{r['p99_us']:>10.1f}{r['coverage']:>10.1%}{r['accuracy']:>10.1%}")
+    print("-" * 78)
+    print(f"Pipeline tiers: {pipeline_tiers}")
+    print("=" * 78)
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark ExpenseCategorizer tiers on labelled merchants')
+    parser.add_argument('--corpus', help='CSV with merchant,category columns (default: synthetic corpus)')
+    parser.add_argument('--samples', type=int, default=4000, help='Synthetic corpus size')
+    parser.add_argument('--train-share', type=float, default=0.5, help='Share used to warm the cache and train the model')
+    parser.add_argument('--llm-samples', type=int, default=200, help='Test merchants sent through the LLM tiers')
+    parser.add_argument('--llm-latency', type=float, default=150, help='Stand-in LLM response delay (ms)')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help='Share of wrong stand-in answers')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -22,17 +22,18 @@ class BudgetService:
         
         try:
             if self.db.use_local or not self.db.db:
-                data = self.db._read_local()
-                bucket = self.db._user_bucket(data)
-                
-                # Upsert budget
-                budgets = bucket.setdefault('budgets', [])
-                # Remove existing for this category
-                budgets = [b for b in budgets if b['category'] != category]
-                budgets.append(record)
-                bucket['budgets'] = budgets
-                
-                self.db._write_local(data)
+                with self.db._local_lock:
+                    data = self.db._read_local()
+                    bucket = self.db._user_bucket(data)
+
+                    # Upsert budget
+                    budgets = bucket.setdefault('budgets', [])
+                    # Remove existing for this category
+                    budgets = [b for b in budgets if b['category'] != category]
+                    budgets.append(record)
+                    bucket['budgets'] = budgets
+
+                    self.db._write_local(data)
                 return True
                 
             # Firebase implementation (omitted for local-first preference but robust)
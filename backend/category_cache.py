@@ -0,0 +1,206 @@
+"""
+Category Cache Module
+Purpose: Remember merchant -> category answers so repeat merchants skip the LLM
+Provides: Two-tier cache (in-memory LRU over a SQLite file) with TTL, eviction
+          and hit-rate metrics
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_merchant(name):
+    """Cache key for a merchant: lowercase words, punctuation and extra spaces removed."""
+    return ' '.join(re.sub(r'[^a-z0-9&]+', ' ', (name or '').lower()).split())
+
+
+class CategoryCache:
+    """
+    Merchant -> category cache.
+      - Tier 1: in-memory LRU (OrderedDict) of `capacity` entries.
+      - Tier 2: SQLite table of up to `disk_capacity` entries that survives
+        restarts; oldest entries are evicted first.
+    Entries in both tiers expire after `ttl_seconds`.
+    """
+
+    DEFAULT_TTL = 30 * 24 * 3600   # 30 days
+    MEMORY_CAPACITY = 10000
+    DISK_CAPACITY = 200000
+    # Disk eviction runs once per this many writes
+    EVICT_EVERY = 500
+
+    def __init__(self, path='category_cache.db', capacity=None, disk_capacity=None, ttl_seconds=None):
+        """
+        Args:
+            path (str) - SQLite file, ':memory:' for a process-only store, or None
+                to disable the disk tier
+            capacity (int) - Max in-memory entries
+            disk_capacity (int) - Max on-disk entries
+            ttl_seconds (float) - Entry lifetime
+        """
+        self.capacity = capacity or self.MEMORY_CAPACITY
+        self.disk_capacity = disk_capacity or self.DISK_CAPACITY
+        self.ttl = ttl_seconds or self.DEFAULT_TTL
+        self._memory = OrderedDict()   # key -> (category, expires_at)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.metrics = {
+            'memory_hits': 0, 'disk_hits': 0, 'misses': 0,
+            'writes': 0, 'memory_evictions': 0, 'disk_evictions': 0, 'expired': 0,
+        }
+
+        self._db = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS merchant_category ('
+                    ' merchant TEXT PRIMARY KEY, category TEXT NOT NULL,'
+                    ' source TEXT, expires_at REAL NOT NULL, updated_at REAL NOT NULL)'
+                )
+                self._db.execute('CREATE INDEX IF NOT EXISTS idx_merchant_updated ON merchant_category(updated_at)')
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Category cache disk tier disabled: {e}")
+                self._db = None
+
+    # ========================================================================
+    # LOOKUPS
+    # ========================================================================
+
+    def get(self, merchant):
+        """
+        Cached category for a merchant.
+        Args: merchant (str) - Raw merchant name
+        Returns: str or None
+        """
+        key = normalize_merchant(merchant)
+        if not key:
+            return None
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                category, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.metrics['memory_hits'] += 1
+                    return category
+                del self._memory[key]
+                self.metrics['expired'] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT category, expires_at FROM merchant_category WHERE merchant = ?', (key,)
+                ).fetchone()
+                if row and row[1] > now:
+                    self._remember(key, row[0], row[1])
+                    self.metrics['disk_hits'] += 1
+                    return row[0]
+                if row:
+                    self._db.execute('DELETE FROM merchant_category WHERE merchant = ?', (key,))
+                    self._db.commit()
+                    self.metrics['expired'] += 1
+
+            self.metrics['misses'] += 1
+            return None
+
+    # ========================================================================
+    # UPDATES
+    # ========================================================================
+
+    def set(self, merchant, category, source='llm'):
+        """
+        Store a merchant's category in both tiers.
+        Args:
+            merchant (str) - Raw merchant name
+            category (str) - Category to cache
+            source (str) - Where the answer came from (llm, user, ...)
+        """
+        key = normalize_merchant(merchant)
+        if not key or not category:
+            return
+        now = time.time()
+        expires_at = now + self.ttl
+
+        with self._lock:
+            self._remember(key, category, expires_at)
+            self.metrics['writes'] += 1
+            if self._db is None:
+                return
+            self._db.execute(
+                'INSERT OR REPLACE INTO merchant_category (merchant, category, source, expires_at, updated_at)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                (key, category, source, expires_at, now),
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict_disk(now)
+            self._db.commit()
+
+    def invalidate(self, merchant):
+        """Forget a merchant (e.g. after the user corrects its category)."""
+        key = normalize_merchant(merchant)
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._db is not None:
+                self._db.execute('DELETE FROM merchant_category WHERE merchant = ?', (key,))
+                self._db.commit()
+
+    def _remember(self, key, category, expires_at):
+        """Insert into the LRU tier (called under the lock)."""
+        self._memory[key] = (category, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+            self.metrics['memory_evictions'] += 1
+
+    def _evict_disk(self, now):
+        """Drop expired rows, then the oldest rows above disk_capacity (called under the lock)."""
+        expired = self._db.execute('DELETE FROM merchant_category WHERE expires_at <= ?', (now,)).rowcount
+        overflow = self._db.execute('SELECT COUNT(*) FROM merchant_category').fetchone()[0] - self.disk_capacity
+        evicted = 0
+        if overflow > 0:
+            evicted = self._db.execute(
+                'DELETE FROM merchant_category WHERE merchant IN '
+                '(SELECT merchant FROM merchant_category ORDER BY updated_at LIMIT ?)', (overflow,)
+            ).rowcount
+        self.metrics['expired'] += max(expired, 0)
+        self.metrics['disk_evictions'] += max(evicted, 0)
+
+    # ========================================================================
+    # METRICS
+    # ========================================================================
+
+    def stats(self):
+        """
+        Hit-rate metrics for both tiers.
+        Returns: dict
+        """
+        with self._lock:
+            stats = dict(self.metrics)
+            stats['memory_entries'] = len(self._memory)
+            stats['disk_entries'] = (
+                self._db.execute('SELECT COUNT(*) FROM merchant_category').fetchone()[0]
+                if self._db is not None else 0
+            )
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['lookups'] = lookups
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        stats['memory_hit_rate'] = round(stats['memory_hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+    @classmethod
+    def from_env(cls):
+        """Cache configured by CATEGORY_CACHE_PATH / CATEGORY_CACHE_TTL_DAYS / CATEGORY_CACHE_SIZE."""
+        ttl_days = float(os.getenv('CATEGORY_CACHE_TTL_DAYS', '30'))
+        return cls(
+            path=os.getenv('CATEGORY_CACHE_PATH', 'category_cache.db'),
+            capacity=int(os.getenv('CATEGORY_CACHE_SIZE', str(cls.MEMORY_CAPACITY))),
+            ttl_seconds=ttl_days * 24 * 3600,
+        )
@@ -0,0 +1,83 @@
+"""
+Category Refiner Module
+Purpose: Refine expense categories with the LLM off the request path
+Provides: Background worker pool that re-categorizes pending expenses and
+          writes the result back through FirebaseService
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from category_cache import normalize_merchant
+
+
+class CategoryRefiner:
+    """
+    Expenses are saved with a quick (cache or rule) category and
+    'category_pending': True. The refiner asks the LLM in a small thread
+    pool and updates each record. Expenses for a merchant already being
+    refined join that request instead of triggering another LLM call.
+    Records the user has corrected meanwhile (pending flag cleared) are
+    left alone.
+    """
+
+    DEFAULT_WORKERS = int(os.getenv('CATEGORY_REFINER_WORKERS', '2'))
+
+    def __init__(self, categorizer, store, max_workers=None):
+        """
+        Args:
+            categorizer (ExpenseCategorizer) - Source of LLM categories
+            store (FirebaseService) - Where expense records are updated
+            max_workers (int) - Concurrent LLM requests
+        """
+        self.categorizer = categorizer
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or self.DEFAULT_WORKERS,
+                                            thread_name_prefix='category-refiner')
+        self._pending = {}   # (user id, normalized merchant) -> [expense ids]
+        self._lock = threading.Lock()
+        self.refined = 0
+
+    def submit(self, expense_id, merchant_name, user_id=None):
+        """
+        Queue an expense for LLM refinement.
+        Args:
+            expense_id (str) - Stored expense document ID
+            merchant_name (str) - Merchant to categorize
+            user_id (str) - Owner, whose custom rules apply
+        """
+        key = (user_id, normalize_merchant(self.categorizer.merchant_key(merchant_name)))
+        with self._lock:
+            if key in self._pending:
+                self._pending[key].append(expense_id)
+                return
+            self._pending[key] = [expense_id]
+        self._executor.submit(self._refine, key, merchant_name)
+
+    def _refine(self, key, merchant_name):
+        user_id = key[0]
+        try:
+            category = self.categorizer.categorize(merchant_name, user_id)
+        except Exception as e:
+            print(f"⚠️ Category refinement failed for '{merchant_name}': {e}")
+            category = None
+
+        with self._lock:
+            expense_ids = self._pending.pop(key, [])
+
+        for expense_id in expense_ids:
+            updates = {'category_pending': False}
+            if category:
+                updates['category'] = category
+            # A manual correction since submit() cleared the flag: keep the user's choice
+            if self.store.update_expense(expense_id, updates, only_if={'category_pending': True}, user_id=user_id):
+                self.refined += 1
+
+    def queue_size(self):
+        """Number of expenses waiting for refinement."""
+        with self._lock:
+            return sum(len(ids) for ids in self._pending.values())
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -6,6 +6,7 @@ Uses: CoinGecko API (Free tier)
 
 import requests
 import time
+from datetime import datetime, timezone
 
 class CryptoService:
     """
@@ -50,6 +51,32 @@ class CryptoService:
             print(f"Error fetching crypto price for {coin_id}: {e}")
             return None
 
+    def get_batch_prices(self, coin_ids):
+        """
+        Fetch live INR prices for several coins in one request.
+        Args: coin_ids (list) - CoinGecko coin IDs (e.g. ['bitcoin', 'ethereum'])
+        Returns: dict - { coin_id: price } for the coins that were found
+        """
+        coin_ids = sorted({coin_id for coin_id in coin_ids if coin_id})
+        if not coin_ids:
+            return {}
+        try:
+            url = f"{self.COINGECKO_API}/simple/price"
+            params = {'ids': ','.join(coin_ids), 'vs_currencies': 'inr'}
+            response = requests.get(url, params=params, timeout=10)
+
+            if response.status_code != 200:
+                print(f"⚠️ CoinGecko prices unavailable: {response.status_code}")
+                return {}
+
+            data = response.json()
+            return {coin_id: float(data[coin_id]['inr']) for coin_id in coin_ids
+                    if data.get(coin_id, {}).get('inr') is not None}
+
+        except Exception as e:
+            print(f"Error fetching crypto prices for {', '.join(coin_ids)}: {e}")
+            return {}
+
     def search_coin(self, query):
         """
         Search for a coin by name or symbol to get its ID.
@@ -62,3 +89,30 @@ class CryptoService:
         except Exception as e:
             print(f"Error searching coin {query}: {e}")
             return []
+
+    def get_price_history(self, coin_id, days):
+        """
+        Fetch daily closing prices for a coin.
+        Args:
+            coin_id (str) - CoinGecko coin ID
+            days (int) - Number of days of history
+        Returns: list of (date_str, price) tuples, oldest first
+        """
+        try:
+            url = f"{self.COINGECKO_API}/coins/{coin_id}/market_chart"
+            params = {'vs_currency': 'inr', 'days': days, 'interval': 'daily'}
+            response = requests.get(url, params=params, timeout=10)
+
+            if response.status_code != 200:
+                print(f"⚠️ CoinGecko history unavailable for {coin_id}: {response.status_code}")
+                return []
+
+            closes = {}
+            for timestamp_ms, price in response.json().get('prices', []):
+                day = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+                closes[day] = float(price)  # Later points of the same day win
+            return sorted(closes.items())
+
+        except Exception as e:
+            print(f"Error fetching crypto history for {coin_id}: {e}")
+            return []
@@ -7,8 +7,12 @@ Provides: CRUD operations for transactions and stocks
 import firebase_admin
 from firebase_admin import credentials
 from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
 from datetime import datetime
 import json
+import os
+import tempfile
+import threading
 import uuid
 
 class FirebaseService:
@@ -17,17 +21,28 @@ class FirebaseService:
     Handles initialization, data persistence, and retrieval.
     """
     
-    def __init__(self, credentials_path='credentials.json', user_id='default_user'):
+    # Alert pages and batched writes/gets are capped at Firestore's limits
+    ALERT_PAGE_SIZE = 500
+    WRITE_BATCH_SIZE = 500
+    GET_BATCH_SIZE = 100
+
+    MEMORY_STORE = ':memory:'
+
+    def __init__(self, credentials_path='credentials.json', user_id='default_user', local_path='local_store.json'):
         """
         Initialize Firebase Firestore connection.
         Args:
             credentials_path (str) - Path to Firebase credentials JSON
             user_id (str) - Current user ID for multi-user support
+            local_path (str) - Local JSON store, or ':memory:' for a process-only store
         """
         try:
             self.user_id = user_id
-            self.local_path = 'local_store.json'
+            self.local_path = local_path
             self.use_local = False
+            self._memory = None
+            # Serializes read-modify-write cycles on the local store across threads
+            self._local_lock = threading.RLock()
 
             # Check if credentials file exists
             import os
@@ -41,7 +56,7 @@ class FirebaseService:
                 return
             
             # Initialize Firebase app (if not already initialized)
-            if not firebase_admin.get_app():
+            if not firebase_admin._apps:
                 cred = credentials.Certificate(credentials_path)
                 firebase_admin.initialize_app(cred)
             
@@ -61,6 +76,9 @@ class FirebaseService:
     # --------------------------------------------------------------------
     def _ensure_local_store(self):
         """Create a minimal local JSON store if missing."""
+        if self.local_path == self.MEMORY_STORE:
+            self._memory = {'users': {self.user_id: {'income': [], 'expenses': [], 'stocks': []}}}
+            return
         try:
             import os
             if not os.path.exists(self.local_path):
@@ -78,12 +96,40 @@ class FirebaseService:
             print(f"Error creating local store: {e}")
 
     def _read_local(self):
+        if self.local_path == self.MEMORY_STORE:
+            return self._memory
         with open(self.local_path, 'r', encoding='utf-8') as f:
             return json.load(f)
 
     def _write_local(self, data):
-        with open(self.local_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        """Persist the local store (call with _local_lock held for read-modify-write)."""
+        if self.local_path == self.MEMORY_STORE:
+            self._memory = data
+            return
+        # Write a sibling temp file and swap it in, so a crash or a concurrent
+        # reader never sees a half-written store
+        directory = os.path.dirname(os.path.abspath(self.local_path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.local_store.', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.local_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _user_alerts(self, data, user_id=None):
+        """Local alerts for a user, stored as { alert_id: alert } for O(1) lookups."""
+        users = data.setdefault('users', {})
+        user = users.setdefault(user_id or self.user_id, {'income': [], 'expenses': [], 'stocks': []})
+        alerts = user.get('alerts')
+        if not isinstance(alerts, dict):
+            alerts = {a['id']: a for a in (alerts or []) if a.get('id')}
+            user['alerts'] = alerts
+        return alerts
 
     def _user_bucket(self, data):
         users = data.setdefault('users', {})
@@ -106,13 +152,14 @@ class FirebaseService:
         try:
             # Add document to user's income collection
             if self.use_local or not self.db:
-                data = self._read_local()
-                bucket = self._user_bucket(data)
-                doc_id = self._new_id()
-                record = {**income_record, 'id': doc_id}
-                bucket['income'].insert(0, record)
-                self._write_local(data)
-                return doc_id
+                with self._local_lock:
+                    data = self._read_local()
+                    bucket = self._user_bucket(data)
+                    doc_id = self._new_id()
+                    record = {**income_record, 'id': doc_id}
+                    bucket['income'].insert(0, record)
+                    self._write_local(data)
+                    return doc_id
             doc_ref = self.db.collection('users').document(self.user_id)\
                       .collection('income').add(income_record)
             return doc_ref[1].id
@@ -153,11 +200,12 @@ class FirebaseService:
         """
         try:
             if self.use_local or not self.db:
-                data = self._read_local()
-                bucket = self._user_bucket(data)
-                bucket['income'] = [i for i in bucket.get('income', []) if i.get('id') != income_id]
-                self._write_local(data)
-                return True
+                with self._local_lock:
+                    data = self._read_local()
+                    bucket = self._user_bucket(data)
+                    bucket['income'] = [i for i in bucket.get('income', []) if i.get('id') != income_id]
+                    self._write_local(data)
+                    return True
 
             self.db.collection('users').document(self.user_id)\
                .collection('income').document(income_id).delete()
@@ -178,12 +226,13 @@ class FirebaseService:
         """
         try:
             if self.use_local or not self.db:
-                data = self._read_local()
-                bucket = self._user_bucket(data)
-                doc_id = self._new_id()
-                record = {**expense_record, 'id': doc_id}
-                bucket['expenses'].insert(0, record)
-                self._write_local(data)
+                with self._local_lock:
+                    data = self._read_local()
+                    bucket = self._user_bucket(data)
+                    doc_id = self._new_id()
+                    record = {**expense_record, 'id': doc_id}
+                    bucket['expenses'].insert(0, record)
+                    self._write_local(data)
                 return doc_id
 
             doc_ref = self.db.collection('users').document(self.user_id)\
@@ -226,6 +275,53 @@ class FirebaseService:
             print(f"Error retrieving expenses: {str(e)}")
             return []
     
+    def update_expense(self, expense_id, updates, only_if=None, user_id=None):
+        """
+        Update fields of an expense record.
+        Args:
+            expense_id (str) - Document ID
+            updates (dict) - Fields to set
+            only_if (dict) - Optional { field: value } the stored record must
+                still have; checked and written atomically
+            user_id (str) - Owner (default the current user)
+        Returns: success (bool) - False if missing or only_if did not match
+        """
+        target_user = user_id or self.user_id
+        only_if = only_if or {}
+        try:
+            if self.use_local or not self.db:
+                with self._local_lock:
+                    data = self._read_local()
+                    bucket = data.get('users', {}).get(target_user, {})
+                    for expense in bucket.get('expenses', []):
+                        if expense.get('id') == expense_id:
+                            if any(expense.get(field) != value for field, value in only_if.items()):
+                                return False
+                            expense.update(updates)
+                            self._write_local(data)
+                            return True
+                return False
+
+            ref = self.db.collection('users').document(target_user)\
+                     .collection('expenses').document(expense_id)
+            if not only_if:
+                ref.update(updates)
+                return True
+
+            @firestore.transactional
+            def conditional_update(transaction):
+                snapshot = ref.get(transaction=transaction)
+                stored = snapshot.to_dict() if snapshot.exists else None
+                if stored is None or any(stored.get(field) != value for field, value in only_if.items()):
+                    return False
+                transaction.update(ref, updates)
+                return True
+
+            return conditional_update(self.db.transaction())
+        except Exception as e:
+            print(f"Error updating expense: {str(e)}")
+            return False
+
     def get_expense_statistics(self):
         """
         Get expense totals grouped by category.
@@ -256,11 +352,12 @@ class FirebaseService:
         """
         try:
             if self.use_local or not self.db:
-                data = self._read_local()
-                bucket = self._user_bucket(data)
-                bucket['expenses'] = [e for e in bucket.get('expenses', []) if e.get('id') != expense_id]
-                self._write_local(data)
-                return True
+                with self._local_lock:
+                    data = self._read_local()
+                    bucket = self._user_bucket(data)
+                    bucket['expenses'] = [e for e in bucket.get('expenses', []) if e.get('id') != expense_id]
+                    self._write_local(data)
+                    return True
 
             self.db.collection('users').document(self.user_id)\
                .collection('expenses').document(expense_id).delete()
@@ -281,13 +378,14 @@ class FirebaseService:
         """
         try:
             if self.use_local or not self.db:
-                data = self._read_local()
-                bucket = self._user_bucket(data)
-                doc_id = self._new_id()
-                record = {**stock_record, 'id': doc_id}
-                bucket['stocks'].insert(0, record)
-                self._write_local(data)
-                return doc_id
+                with self._local_lock:
+                    data = self._read_local()
+                    bucket = self._user_bucket(data)
+                    doc_id = self._new_id()
+                    record = {**stock_record, 'id': doc_id}
+                    bucket['stocks'].insert(0, record)
+                    self._write_local(data)
+                    return doc_id
 
             doc_ref = self.db.collection('users').document(self.user_id)\
                       .collection('stocks').add(stock_record)
@@ -320,35 +418,38 @@ class FirebaseService:
             print(f"Error retrieving stocks: {str(e)}")
             return []
     
-    def update_stock_price(self, stock_id, current_price, profit_loss):
+    def update_stock_price(self, stock_id, current_price, profit_loss, previous_close=None):
         """
         Update stock with current price and profit/loss.
         Args:
             stock_id (str) - Document ID
             current_price (float) - Current stock price
             profit_loss (float) - Calculated profit/loss
+            previous_close (float) - Optional close the day change is measured from
         """
+        updates = {
+            'current_price': current_price,
+            'profit_loss': profit_loss,
+            'last_updated': datetime.now().isoformat()
+        }
+        if previous_close is not None:
+            updates['previous_close'] = previous_close
         try:
             if self.use_local or not self.db:
-                data = self._read_local()
-                bucket = self._user_bucket(data)
-                updated = []
-                for s in bucket.get('stocks', []):
-                    if s.get('id') == stock_id:
-                        s['current_price'] = current_price
-                        s['profit_loss'] = profit_loss
-                        s['last_updated'] = datetime.now().isoformat()
-                    updated.append(s)
-                bucket['stocks'] = updated
-                self._write_local(data)
-                return
+                with self._local_lock:
+                    data = self._read_local()
+                    bucket = self._user_bucket(data)
+                    updated = []
+                    for s in bucket.get('stocks', []):
+                        if s.get('id') == stock_id:
+                            s.update(updates)
+                        updated.append(s)
+                    bucket['stocks'] = updated
+                    self._write_local(data)
+                    return
 
             self.db.collection('users').document(self.user_id)\
-               .collection('stocks').document(stock_id).update({
-                   'current_price': current_price,
-                   'profit_loss': profit_loss,
-                   'last_updated': datetime.now().isoformat()
-               })
+               .collection('stocks').document(stock_id).update(updates)
         except Exception as e:
             print(f"Error updating stock: {str(e)}")
             raise
@@ -361,11 +462,12 @@ class FirebaseService:
         """
         try:
             if self.use_local or not self.db:
-                data = self._read_local()
-                bucket = self._user_bucket(data)
-                bucket['stocks'] = [s for s in bucket.get('stocks', []) if s.get('id') != stock_id]
-                self._write_local(data)
-                return True
+                with self._local_lock:
+                    data = self._read_local()
+                    bucket = self._user_bucket(data)
+                    bucket['stocks'] = [s for s in bucket.get('stocks', []) if s.get('id') != stock_id]
+                    self._write_local(data)
+                    return True
 
             self.db.collection('users').document(self.user_id)\
                .collection('stocks').document(stock_id).delete()
@@ -386,16 +488,17 @@ class FirebaseService:
         """
         try:
             if self.use_local or not self.db:
-                data = self._read_local()
-                bucket = self._user_bucket(data)
-                doc_id = self._new_id()
-                record = {**crypto_record, 'id': doc_id}
-                # Ensure 'crypto' list exists
-                if 'crypto' not in bucket:
-                    bucket['crypto'] = []
-                bucket['crypto'].insert(0, record)
-                self._write_local(data)
-                return doc_id
+                with self._local_lock:
+                    data = self._read_local()
+                    bucket = self._user_bucket(data)
+                    doc_id = self._new_id()
+                    record = {**crypto_record, 'id': doc_id}
+                    # Ensure 'crypto' list exists
+                    if 'crypto' not in bucket:
+                        bucket['crypto'] = []
+                    bucket['crypto'].insert(0, record)
+                    self._write_local(data)
+                    return doc_id
 
             doc_ref = self.db.collection('users').document(self.user_id)\
                       .collection('crypto').add(crypto_record)
@@ -427,35 +530,38 @@ class FirebaseService:
             print(f"Error retrieving crypto: {str(e)}")
             return []
 
-    def update_crypto_price(self, crypto_id, current_price, profit_loss):
+    def update_crypto_price(self, crypto_id, current_price, profit_loss, previous_close=None):
         """
-        Update crypto with current price and profit/loss.
+        Update crypto with current price and profit/loss
+        (and the previous close the day change is measured from, if given).
         """
+        updates = {
+            'current_price': current_price,
+            'profit_loss': profit_loss,
+            'last_updated': datetime.now().isoformat()
+        }
+        if previous_close is not None:
+            updates['previous_close'] = previous_close
         try:
             if self.use_local or not self.db:
-                data = self._read_local()
-                bucket = self._user_bucket(data)
-                updated = []
-                # Ensure 'crypto' list exists
-                if 'crypto' not in bucket:
-                    bucket['crypto'] = []
+                with self._local_lock:
+                    data = self._read_local()
+                    bucket = self._user_bucket(data)
+                    updated = []
+                    # Ensure 'crypto' list exists
+                    if 'crypto' not in bucket:
+                        bucket['crypto'] = []
                     
-                for c in bucket.get('crypto', []):
-                    if c.get('id') == crypto_id:
-                        c['current_price'] = current_price
-                        c['profit_loss'] = profit_loss
-                        c['last_updated'] = datetime.now().isoformat()
-                    updated.append(c)
-                bucket['crypto'] = updated
-                self._write_local(data)
-                return
+                    for c in bucket.get('crypto', []):
+                        if c.get('id') == crypto_id:
+                            c.update(updates)
+                        updated.append(c)
+                    bucket['crypto'] = updated
+                    self._write_local(data)
+                    return
 
             self.db.collection('users').document(self.user_id)\
-               .collection('crypto').document(crypto_id).update({
-                   'current_price': current_price,
-                   'profit_loss': profit_loss,
-                   'last_updated': datetime.now().isoformat()
-               })
+               .collection('crypto').document(crypto_id).update(updates)
         except Exception as e:
             print(f"Error updating crypto: {str(e)}")
             raise
@@ -466,11 +572,12 @@ class FirebaseService:
         """
         try:
             if self.use_local or not self.db:
-                data = self._read_local()
-                bucket = self._user_bucket(data)
-                bucket['crypto'] = [c for c in bucket.get('crypto', []) if c.get('id') != crypto_id]
-                self._write_local(data)
-                return True
+                with self._local_lock:
+                    data = self._read_local()
+                    bucket = self._user_bucket(data)
+                    bucket['crypto'] = [c for c in bucket.get('crypto', []) if c.get('id') != crypto_id]
+                    self._write_local(data)
+                    return True
 
             self.db.collection('users').document(self.user_id)\
                .collection('crypto').document(crypto_id).delete()
@@ -491,7 +598,12 @@ class FirebaseService:
         """
         try:
             if self.use_local or not self.db:
-                print(f"Local mode: FCM token would be saved: {token}")
+                with self._local_lock:
+                    data = self._read_local()
+                    bucket = self._user_bucket(data)
+                    bucket['fcm_token'] = token
+                    bucket['last_token_update'] = datetime.now().isoformat()
+                    self._write_local(data)
                 return True
 
             # Use set with merge=True to update or create
@@ -511,7 +623,8 @@ class FirebaseService:
         target_user = user_id or self.user_id
         try:
             if self.use_local or not self.db:
-                return None
+                data = self._read_local()
+                return data.get('users', {}).get(target_user, {}).get('fcm_token')
 
             doc = self.db.collection('users').document(target_user).get()
             if doc.exists:
@@ -529,8 +642,12 @@ class FirebaseService:
         """
         try:
             if self.use_local or not self.db:
-                print("Local mode: Alert saving mocked")
-                return "local_alert_id"
+                with self._local_lock:
+                    data = self._read_local()
+                    doc_id = self._new_id()
+                    self._user_alerts(data)[doc_id] = {**alert_record, 'id': doc_id}
+                    self._write_local(data)
+                return doc_id
 
             doc_ref = self.db.collection('users').document(self.user_id)\
                       .collection('alerts').add(alert_record)
@@ -546,7 +663,8 @@ class FirebaseService:
         """
         try:
             if self.use_local or not self.db:
-                return []
+                data = self._read_local()
+                return list(self._user_alerts(data).values())
 
             docs = self.db.collection('users').document(self.user_id)\
                    .collection('alerts').stream()
@@ -566,7 +684,11 @@ class FirebaseService:
         """
         try:
             if self.use_local or not self.db:
-                return True
+                with self._local_lock:
+                    data = self._read_local()
+                    removed = self._user_alerts(data).pop(alert_id, None)
+                    self._write_local(data)
+                return removed is not None
 
             self.db.collection('users').document(self.user_id)\
                .collection('alerts').document(alert_id).delete()
@@ -575,6 +697,257 @@ class FirebaseService:
             print(f"Error deleting alert: {str(e)}")
             return False
 
+    # ------------------------------------------------------------------------
+    # Cross-user alert operations (used by the alert monitor)
+    # ------------------------------------------------------------------------
+
+    def get_active_alerts(self, page_size=None):
+        """
+        Yield every untriggered alert across all users.
+        Firestore: one collection-group query over 'alerts' (needs the
+        collection-group single-field index on 'triggered'), read page by page
+        with cursors. Each alert dict carries its 'id' and owning 'user_id'.
+        Args: page_size (int) - Documents per round trip
+        """
+        page_size = page_size or self.ALERT_PAGE_SIZE
+        if self.use_local or not self.db:
+            # Snapshot under the lock: the monitor thread reads while request
+            # threads write, and the generator must not hold the lock while yielding
+            with self._local_lock:
+                data = self._read_local()
+                active = [{**alert, 'user_id': user_id}
+                          for user_id in list(data.get('users', {}))
+                          for alert in self._user_alerts(data, user_id).values()
+                          if not alert.get('triggered')]
+            yield from active
+            return
+
+        query = self.db.collection_group('alerts').where('triggered', '==', False)\
+                    .order_by('__name__').limit(page_size)
+        cursor = None
+        while True:
+            page = query.start_after(cursor) if cursor else query
+            docs = list(page.stream())
+            for doc in docs:
+                alert = doc.to_dict()
+                alert['id'] = doc.id
+                alert['user_id'] = doc.reference.parent.parent.id
+                yield alert
+
+            if len(docs) < page_size:
+                return
+            cursor = docs[-1]
+
+    def get_fcm_tokens(self, user_ids):
+        """
+        Batch-load FCM tokens for several users.
+        Returns: dict - { user_id: token } for users that have one
+        """
+        tokens = {}
+        user_ids = list(user_ids)
+        if self.use_local or not self.db:
+            with self._local_lock:
+                users = self._read_local().get('users', {})
+                for user_id in user_ids:
+                    token = users.get(user_id, {}).get('fcm_token')
+                    if token:
+                        tokens[user_id] = token
+            return tokens
+
+        for i in range(0, len(user_ids), self.GET_BATCH_SIZE):
+            refs = [self.db.collection('users').document(uid) for uid in user_ids[i:i + self.GET_BATCH_SIZE]]
+            for snapshot in self.db.get_all(refs):
+                if snapshot.exists:
+                    token = (snapshot.to_dict() or {}).get('fcm_token')
+                    if token:
+                        tokens[snapshot.id] = token
+        return tokens
+
+    def get_holdings(self, user_ids):
+        """
+        Load stock and crypto holdings for several users.
+        Returns: dict - { user_id: [holding records with 'id' and
+                 'asset_class' ('stock' or 'crypto')] }
+        """
+        holdings = {}
+        if self.use_local or not self.db:
+            with self._local_lock:
+                users = self._read_local().get('users', {})
+                for user_id in user_ids:
+                    bucket = users.get(user_id, {})
+                    holdings[user_id] = [{**record, 'asset_class': 'stock'} for record in bucket.get('stocks', [])] + \
+                        [{**record, 'asset_class': 'crypto'} for record in bucket.get('crypto', [])]
+            return holdings
+
+        for user_id in user_ids:
+            user_ref = self.db.collection('users').document(user_id)
+            records = []
+            for collection, asset_class in (('stocks', 'stock'), ('crypto', 'crypto')):
+                for doc in user_ref.collection(collection).stream():
+                    records.append({**doc.to_dict(), 'id': doc.id, 'asset_class': asset_class})
+            holdings[user_id] = records
+        return holdings
+
+    def mark_alerts_triggered(self, alerts):
+        """
+        Flag alerts as triggered with batched writes. A batch is atomic, so
+        if one alert was deleted meanwhile its batch is retried one document
+        at a time; deleted alerts are skipped rather than recreated.
+        Args: alerts (list) - Alert dicts with 'id' and 'user_id'
+        Returns: int - Alerts that could not be marked (other than deleted ones)
+        """
+        if self.use_local or not self.db:
+            with self._local_lock:
+                data = self._read_local()
+                now = datetime.now().isoformat()
+                for alert in alerts:
+                    stored = self._user_alerts(data, alert['user_id']).get(alert['id'])
+                    if stored:
+                        stored['triggered'] = True
+                        stored['triggered_at'] = now
+                self._write_local(data)
+            return 0
+
+        failed = 0
+        for i in range(0, len(alerts), self.WRITE_BATCH_SIZE):
+            refs = [
+                self.db.collection('users').document(alert['user_id']).collection('alerts').document(alert['id'])
+                for alert in alerts[i:i + self.WRITE_BATCH_SIZE]
+            ]
+            batch = self.db.batch()
+            for ref in refs:
+                batch.update(ref, {'triggered': True})
+            try:
+                batch.commit()
+                continue
+            except Exception as e:
+                print(f"⚠️ Alert batch write failed ({e}); marking alerts one by one")
+            for ref in refs:
+                try:
+                    ref.update({'triggered': True})
+                except NotFound:
+                    pass  # Deleted since it triggered: nothing left to mark
+                except Exception as e:
+                    failed += 1
+                    print(f"Error marking alert {ref.id} triggered: {e}")
+        return failed
+
+    def watch_active_alerts(self, on_changes):
+        """
+        Stream changes to active alerts (Firestore snapshot listener), one
+        call per snapshot so listeners can apply changes in bulk.
+        Args:
+            on_changes - Called with (upserted alert dicts, [(user_id, alert_id)] removed)
+        Returns: Watch handle, or None in local mode (the local store has no change
+                 feed; it is only used by an in-process monitor)
+        """
+        if self.use_local or not self.db:
+            return None
+
+        def on_snapshot(_docs, changes, _read_time):
+            upserts, removed = [], []
+            for change in changes:
+                doc = change.document
+                user_id = doc.reference.parent.parent.id
+                if change.type.name == 'REMOVED':
+                    removed.append((user_id, doc.id))
+                else:
+                    upserts.append({**doc.to_dict(), 'id': doc.id, 'user_id': user_id})
+            on_changes(upserts, removed)
+
+        query = self.db.collection_group('alerts').where('triggered', '==', False)
+        return query.on_snapshot(on_snapshot)
+
+    # ========================================================================
+    # CATEGORY RULES
+    # ========================================================================
+
+    def get_category_rules(self, user_id=None):
+        """
+        Get a user's custom categorization rules.
+        Returns: dict - { category: [keywords] }
+        """
+        target_user = user_id or self.user_id
+        try:
+            if self.use_local or not self.db:
+                data = self._read_local()
+                return dict(data.get('users', {}).get(target_user, {}).get('category_rules', {}))
+
+            doc = self.db.collection('users').document(target_user).get()
+            if doc.exists:
+                return dict((doc.to_dict() or {}).get('category_rules', {}))
+            return {}
+        except Exception as e:
+            print(f"Error retrieving category rules: {str(e)}")
+            return {}
+
+    def save_category_rules(self, rules, user_id=None):
+        """
+        Replace a user's custom categorization rules.
+        Args: rules (dict) - { category: [keywords] }
+        """
+        target_user = user_id or self.user_id
+        try:
+            if self.use_local or not self.db:
+                with self._local_lock:
+                    data = self._read_local()
+                    users = data.setdefault('users', {})
+                    bucket = users.setdefault(target_user, {'income': [], 'expenses': [], 'stocks': []})
+                    bucket['category_rules'] = rules
+                    self._write_local(data)
+                return True
+
+            self.db.collection('users').document(target_user).set({'category_rules': rules}, merge=True)
+            return True
+        except Exception as e:
+            print(f"Error saving category rules: {str(e)}")
+            raise
+
+    def get_category_corrections(self, user_id=None):
+        """
+        Get a user's manual category corrections.
+        Returns: dict - { canonical merchant name: category }
+        """
+        target_user = user_id or self.user_id
+        try:
+            if self.use_local or not self.db:
+                data = self._read_local()
+                return dict(data.get('users', {}).get(target_user, {}).get('category_corrections', {}))
+
+            doc = self.db.collection('users').document(target_user).get()
+            if doc.exists:
+                return dict((doc.to_dict() or {}).get('category_corrections', {}))
+            return {}
+        except Exception as e:
+            print(f"Error retrieving category corrections: {str(e)}")
+            return {}
+
+    def save_category_correction(self, merchant_key, category, user_id=None):
+        """
+        Record (or replace) one manual correction for a user.
+        Args:
+            merchant_key (str) - Canonical merchant name
+            category (str) - Category the user chose
+        """
+        target_user = user_id or self.user_id
+        try:
+            if self.use_local or not self.db:
+                with self._local_lock:
+                    data = self._read_local()
+                    users = data.setdefault('users', {})
+                    bucket = users.setdefault(target_user, {'income': [], 'expenses': [], 'stocks': []})
+                    bucket.setdefault('category_corrections', {})[merchant_key] = category
+                    self._write_local(data)
+                return True
+
+            # merge=True merges map fields, so other corrections are kept
+            self.db.collection('users').document(target_user)\
+                .set({'category_corrections': {merchant_key: category}}, merge=True)
+            return True
+        except Exception as e:
+            print(f"Error saving category correction: {str(e)}")
+            raise
+
     # ========================================================================
     # AUTHENTICATION & OTP OPERATIONS
     # ========================================================================
@@ -599,13 +972,14 @@ class FirebaseService:
             }
             
             if self.use_local or not self.db:
-                data = self._read_local()
-                # Store OTPs in a top-level 'otps' key
-                if 'otps' not in data:
-                    data['otps'] = {}
-                data['otps'][email] = otp_data
-                self._write_local(data)
-                return True
+                with self._local_lock:
+                    data = self._read_local()
+                    # Store OTPs in a top-level 'otps' key
+                    if 'otps' not in data:
+                        data['otps'] = {}
+                    data['otps'][email] = otp_data
+                    self._write_local(data)
+                    return True
 
             # Save to 'otps' collection in Firestore (keyed by email for easy lookup)
             # Note: Email in document ID should be sanitized/hashed in real prod, 
@@ -630,23 +1004,24 @@ class FirebaseService:
         """
         try:
             if self.use_local or not self.db:
-                data = self._read_local()
-                otps = data.get('otps', {})
-                record = otps.get(email)
+                with self._local_lock:
+                    data = self._read_local()
+                    otps = data.get('otps', {})
+                    record = otps.get(email)
                 
-                if not record:
-                    return False, "No OTP found. Please request a new one."
+                    if not record:
+                        return False, "No OTP found. Please request a new one."
                 
-                if float(record['expires_at']) < datetime.now().timestamp():
-                    return False, "OTP has expired. Please request a new one."
+                    if float(record['expires_at']) < datetime.now().timestamp():
+                        return False, "OTP has expired. Please request a new one."
                 
-                if record['otp'] != otp_code:
-                    return False, "Invalid OTP code."
+                    if record['otp'] != otp_code:
+                        return False, "Invalid OTP code."
                 
-                # Cleanup after success
-                del data['otps'][email]
-                self._write_local(data)
-                return True, "OTP verified successfully."
+                    # Cleanup after success
+                    del data['otps'][email]
+                    self._write_local(data)
+                    return True, "OTP verified successfully."
 
             doc = self.db.collection('otps').document(email).get()
             if not doc.exists:
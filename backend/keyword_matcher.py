@@ -0,0 +1,85 @@
+"""
+Keyword Matcher Module
+Purpose: Match merchant names against every categorization keyword in one pass
+Provides: Aho-Corasick automaton compiled from a { category: [keywords] } table
+"""
+
+from collections import deque
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over all rule keywords. Matching walks the text
+    once, whatever the number of keywords. When several keywords match, the
+    category listed first in the rules wins (the same priority as checking
+    categories in order), so results are deterministic.
+    """
+
+    def __init__(self, rules):
+        """
+        Args: rules (dict) - { category: [keywords] }, in priority order
+        """
+        self.categories = list(rules)
+        self.keyword_count = 0
+        # Node 0 is the root; per node: transitions, failure link, best priority
+        self._goto = [{}]
+        self._fail = [0]
+        self._best = [None]
+
+        for priority, category in enumerate(self.categories):
+            for keyword in rules[category]:
+                keyword = (keyword or '').lower()
+                if keyword:
+                    self._insert(keyword, priority)
+                    self.keyword_count += 1
+        self._link()
+
+    def _insert(self, keyword, priority):
+        node = 0
+        for char in keyword:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(None)
+            node = nxt
+        if self._best[node] is None or priority < self._best[node]:
+            self._best[node] = priority
+
+    def _link(self):
+        """Breadth-first failure links; each node inherits the best match of its suffixes."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+
+                inherited = self._best[self._fail[child]]
+                if inherited is not None and (self._best[child] is None or inherited < self._best[child]):
+                    self._best[child] = inherited
+                queue.append(child)
+
+    def match(self, text):
+        """
+        Highest-priority category with a keyword contained in text.
+        Args: text (str) - Merchant name (matched case-insensitively)
+        Returns: str or None
+        """
+        goto, fail, best_at = self._goto, self._fail, self._best
+        node, best = 0, None
+        for char in (text or '').lower():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            priority = best_at[node]
+            if priority is not None and (best is None or priority < best):
+                best = priority
+                if best == 0:
+                    break
+        return self.categories[best] if best is not None else None
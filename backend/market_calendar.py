@@ -0,0 +1,218 @@
+"""
+Market Calendar Module
+Purpose: Know when the exchanges behind a symbol are trading
+Provides: Exchange sessions, holidays and time zones keyed by symbol suffix
+          (or asset class); holidays follow each exchange's rules for any year
+"""
+
+import json
+import os
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+
+class Exchange:
+    """A single regular trading session per weekday, in the exchange's time zone."""
+
+    def __init__(self, code, timezone, open_time, close_time, holiday_rule=None, always_open=False):
+        """
+        Args:
+            holiday_rule - Optional callable year -> iterable of closure dates
+            always_open (bool) - Trades around the clock (crypto)
+        """
+        self.code = code
+        self.tz = ZoneInfo(timezone)
+        self.open_time = open_time
+        self.close_time = close_time
+        self.holidays = set()       # published closures (data file / MARKET_HOLIDAYS)
+        self.holiday_rule = holiday_rule
+        self._rule_holidays = {}    # year -> dates from holiday_rule
+        self.always_open = always_open
+
+    def holidays_in(self, year):
+        """Every known closure in a year: rule-based plus published dates."""
+        if year not in self._rule_holidays:
+            self._rule_holidays[year] = set(self.holiday_rule(year)) if self.holiday_rule else set()
+        return self._rule_holidays[year] | {day for day in self.holidays if day.year == year}
+
+    def is_trading_day(self, day):
+        if self.always_open:
+            return True
+        return day.weekday() < 5 and day not in self.holidays and day not in self.holidays_in(day.year)
+
+    def is_open(self, at=None):
+        """
+        Whether the regular session is running.
+        Args: at (datetime) - Aware datetime (default now)
+        Returns: bool
+        """
+        if self.always_open:
+            return True
+        local = (at or datetime.now(self.tz)).astimezone(self.tz)
+        return self.is_trading_day(local.date()) and self.open_time <= local.time() < self.close_time
+
+    def next_open(self, at=None):
+        """
+        Start of the next session (or `at` itself while the market is open).
+        Returns: aware datetime
+        """
+        local = (at or datetime.now(self.tz)).astimezone(self.tz)
+        if self.is_open(local):
+            return local
+
+        day = local.date()
+        if local.time() >= self.open_time:
+            day += timedelta(days=1)
+        while not self.is_trading_day(day):
+            day += timedelta(days=1)
+        return datetime.combine(day, self.open_time, tzinfo=self.tz)
+
+    def seconds_until_open(self, at=None):
+        at = at or datetime.now(self.tz)
+        return max((self.next_open(at) - at.astimezone(self.tz)).total_seconds(), 0.0)
+
+
+# ============================================================================
+# HOLIDAY RULES
+# ============================================================================
+
+def easter_sunday(year):
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _nth_weekday(year, month, weekday, n):
+    """n-th (1-based; -1 for last) given weekday of a month."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(day):
+    """US rule: Saturday holidays close the Friday before, Sunday ones the Monday after."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def nyse_holidays(year):
+    """NYSE full-day closures, from the exchange's holiday rules."""
+    days = [
+        _nth_weekday(year, 1, 0, 3),                    # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),                    # Washington's Birthday
+        easter_sunday(year) - timedelta(days=2),        # Good Friday
+        _nth_weekday(year, 5, 0, -1),                   # Memorial Day
+        _observed(date(year, 7, 4)),                    # Independence Day
+        _nth_weekday(year, 9, 0, 1),                    # Labor Day
+        _nth_weekday(year, 11, 3, 4),                   # Thanksgiving
+        _observed(date(year, 12, 25)),                  # Christmas
+    ]
+    # A Saturday New Year's Day is not made up on the Friday before
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        days.append(_observed(new_year))
+    if year >= 2022:
+        days.append(_observed(date(year, 6, 19)))       # Juneteenth
+    return days
+
+
+def india_holidays(year):
+    """
+    NSE/BSE closures that follow fixed rules. Lunar-calendar holidays (Holi,
+    Diwali, Eid, ...) move every year: load the exchange's published list
+    through MARKET_HOLIDAYS_FILE or MARKET_HOLIDAYS.
+    """
+    return [
+        date(year, 1, 26),                              # Republic Day
+        easter_sunday(year) - timedelta(days=2),        # Good Friday
+        date(year, 4, 14),                              # Dr. Ambedkar Jayanti
+        date(year, 5, 1),                               # Maharashtra Day
+        date(year, 8, 15),                              # Independence Day
+        date(year, 10, 2),                              # Gandhi Jayanti
+        date(year, 12, 25),                             # Christmas
+    ]
+
+
+EXCHANGES = {
+    'NSE': Exchange('NSE', 'Asia/Kolkata', time(9, 15), time(15, 30), india_holidays),
+    'BSE': Exchange('BSE', 'Asia/Kolkata', time(9, 15), time(15, 30), india_holidays),
+    'NYSE': Exchange('NYSE', 'America/New_York', time(9, 30), time(16, 0), nyse_holidays),
+    'CRYPTO': Exchange('CRYPTO', 'UTC', time(0, 0), time(23, 59, 59), always_open=True),
+}
+
+SUFFIX_EXCHANGES = {
+    '.NS': 'NSE',
+    '.BO': 'BSE',
+}
+
+
+def _add_holiday(code, day, source):
+    try:
+        EXCHANGES[code.upper()].holidays.add(date.fromisoformat(day))
+    except (KeyError, ValueError):
+        print(f"⚠️ Ignoring invalid {source} entry: {code}:{day}")
+
+
+def _load_extra_holidays():
+    """
+    Published closures on top of the rules:
+      - MARKET_HOLIDAYS_FILE (default market_holidays.json next to this module):
+        JSON { "NSE": ["2027-03-22", ...], "BSE": [...] }, any number of years
+      - MARKET_HOLIDAYS: "NSE:2026-03-04,BSE:2026-03-04"
+    """
+    path = os.getenv('MARKET_HOLIDAYS_FILE',
+                     os.path.join(os.path.dirname(os.path.abspath(__file__)), 'market_holidays.json'))
+    if os.path.exists(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                for code, days in json.load(f).items():
+                    for day in days:
+                        _add_holiday(code, day, path)
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"⚠️ Could not load market holidays from {path}: {e}")
+
+    for entry in os.getenv('MARKET_HOLIDAYS', '').split(','):
+        code, _, day = entry.strip().partition(':')
+        if code and day:
+            _add_holiday(code, day, 'MARKET_HOLIDAYS')
+
+
+_load_extra_holidays()
+
+
+def exchange_for(symbol, asset_class=None):
+    """
+    Exchange a symbol trades on, from its asset class or suffix.
+    Crypto holdings (stored as plain symbols like 'BTC'), 'crypto:' keys and
+    '-USD'/'-INR' pairs -> CRYPTO, '.NS' -> NSE, '.BO' -> BSE,
+    other tickers -> NYSE (US listing).
+    Args:
+        symbol (str)
+        asset_class (str) - Optional 'stock' or 'crypto'
+    Returns: Exchange
+    """
+    symbol = (symbol or '').strip().upper()
+    if asset_class == 'crypto' or symbol.startswith('CRYPTO:') or symbol.endswith(('-USD', '-INR')):
+        return EXCHANGES['CRYPTO']
+    for suffix, code in SUFFIX_EXCHANGES.items():
+        if symbol.endswith(suffix):
+            return EXCHANGES[code]
+    return EXCHANGES['NYSE']
+
+
+def is_market_open(symbol, at=None, asset_class=None):
+    """Whether the symbol's exchange is in its regular session."""
+    return exchange_for(symbol, asset_class).is_open(at)
@@ -0,0 +1,179 @@
+"""
+Merchant Classifier Module
+Purpose: Categorize merchants locally from the user's own labelled expenses
+Provides: Character n-gram TF-IDF + multinomial naive Bayes in NumPy, with
+          incremental training and .npz persistence
+"""
+
+import os
+import threading
+import zlib
+
+import numpy as np
+
+from category_cache import normalize_merchant
+
+
+class MerchantClassifier:
+    """
+    Hashed character n-grams (2-4 chars, word-boundary padded) weighted by
+    sublinear TF-IDF, classified with multinomial naive Bayes. Training only
+    adds to per-class feature totals, so each labelled expense or correction
+    updates the model in place without a full retrain.
+    """
+
+    N_FEATURES = 2 ** 15
+    NGRAM_RANGE = (2, 4)
+    ALPHA = 0.1                  # Laplace smoothing
+    MIN_CONFIDENCE = 0.8         # below this the caller should ask the LLM
+    MIN_TRAINING_SAMPLES = 20
+
+    def __init__(self, path=None, min_samples=None):
+        """
+        Args:
+            path (str) - Optional .npz file the model is loaded from and saved to
+            min_samples (float) - Training weight needed before predicting
+                (default MIN_TRAINING_SAMPLES)
+        """
+        self.path = path
+        self.min_samples = self.MIN_TRAINING_SAMPLES if min_samples is None else min_samples
+        self.classes = []
+        self._class_features = np.zeros((0, self.N_FEATURES))  # TF totals per class
+        self._class_docs = np.zeros(0)                          # documents per class
+        self._doc_freq = np.zeros(self.N_FEATURES)
+        self._log_prob = None                                   # cached (log priors, log likelihoods, idf)
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    # ========================================================================
+    # FEATURES
+    # ========================================================================
+
+    def _features(self, merchant):
+        """
+        Sparse sublinear TF vector of hashed character n-grams.
+        Returns: tuple - (feature indices, weights)
+        """
+        text = normalize_merchant(merchant)
+        if not text:
+            return np.zeros(0, dtype=np.intp), np.zeros(0)
+        counts = {}
+        for word in text.split():
+            padded = f" {word} "
+            for n in range(self.NGRAM_RANGE[0], self.NGRAM_RANGE[1] + 1):
+                for i in range(len(padded) - n + 1):
+                    index = zlib.crc32(padded[i:i + n].encode('utf-8')) % self.N_FEATURES
+                    counts[index] = counts.get(index, 0) + 1
+        indices = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        weights = 1 + np.log(np.fromiter(counts.values(), dtype=float, count=len(counts)))
+        return indices, weights
+
+    def _idf(self):
+        total = self._class_docs.sum()
+        return np.log((1 + total) / (1 + self._doc_freq)) + 1
+
+    # ========================================================================
+    # TRAINING
+    # ========================================================================
+
+    def partial_fit(self, merchants, categories, weight=1.0):
+        """
+        Add labelled examples to the model.
+        Args:
+            merchants (list) - Merchant names
+            categories (list) - Their categories
+            weight (float) - Example weight (manual corrections count more)
+        Returns: int - Number of examples used
+        """
+        used = 0
+        with self._lock:
+            for merchant, category in zip(merchants, categories):
+                indices, weights = self._features(merchant)
+                if not len(indices) or not category:
+                    continue
+                if category not in self.classes:
+                    self.classes.append(category)
+                    self._class_features = np.vstack([self._class_features, np.zeros(self.N_FEATURES)])
+                    self._class_docs = np.append(self._class_docs, 0.0)
+                c = self.classes.index(category)
+                np.add.at(self._class_features[c], indices, weights * weight)
+                self._class_docs[c] += weight
+                self._doc_freq[indices] += 1
+                used += 1
+            if used:
+                self._log_prob = None
+        return used
+
+    def _model(self):
+        """Log priors, per-class log feature probabilities and IDF (called under the lock)."""
+        if self._log_prob is None:
+            idf = self._idf()
+            smoothed = self._class_features * idf + self.ALPHA
+            log_likelihood = np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))
+            log_prior = np.log(self._class_docs / self._class_docs.sum())
+            self._log_prob = (log_prior, log_likelihood, idf)
+        return self._log_prob
+
+    @property
+    def sample_count(self):
+        return int(self._class_docs.sum()) if len(self._class_docs) else 0
+
+    def is_ready(self):
+        """True once the model has seen enough examples of at least two categories."""
+        return len(self.classes) >= 2 and self._class_docs.sum() >= self.min_samples
+
+    # ========================================================================
+    # PREDICTION
+    # ========================================================================
+
+    def predict(self, merchant):
+        """
+        Most likely category and a confidence score. Naive Bayes posteriors
+        are overconfident, so the posterior is scaled by how much of the
+        name's n-gram weight recurs in training data: unfamiliar names score low.
+        Args: merchant (str) - Merchant name
+        Returns: tuple - (category or None, confidence 0-1)
+        """
+        indices, weights = self._features(merchant)
+        with self._lock:
+            if not self.is_ready() or not len(indices):
+                return None, 0.0
+            log_prior, log_likelihood, idf = self._model()
+            tfidf = weights * idf[indices]
+            scores = log_prior + log_likelihood[:, indices] @ tfidf
+            seen = self._doc_freq[indices] > 1
+        coverage = float(tfidf[seen].sum() / tfidf.sum())
+        scores = np.exp(scores - scores.max())
+        posterior = scores / scores.sum()
+        best = int(np.argmax(posterior))
+        return self.classes[best], float(posterior[best]) * coverage
+
+    # ========================================================================
+    # PERSISTENCE
+    # ========================================================================
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            np.savez_compressed(
+                path, classes=np.array(self.classes, dtype=str),
+                class_features=self._class_features, class_docs=self._class_docs, doc_freq=self._doc_freq,
+            )
+
+    def load(self, path=None):
+        path = path or self.path
+        try:
+            with np.load(path) as data:
+                if data['doc_freq'].shape[0] != self.N_FEATURES:
+                    return
+                with self._lock:
+                    self.classes = [str(c) for c in data['classes']]
+                    self._class_features = data['class_features']
+                    self._class_docs = data['class_docs']
+                    self._doc_freq = data['doc_freq']
+                    self._log_prob = None
+        except Exception as e:
+            print(f"⚠️ Could not load merchant classifier from {path}: {e}")
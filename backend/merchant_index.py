@@ -0,0 +1,141 @@
+"""
+Merchant Index Module
+Purpose: Map the many spellings of a merchant to one canonical merchant id
+Provides: Noise-token stripping plus a trigram-blocked fuzzy index
+          (edit-distance verified) over canonical merchant names
+"""
+
+import re
+import threading
+
+# Tokens that carry no merchant identity (legal suffixes, URL parts, payment rails)
+NOISE_TOKENS = {
+    'inc', 'llc', 'ltd', 'limited', 'pvt', 'private', 'co', 'corp', 'corporation', 'company',
+    'www', 'com', 'in', 'net', 'org', 'app', 'the', 'india', 'online', 'services', 'service',
+    'pay', 'payment', 'payments', 'pos', 'upi', 'ach', 'txn', 'ref', 'debit', 'credit', 'card', 'purchase',
+}
+
+
+def canonical_name(merchant):
+    """
+    Merchant name with case, punctuation, noise tokens and reference numbers removed.
+    e.g. "NETFLIX.COM" / "Netflix Inc" / "netflix*1234" -> "netflix"
+    Args: merchant (str) - Raw merchant string
+    Returns: str ('' for empty input)
+    """
+    text = re.sub(r'[^a-z0-9&]+', ' ', (merchant or '').lower())
+    tokens = text.split()
+    kept = [
+        token for token in tokens
+        if token not in NOISE_TOKENS
+        # Drop store/reference numbers ("1234", "ref00981") but keep names like "7" in "7 eleven"
+        and not (sum(ch.isdigit() for ch in token) >= 3)
+    ]
+    return ' '.join(kept or tokens)
+
+
+def _trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a, b, limit):
+    """Levenshtein distance, or limit + 1 as soon as it must exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class MerchantIndex:
+    """
+    Canonical merchant registry. A new name is resolved by
+      1. exact lookup of its canonical form,
+      2. blocking: candidate names sharing enough trigrams (via an inverted
+         index, skipping overly common trigrams),
+      3. verification: edit distance within SIMILARITY of the longer name.
+    Unmatched names start a new merchant id. Results are memoized, so each
+    spelling pays for the fuzzy match once.
+    """
+
+    SIMILARITY = 0.8          # 1 - distance / max(len) needed to merge
+    MIN_SHARED_GRAMS = 0.4    # share of the name's trigrams a candidate must have
+    MAX_CANDIDATES = 10
+    MAX_POSTINGS = 1000       # trigrams in more names than this are too common to block on
+
+    def __init__(self):
+        self._ids = {}        # canonical name -> merchant id
+        self._postings = {}   # trigram -> set of canonical names
+        self._lock = threading.Lock()
+
+    def resolve(self, merchant):
+        """
+        Canonical merchant id for a raw merchant string (registering it if new).
+        Args: merchant (str)
+        Returns: str or None for empty input
+        """
+        name = canonical_name(merchant)
+        if not name:
+            return None
+        with self._lock:
+            merchant_id = self._ids.get(name)
+            if merchant_id is None:
+                merchant_id = self._best_match(name) or name.replace(' ', '-')
+                self._register(name, merchant_id)
+            return merchant_id
+
+    def register(self, merchant, merchant_id):
+        """Record a stored (merchant, merchant_id) pair, e.g. when rebuilding from expenses."""
+        name = canonical_name(merchant)
+        if name and merchant_id:
+            with self._lock:
+                self._register(name, merchant_id)
+
+    def rebuild(self, records):
+        """
+        Load merchant ids already stored on expense records; records without
+        one are resolved.
+        Returns: int - Distinct merchant ids
+        """
+        for record in records:
+            if record.get('merchant_id'):
+                self.register(record.get('merchant'), record['merchant_id'])
+            elif record.get('merchant'):
+                self.resolve(record['merchant'])
+        with self._lock:
+            return len(set(self._ids.values()))
+
+    def _register(self, name, merchant_id):
+        self._ids[name] = merchant_id
+        for gram in _trigrams(name):
+            self._postings.setdefault(gram, set()).add(name)
+
+    def _best_match(self, name):
+        """Closest registered name's merchant id, or None (called under the lock)."""
+        grams = _trigrams(name)
+        shared = {}
+        for gram in grams:
+            names = self._postings.get(gram)
+            if names and len(names) <= self.MAX_POSTINGS:
+                for candidate in names:
+                    shared[candidate] = shared.get(candidate, 0) + 1
+
+        needed = max(1, int(len(grams) * self.MIN_SHARED_GRAMS))
+        candidates = sorted((c for c, n in shared.items() if n >= needed), key=lambda c: -shared[c])
+        best, best_distance = None, None
+        for candidate in candidates[:self.MAX_CANDIDATES]:
+            limit = int((1 - self.SIMILARITY) * max(len(name), len(candidate)))
+            distance = _edit_distance(name, candidate, limit)
+            if distance <= limit and (best_distance is None or distance < best_distance):
+                best, best_distance = candidate, distance
+        return self._ids[best] if best else None
+
+    def __len__(self):
+        return len(self._ids)
@@ -0,0 +1,132 @@
+"""
+Adaptive Poll Scheduler
+Purpose: Decide how often each watched symbol's quote should be refreshed
+Uses: Market calendar (open/closed), recent volatility and alert proximity
+"""
+
+import math
+import threading
+import time
+from datetime import datetime, timezone
+
+from market_calendar import exchange_for
+
+
+class AdaptivePollScheduler:
+    """
+    Per-symbol refresh timetable. Symbols are polled:
+      - rarely while their market is closed (waking up at the next open),
+      - faster when their recent quote moves are large,
+      - fastest when the price is within a few typical moves of an alert threshold.
+    """
+
+    MIN_INTERVAL = 2.0          # seconds, floor for symbols about to trigger
+    OPEN_INTERVAL = 15.0        # seconds, baseline while the market is open
+    MAX_OPEN_INTERVAL = 60.0
+    CLOSED_INTERVAL = 1800.0    # seconds, ceiling while the market is closed
+    TYPICAL_MOVE = 0.002        # relative move per poll treated as "normal" volatility
+    VOLATILITY_HALF_LIFE = 20   # observations
+
+    def __init__(self, threshold_distance=None, asset_class=None):
+        """
+        Args:
+            threshold_distance - Optional callable (symbol, price) -> relative
+                distance to the nearest alert threshold, or None
+            asset_class - Optional callable symbol -> 'stock', 'crypto' or None,
+                so crypto held under plain symbols ('BTC') is treated as 24/7
+        """
+        self.threshold_distance = threshold_distance
+        self.asset_class = asset_class
+        self._next_due = {}
+        self._last_price = {}
+        self._variance = {}    # EWMA of squared relative moves between polls
+        self._lock = threading.Lock()
+
+    # ========================================================================
+    # OBSERVATIONS
+    # ========================================================================
+
+    def record(self, symbol, price, now=None):
+        """
+        Feed a fetched quote back and schedule the symbol's next poll.
+        Returns: float - Seconds until the next poll
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            last = self._last_price.get(symbol)
+            if last and price:
+                move = (price - last) / last
+                decay = 0.5 ** (1 / self.VOLATILITY_HALF_LIFE)
+                previous = self._variance.get(symbol, move * move)
+                self._variance[symbol] = decay * previous + (1 - decay) * move * move
+            if price:
+                self._last_price[symbol] = price
+
+        interval = self.interval_for(symbol, now)
+        with self._lock:
+            self._next_due[symbol] = now + interval
+        return interval
+
+    def volatility(self, symbol):
+        """Typical relative move between polls (EWMA standard deviation)."""
+        with self._lock:
+            return math.sqrt(self._variance.get(symbol, 0.0))
+
+    # ========================================================================
+    # SCHEDULING
+    # ========================================================================
+
+    def interval_for(self, symbol, now=None):
+        """
+        Seconds to wait before polling a symbol again.
+        Args:
+            symbol (str) - Quote symbol
+            now (float) - Epoch seconds (default now)
+        Returns: float
+        """
+        now = now if now is not None else time.time()
+        exchange = exchange_for(symbol, self.asset_class(symbol) if self.asset_class else None)
+        at = datetime.fromtimestamp(now, tz=timezone.utc)
+        if not exchange.is_open(at):
+            return max(min(self.CLOSED_INTERVAL, exchange.seconds_until_open(at)), self.MIN_INTERVAL)
+
+        sigma = self.volatility(symbol)
+        typical = max(sigma, self.TYPICAL_MOVE * 0.25)
+        # Volatile symbols are polled up to 4x faster, quiet ones up to 2x slower
+        volatility_factor = min(max(self.TYPICAL_MOVE / typical, 0.25), 2.0)
+
+        proximity_factor = 1.0
+        with self._lock:
+            price = self._last_price.get(symbol)
+        if self.threshold_distance and price:
+            distance = self.threshold_distance(symbol, price)
+            if distance is not None:
+                # Within ~10 typical moves of a threshold, scale the interval down linearly
+                proximity_factor = min(max(distance / (10 * typical), 0.0), 1.0)
+
+        interval = self.OPEN_INTERVAL * volatility_factor * proximity_factor
+        return min(max(interval, self.MIN_INTERVAL), self.MAX_OPEN_INTERVAL)
+
+    def due(self, symbols, now=None):
+        """
+        Symbols whose next poll time has passed (new symbols are due at once).
+        Returns: list of str
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            return [s for s in symbols if self._next_due.get(s, 0) <= now]
+
+    def seconds_until_next(self, symbols, now=None):
+        """Time until the earliest scheduled poll among symbols (0 if one is due)."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            due_times = [self._next_due.get(s, 0) for s in symbols]
+        return max(min(due_times) - now, 0.0) if due_times else None
+
+    def forget(self, symbols):
+        """Drop state for symbols that are no longer watched."""
+        with self._lock:
+            for symbol in symbols:
+                self._next_due.pop(symbol, None)
+                self._last_price.pop(symbol, None)
+                self._variance.pop(symbol, None)
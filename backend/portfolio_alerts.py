@@ -0,0 +1,209 @@
+"""
+Portfolio Alerts Module
+Purpose: Alerts on a holding's profit/loss or on percentage moves, evaluated in bulk
+Provides: Alert book that joins alerts to holdings once and checks every
+          threshold with vectorized NumPy passes per price update
+"""
+
+import threading
+
+import numpy as np
+
+from alert_index import AlertIndex
+
+
+class PortfolioAlertBook:
+    """
+    Active portfolio-relative alerts. Supported types:
+      - 'profit':        P/L % of the holding >= value
+      - 'loss':          P/L % of the holding <= -value
+      - 'profit_amount': P/L amount of the holding >= value
+      - 'loss_amount':   P/L amount of the holding <= -value
+      - 'percent_move':  |price / reference_price - 1| * 100 >= value
+    Each alert is joined to its holding (quantity and buy price) when it is
+    added, and the book is compiled into flat arrays so a price update
+    checks all alerts in a handful of array operations.
+    """
+
+    TYPES = {'profit': 0, 'loss': 1, 'profit_amount': 2, 'loss_amount': 3, 'percent_move': 4}
+    # Types that need a holding's cost basis
+    HOLDING_TYPES = ('profit', 'loss', 'profit_amount', 'loss_amount')
+
+    def __init__(self):
+        self._alerts = {}     # alert key -> joined alert dict
+        self._compiled = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def supports(cls, alert):
+        return alert.get('type') in cls.TYPES
+
+    @staticmethod
+    def join(alert, holdings):
+        """
+        Attach the holding an alert refers to (by investmentId, else by symbol).
+        Args:
+            alert (dict) - Alert record
+            holdings (list) - The owner's stock and crypto records
+        Returns: dict - Alert with quantity, buy_price, reference_price and the
+                 holding's asset_class / coin_id, or None if a P/L alert has no matching holding
+        """
+        symbol = AlertIndex.normalize_symbol(alert.get('symbol'))
+        holding = next((h for h in holdings if h.get('id') == alert.get('investmentId')), None)
+        if holding is None:
+            holding = next((h for h in holdings
+                            if AlertIndex.normalize_symbol(h.get('symbol')) == symbol), None)
+
+        if holding is None and alert.get('type') in PortfolioAlertBook.HOLDING_TYPES:
+            return None
+
+        joined = {**alert, 'symbol': symbol, 'value': float(alert['value'])}
+        if holding is not None:
+            joined['quantity'] = float(holding.get('quantity') or 0)
+            joined['buy_price'] = float(holding.get('buy_price') or 0)
+            if holding.get('asset_class'):
+                joined['asset_class'] = holding['asset_class']
+            if holding.get('coin_id'):
+                joined['coin_id'] = holding['coin_id']
+        # Percentage moves are measured from the price when the alert was set
+        reference = alert.get('reference_price') or (holding or {}).get('current_price')
+        joined['reference_price'] = float(reference) if reference else None
+        return joined
+
+    # ========================================================================
+    # UPDATES
+    # ========================================================================
+
+    def add(self, alert, holdings=()):
+        """
+        Join and insert an active alert.
+        Args:
+            alert (dict) - Alert with id, user_id, symbol, type, value
+            holdings (list) - The owner's holdings
+        Returns: bool - True if the alert was added
+        """
+        if alert.get('triggered') or not alert.get('symbol') or alert.get('value') is None \
+                or not self.supports(alert):
+            return False
+        joined = self.join(alert, holdings)
+        if joined is None:
+            return False
+        with self._lock:
+            self._alerts[AlertIndex.alert_key(alert)] = joined
+            self._compiled = None
+        return True
+
+    def remove(self, user_id, alert_id):
+        """Returns: bool - True if the alert was present"""
+        with self._lock:
+            removed = self._alerts.pop((user_id, alert_id), None)
+            if removed is not None:
+                self._compiled = None
+            return removed is not None
+
+    def rebuild(self, alerts, holdings_by_user):
+        """
+        Replace the book with the given alerts, joined to holdings in one pass.
+        Args:
+            alerts (iterable) - Active alerts with user_id
+            holdings_by_user (dict) - { user_id: [holding records] }
+        Returns: int - Number of alerts added
+        """
+        with self._lock:
+            self._alerts, self._compiled = {}, None
+        return sum(1 for alert in alerts if self.add(alert, holdings_by_user.get(alert.get('user_id'), ())))
+
+    # ========================================================================
+    # QUERIES
+    # ========================================================================
+
+    def alerts(self):
+        """Joined alerts currently in the book."""
+        with self._lock:
+            return list(self._alerts.values())
+
+    def get(self, user_id, alert_id):
+        """Joined alert dict, or None."""
+        with self._lock:
+            return self._alerts.get((user_id, alert_id))
+
+    def user_ids(self):
+        with self._lock:
+            return {alert['user_id'] for alert in self._alerts.values()}
+
+    def symbols(self):
+        with self._lock:
+            return sorted({alert['symbol'] for alert in self._alerts.values()})
+
+    def _compile(self):
+        """Flatten the book into column arrays (called under the lock)."""
+        if self._compiled is None:
+            rows = list(self._alerts.values())
+            symbols = sorted({row['symbol'] for row in rows})
+            position = {symbol: i for i, symbol in enumerate(symbols)}
+            self._compiled = {
+                'rows': rows,
+                'symbols': symbols,
+                'symbol_idx': np.array([position[row['symbol']] for row in rows], dtype=np.intp),
+                'type': np.array([self.TYPES[row['type']] for row in rows], dtype=np.int8),
+                'value': np.array([row['value'] for row in rows], dtype=float),
+                'quantity': np.array([row.get('quantity', np.nan) for row in rows], dtype=float),
+                'buy_price': np.array([row.get('buy_price', np.nan) for row in rows], dtype=float),
+                'reference': np.array([row['reference_price'] or np.nan for row in rows], dtype=float),
+            }
+        return self._compiled
+
+    def evaluate(self, prices):
+        """
+        Check every alert against the latest prices in one vectorized pass.
+        Alerts on symbols missing from `prices` are skipped. A percent_move
+        alert with no reference price takes the first price it sees.
+        Args: prices (dict) - { symbol: price }
+        Returns: list of triggered alert dicts, with the observed 'price',
+                 'profit_loss' and 'profit_loss_percentage'
+        """
+        if not prices:
+            return []
+        quotes = {AlertIndex.normalize_symbol(symbol): price for symbol, price in prices.items()}
+
+        with self._lock:
+            book = self._compile()
+            if not book['rows']:
+                return []
+
+            symbol_prices = np.array([quotes.get(symbol) or np.nan for symbol in book['symbols']], dtype=float)
+            price = symbol_prices[book['symbol_idx']]
+            quoted = ~np.isnan(price)
+
+            reference = book['reference']
+            unset = quoted & np.isnan(reference)
+            reference[unset] = price[unset]
+            for i in np.flatnonzero(unset):
+                book['rows'][i]['reference_price'] = float(price[i])
+
+            kind, value, buy_price = book['type'], book['value'], book['buy_price']
+            with np.errstate(invalid='ignore', divide='ignore'):
+                profit_loss = (price - buy_price) * book['quantity']
+                profit_loss_pct = (price - buy_price) / buy_price * 100
+                move_pct = np.abs(price / reference - 1) * 100
+
+                hit = quoted & (
+                    ((kind == 0) & (profit_loss_pct >= value))
+                    | ((kind == 1) & (profit_loss_pct <= -value))
+                    | ((kind == 2) & (profit_loss >= value))
+                    | ((kind == 3) & (profit_loss <= -value))
+                    | ((kind == 4) & (move_pct >= value))
+                )
+
+            triggered = []
+            for i in np.flatnonzero(hit):
+                triggered.append({
+                    **book['rows'][i],
+                    'price': float(price[i]),
+                    'profit_loss': None if np.isnan(profit_loss[i]) else round(float(profit_loss[i]), 2),
+                    'profit_loss_percentage': None if np.isnan(profit_loss_pct[i]) else round(float(profit_loss_pct[i]), 2),
+                })
+            return triggered
+
+    def __len__(self):
+        return len(self._alerts)
@@ -0,0 +1,543 @@
+"""
+Portfolio Analytics Module
+Purpose: Time-series analytics over the user's stock and crypto holdings
+Uses: PriceHistoryService closes and vectorized NumPy matrix operations
+"""
+
+import threading
+import time
+from statistics import NormalDist
+
+import numpy as np
+
+from portfolio_engine import PortfolioValuation
+from portfolio_optimizer import (
+    check_bounds, check_weight_range, mean_variance_weights, project_capped_simplex, risk_parity_weights,
+)
+from price_history import PriceHistoryService, date_window, forward_fill
+
+
+class PortfolioAnalytics:
+    """
+    Rebuilds portfolio history, risk and correlation statistics and
+    rebalancing targets from holdings and cached daily closes. NAV series are cached per user so
+    repeat requests only compute new days; the other results are memoized
+    on the price cache version.
+    """
+
+    # Correlation and rebalancing returns are taken on a calendar-day grid
+    # (crypto trades daily), so they annualize by calendar days. Risk metrics
+    # use real trading days only and annualize by their observed frequency.
+    PERIODS_PER_YEAR = 365
+    DEFAULT_BENCHMARK = '^NSEI'
+    MAX_CORRELATION_ASSETS = 20
+    # Assets with fewer real closes in the range are left out of risk statistics:
+    # gap filling would give them a flat, zero-variance series
+    MIN_OBSERVATIONS = 20
+    REBALANCE_METHODS = ('mean_variance', 'risk_parity')
+
+    RANGES = {
+        '1m': 30,
+        '3m': 91,
+        '6m': 182,
+        '1y': 365,
+        '2y': 730,
+        '5y': 1825,
+    }
+
+    def __init__(self, price_history):
+        self.price_history = price_history
+        self._nav_cache = {}
+        self._risk_cache = {}
+        self._moments_cache = {}
+        self._lock = threading.Lock()
+
+    # ========================================================================
+    # HOLDINGS
+    # ========================================================================
+
+    @staticmethod
+    def _positions(stocks, cryptos):
+        """
+        Flatten stock and crypto records into position tuples.
+        Returns: list of (key, quantity, buy_price, buy_date, fallback_price)
+        """
+        positions = []
+        for asset_class, records in (('stock', stocks or []), ('crypto', cryptos or [])):
+            for rec in records:
+                key = PriceHistoryService.key_for(rec, asset_class)
+                quantity = float(rec.get('quantity') or 0)
+                buy_price = float(rec.get('buy_price') or 0)
+                fallback = float(rec.get('current_price') or buy_price)
+                buy_date = np.datetime64((rec.get('date') or rec.get('timestamp') or '1970-01-01')[:10], 'D')
+                positions.append((key, quantity, buy_price, buy_date, fallback))
+        return positions
+
+    def _aligned_prices(self, positions, start, end):
+        """
+        Price matrix with one column per distinct key, gaps filled.
+        Returns: (dates, prices, keys, column index of each position)
+        """
+        keys = sorted({p[0] for p in positions})
+        dates, prices = self.price_history.matrix(keys, start, end)
+
+        # Leading gaps take the first available close; symbols with no history
+        # at all are held flat at their last known price.
+        prices = forward_fill(prices[::-1])[::-1]
+        fallback = {}
+        for key, _, _, _, price in positions:
+            fallback.setdefault(key, price)
+        missing = np.isnan(prices)
+        if missing.any():
+            prices = np.where(missing, np.array([fallback[k] for k in keys])[None, :], prices)
+
+        col = {key: i for i, key in enumerate(keys)}
+        return dates, prices, keys, np.array([col[p[0]] for p in positions], dtype=int)
+
+    # ========================================================================
+    # NAV HISTORY
+    # ========================================================================
+
+    def _nav_rows(self, positions, start, end):
+        """
+        Portfolio value and invested capital for each day in [start, end].
+        Returns: (dates, value, invested) arrays
+        """
+        dates, prices, _, cols = self._aligned_prices(positions, start, end)
+
+        quantity = np.array([p[1] for p in positions])
+        buy_price = np.array([p[2] for p in positions])
+        buy_date = np.array([p[3] for p in positions], dtype='datetime64[D]')
+
+        # dates x positions: shares held on each day
+        held = (dates[:, None] >= buy_date[None, :]) * quantity[None, :]
+        value = np.einsum('ij,ij->i', prices[:, cols], held)
+        invested = held @ buy_price
+        return dates, value, invested
+
+    def nav_history(self, user_id, stocks, cryptos, range_key='1y', today=None):
+        """
+        Daily net asset value of the portfolio over a range.
+        Args:
+            user_id (str) - Owner of the holdings (cache key)
+            stocks (list) - Records from get_stocks()
+            cryptos (list) - Records from get_crypto()
+            range_key (str) - One of RANGES
+            today (date) - Optional end date
+        Returns: list of { date, value, invested, profit_loss }
+        """
+        start, end = date_window(self.RANGES[range_key], today)
+        positions = self._positions(stocks, cryptos)
+        if not positions:
+            return []
+
+        fingerprint = tuple(sorted((p[0], p[1], p[2], str(p[3])) for p in positions))
+        keys = [p[0] for p in positions]
+        version = self.price_history.refresh(keys, start)
+        cache_key = (user_id, range_key)
+
+        with self._lock:
+            entry = self._nav_cache.get(cache_key)
+
+        # New bars at the end only extend the series; a bar revised or backfilled
+        # before the last cached day (which also moves gap-filled rows) rebuilds it
+        revised = self.price_history.changed_since(keys, entry['version']) if entry else None
+        if entry and entry['fingerprint'] == fingerprint and entry['dates'][0] <= np.datetime64(start, 'D') \
+                and (revised is None or revised >= entry['dates'][-1]):
+            # Recompute only from the last cached day (its close may have moved) onwards
+            last = entry['dates'][-1].astype(object)
+            new_dates, new_value, new_invested = self._nav_rows(positions, last, end)
+            keep = entry['dates'] < new_dates[0]
+            dates = np.concatenate([entry['dates'][keep], new_dates])
+            value = np.concatenate([entry['value'][keep], new_value])
+            invested = np.concatenate([entry['invested'][keep], new_invested])
+        else:
+            dates, value, invested = self._nav_rows(positions, start, end)
+
+        in_range = dates >= np.datetime64(start, 'D')
+        dates, value, invested = dates[in_range], value[in_range], invested[in_range]
+        with self._lock:
+            self._nav_cache[cache_key] = {
+                'fingerprint': fingerprint,
+                'version': version,
+                'dates': dates,
+                'value': value,
+                'invested': invested,
+            }
+
+        profit_loss = value - invested
+        return [
+            {
+                'date': str(d),
+                'value': round(float(v), 2),
+                'invested': round(float(i), 2),
+                'profit_loss': round(float(pl), 2),
+            }
+            for d, v, i, pl in zip(dates, value, invested, profit_loss)
+        ]
+
+    # ========================================================================
+    # RETURNS & WEIGHTS
+    # ========================================================================
+
+    @staticmethod
+    def _returns(prices):
+        """Simple daily returns down each column of a price matrix."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = prices[1:] / prices[:-1] - 1
+        return np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+
+    @staticmethod
+    def _key_weights(stocks, cryptos, keys, cols):
+        """
+        Current value weight of each distinct key.
+        Returns: (weights ndarray aligned with keys, total portfolio value)
+        """
+        valuation = PortfolioValuation.from_holdings(stocks, cryptos)
+        values = np.bincount(cols, weights=valuation.value, minlength=len(keys))
+        total = values.sum()
+        weights = values / total if total > 0 else np.zeros(len(keys))
+        return weights, float(total)
+
+    # ========================================================================
+    # RISK METRICS
+    # ========================================================================
+
+    def risk_metrics(self, user_id, stocks, cryptos, range_key='1y', benchmark=None, confidence=0.95):
+        """
+        Volatility, drawdown, VaR and beta of the current portfolio weights.
+        Memoized per user until holdings change or new bars reach the cache.
+        Args:
+            user_id (str) - Owner of the holdings (cache key)
+            stocks (list) - Records from get_stocks()
+            cryptos (list) - Records from get_crypto()
+            range_key (str) - One of RANGES
+            benchmark (str) - Benchmark index symbol (default DEFAULT_BENCHMARK)
+            confidence (float) - VaR confidence level, e.g. 0.95
+        Returns: dict of risk metrics, or None if there are no holdings
+        """
+        benchmark = (benchmark or self.DEFAULT_BENCHMARK).upper()
+        positions = self._positions(stocks, cryptos)
+        if not positions:
+            return None
+
+        start, end = date_window(self.RANGES[range_key], None)
+        benchmark_key = f"stock:{benchmark}"
+        version = self.price_history.refresh([p[0] for p in positions] + [benchmark_key], start)
+
+        fingerprint = tuple(sorted((p[0], p[1], p[2], p[4]) for p in positions))
+        cache_key = (user_id, range_key, benchmark, confidence)
+        with self._lock:
+            cached = self._risk_cache.get(cache_key)
+        if cached and cached[0] == (version, fingerprint, end):
+            return cached[1]
+
+        dates, prices, keys, cols = self._aligned_prices(positions, start, end)
+        weights, total_value = self._key_weights(stocks, cryptos, keys, cols)
+
+        # Statistics cover only assets with enough real history; the rest are
+        # listed as excluded rather than counted as riskless
+        real = self.price_history.close_mask(keys, start, end)
+        observations = real.sum(axis=0)
+        covered = observations >= self.MIN_OBSERVATIONS
+        coverage = float(weights[covered].sum())
+
+        # Returns are taken between real trading days of the covered assets
+        # (weekend and holiday fills would add zero returns and shrink VaR),
+        # from the first day every covered asset has a close
+        rows = np.ones(len(dates), dtype=bool)
+        window_start = dates[0]
+        if covered.any():
+            window_start = max(dates[np.argmax(real[:, i])] for i in np.flatnonzero(covered))
+            rows = real[:, covered].any(axis=1) & (dates >= window_start)
+        returns = self._returns(prices[rows])
+        span = (dates[rows][-1] - dates[rows][0]).astype(int) if rows.sum() > 1 else 0
+        periods_per_year = len(returns) * 365 / span if span > 0 else self.PERIODS_PER_YEAR
+
+        if coverage > 0:
+            portfolio = returns @ np.where(covered, weights, 0.0) / coverage
+        else:
+            portfolio = np.zeros(0)
+        covered_value = total_value * coverage
+
+        metrics = self._risk_from_returns(portfolio, confidence, periods_per_year)
+        for name in ('var_historical', 'var_parametric'):
+            value = metrics[name]
+            metrics[f'{name}_amount'] = round(value * covered_value, 2) if value is not None else None
+
+        _, bench_prices = self.price_history.matrix([benchmark_key], start, end)
+        bench_returns = self._returns(forward_fill(bench_prices[::-1])[::-1][rows])[:, 0]
+        bench_var = bench_returns.var(ddof=1) if len(bench_returns) > 1 else 0.0
+        if bench_var > 0 and len(portfolio) == len(bench_returns):
+            beta = np.cov(portfolio, bench_returns, ddof=1)[0, 1] / bench_var
+            metrics['beta'] = round(float(beta), 4)
+        else:
+            metrics['beta'] = None
+
+        asset_vol = returns.std(axis=0, ddof=1) * np.sqrt(periods_per_year) if len(returns) > 1 else np.zeros(len(keys))
+        metrics.update({
+            'range': range_key,
+            # Later than the range start when a covered asset's history begins later
+            'window_start': str(window_start),
+            'periods_per_year': round(float(periods_per_year), 1),
+            'benchmark': benchmark,
+            'confidence': confidence,
+            'portfolio_value': round(total_value, 2),
+            'observations': int(len(portfolio)),
+            'coverage': round(coverage, 4),
+            'excluded': [key for key, ok in zip(keys, covered) if not ok],
+            'assets': [
+                {
+                    'key': key,
+                    'weight': round(float(w), 4),
+                    'annualized_volatility': round(float(v), 4) if ok else None,
+                    'observations': int(n),
+                }
+                for key, w, v, n, ok in zip(keys, weights, asset_vol, observations, covered)
+            ],
+        })
+
+        with self._lock:
+            self._risk_cache[cache_key] = ((version, fingerprint, end), metrics)
+        return metrics
+
+    def _risk_from_returns(self, returns, confidence, periods_per_year=None):
+        """
+        Scalar risk statistics of a return series (as fractions, not percent).
+        Args: periods_per_year (float) - Returns per year (default PERIODS_PER_YEAR)
+        Returns: dict (values are None when there is too little data)
+        """
+        periods_per_year = periods_per_year or self.PERIODS_PER_YEAR
+        if len(returns) < 2:
+            return {
+                'annualized_volatility': None,
+                'max_drawdown': None,
+                'var_historical': None,
+                'var_parametric': None,
+            }
+
+        mean = returns.mean()
+        std = returns.std(ddof=1)
+
+        wealth = np.cumprod(1 + returns)
+        drawdown = wealth / np.maximum.accumulate(wealth) - 1
+
+        z = NormalDist().inv_cdf(1 - confidence)
+        return {
+            'annualized_volatility': round(float(std * np.sqrt(periods_per_year)), 4),
+            'max_drawdown': round(float(-drawdown.min()), 4),
+            'var_historical': round(float(max(-np.percentile(returns, (1 - confidence) * 100), 0.0)), 4),
+            'var_parametric': round(float(max(-(mean + z * std), 0.0)), 4),
+        }
+
+    # ========================================================================
+    # CORRELATION
+    # ========================================================================
+
+    def _return_moments(self, keys, start, end, version):
+        """
+        Mean vector, covariance and correlation of daily returns for a symbol set,
+        plus the real close count per symbol. Correlations of symbols with fewer
+        than MIN_OBSERVATIONS closes (or a constant price) are NaN, not 0.
+        Cached on (symbol set, date range, price cache version).
+        Returns: (mean ndarray, covariance ndarray, correlation ndarray, observations ndarray)
+        """
+        cache_key = (tuple(keys), start, end)
+        with self._lock:
+            cached = self._moments_cache.get(cache_key)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        _, prices = self.price_history.matrix(list(keys), start, end)
+        returns = self._returns(forward_fill(prices[::-1])[::-1])
+
+        n = len(returns)
+        mean = returns.mean(axis=0) if n else np.zeros(len(keys))
+        centered = returns - mean
+        covariance = centered.T @ centered / max(n - 1, 1)
+        std = np.sqrt(np.diag(covariance))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = covariance / np.outer(std, std)
+        # Gap-filled or flat series have no meaningful correlation: leave it undefined
+        observations = self.price_history.observations(list(keys), start, end)
+        undefined = (observations < self.MIN_OBSERVATIONS) | (std == 0)
+        correlation[undefined, :] = np.nan
+        correlation[:, undefined] = np.nan
+        np.fill_diagonal(correlation, 1.0)
+
+        moments = (mean, covariance, correlation, observations)
+        with self._lock:
+            self._moments_cache[cache_key] = (version, moments)
+        return moments
+
+    def correlation_matrix(self, stocks, cryptos, range_key='1y', max_assets=None):
+        """
+        Pairwise return correlations and a diversification score.
+        Args:
+            stocks (list) - Records from get_stocks()
+            cryptos (list) - Records from get_crypto()
+            range_key (str) - One of RANGES
+            max_assets (int) - Largest matrix to return; bigger portfolios keep their top holdings by weight
+        Returns: dict with symbols, matrix, diversification metrics, or None if there are no holdings.
+                 Assets with too little history get null correlations, are listed in
+                 'excluded' and left out of the diversification metrics.
+        """
+        max_assets = max_assets or self.MAX_CORRELATION_ASSETS
+        positions = self._positions(stocks, cryptos)
+        if not positions:
+            return None
+
+        start, end = date_window(self.RANGES[range_key], None)
+        keys = sorted({p[0] for p in positions})
+        version = self.price_history.refresh(keys, start)
+        _, covariance, correlation, observations = self._return_moments(keys, start, end, version)
+
+        col = {key: i for i, key in enumerate(keys)}
+        cols = np.array([col[p[0]] for p in positions], dtype=int)
+        weights, _ = self._key_weights(stocks, cryptos, keys, cols)
+
+        # Diversification is measured over assets with a defined correlation only
+        covered = (observations >= self.MIN_OBSERVATIONS) & (np.diag(covariance) > 0)
+        w = np.where(covered, weights, 0.0)
+        cov = np.where(np.outer(covered, covered), covariance, 0.0)
+        corr = np.nan_to_num(correlation, nan=0.0)
+
+        # Diversification ratio: weighted average volatility over portfolio volatility
+        std = np.sqrt(np.diag(cov))
+        portfolio_vol = float(np.sqrt(max(w @ cov @ w, 0.0)))
+        weighted_vol = float(w @ std)
+        ratio = weighted_vol / portfolio_vol if portfolio_vol > 0 else 1.0
+
+        off_diagonal = ~np.eye(len(keys), dtype=bool)
+        pair_weights = np.outer(w, w)[off_diagonal]
+        average_correlation = (
+            float((corr[off_diagonal] * pair_weights).sum() / pair_weights.sum())
+            if pair_weights.sum() > 0 else None
+        )
+
+        shown = np.arange(len(keys))
+        if len(keys) > max_assets:
+            shown = np.sort(np.argsort(-weights, kind='stable')[:max_assets])
+
+        matrix = np.round(correlation[np.ix_(shown, shown)], 3)
+        return {
+            'range': range_key,
+            'symbols': [keys[i].split(':', 1)[1] for i in shown],
+            'observations': [int(observations[i]) for i in shown],
+            'matrix': [[None if np.isnan(v) else float(v) for v in row] for row in matrix],
+            'excluded': [keys[i].split(':', 1)[1] for i in range(len(keys)) if not covered[i]],
+            'total_assets': len(keys),
+            'truncated': len(shown) < len(keys),
+            'average_correlation': round(average_correlation, 4) if average_correlation is not None else None,
+            'diversification_ratio': round(ratio, 4),
+            'diversification_score': round(max(0.0, 1 - 1 / ratio) * 100, 1),
+        }
+
+    # ========================================================================
+    # REBALANCING
+    # ========================================================================
+
+    def rebalance(self, stocks, cryptos, method='mean_variance', range_key='1y',
+                  risk_aversion=3.0, min_weight=0.0, max_weight=1.0, min_trade_value=0.0):
+        """
+        Target weights and the trades needed to reach them.
+        Args:
+            stocks (list) - Records from get_stocks()
+            cryptos (list) - Records from get_crypto()
+            method (str) - 'mean_variance' or 'risk_parity'
+            range_key (str) - Return history used for estimates
+            risk_aversion (float) - Variance penalty for mean_variance
+            min_weight, max_weight (float) - Per-asset weight bounds
+            min_trade_value (float) - Skip trades smaller than this value
+        Returns: dict with weights, trades and expected risk/return, or None if there are no holdings.
+                 Assets with fewer than MIN_OBSERVATIONS closes keep their current
+                 weight, are listed in 'excluded' and get no trades.
+        Raises: ValueError for unknown methods, infeasible bounds or too little history
+        """
+        if method not in self.REBALANCE_METHODS:
+            raise ValueError(f"Unknown method '{method}'. Use one of: {', '.join(self.REBALANCE_METHODS)}")
+        check_weight_range(min_weight, max_weight)
+
+        positions = self._positions(stocks, cryptos)
+        if not positions:
+            return None
+
+        start, end = date_window(self.RANGES[range_key], None)
+        keys = sorted({p[0] for p in positions})
+        version = self.price_history.refresh(keys, start)
+        mean, covariance, _, observations = self._return_moments(keys, start, end, version)
+
+        col = {key: i for i, key in enumerate(keys)}
+        cols = np.array([col[p[0]] for p in positions], dtype=int)
+        valuation = PortfolioValuation.from_holdings(stocks, cryptos)
+        current_value = np.bincount(cols, weights=valuation.value, minlength=len(keys))
+        total_value = current_value.sum()
+        current = current_value / total_value if total_value > 0 else np.zeros(len(keys))
+
+        # Only assets with real history are optimized: a gap-filled series has
+        # zero variance and would look risk-free. The rest keep their weight.
+        covered = observations >= self.MIN_OBSERVATIONS
+        if not covered.any():
+            raise ValueError('Not enough price history to rebalance')
+        free = 1.0 - float(current[~covered].sum())
+        if free <= 0:
+            raise ValueError('Not enough price history to rebalance')
+        lower, upper = min_weight / free, min(max_weight / free, 1.0)
+
+        mu = mean[covered] * self.PERIODS_PER_YEAR
+        cov = covariance[np.ix_(covered, covered)] * self.PERIODS_PER_YEAR
+        n = int(covered.sum())
+        # Small ridge keeps the covariance positive definite for duplicate series
+        cov = cov + np.eye(n) * max(np.trace(cov) / n, 1e-6) * 1e-6
+
+        started = time.perf_counter()
+        if method == 'risk_parity':
+            check_bounds(n, lower, upper)
+            solved = risk_parity_weights(cov)
+            if min_weight > 0 or max_weight < 1:
+                solved = project_capped_simplex(solved, lower, upper)
+        else:
+            solved = mean_variance_weights(mu, cov, risk_aversion, lower, upper)
+        solve_ms = (time.perf_counter() - started) * 1000
+
+        target = current.copy()
+        target[covered] = solved * free
+
+        prices = np.zeros(len(keys))
+        prices[cols] = valuation.last_price * valuation.fx_rate
+
+        delta = target * total_value - current_value
+        trades = []
+        for i in np.argsort(-np.abs(delta), kind='stable'):
+            if abs(delta[i]) < max(min_trade_value, 0.01):
+                continue
+            trades.append({
+                'symbol': keys[i].split(':', 1)[1],
+                'asset_class': keys[i].split(':', 1)[0],
+                'action': 'buy' if delta[i] > 0 else 'sell',
+                'value': round(float(abs(delta[i])), 2),
+                'quantity': round(float(abs(delta[i]) / prices[i]), 6) if prices[i] > 0 else None,
+                'price': round(float(prices[i]), 4),
+            })
+
+        return {
+            'method': method,
+            'range': range_key,
+            'portfolio_value': round(float(total_value), 2),
+            # Expected figures describe the optimized (non-excluded) part of the portfolio
+            'expected_return': round(float(mu @ solved), 4),
+            'expected_volatility': round(float(np.sqrt(max(solved @ cov @ solved, 0.0))), 4),
+            'optimized_share': round(free, 4),
+            'excluded': [key.split(':', 1)[1] for key, ok in zip(keys, covered) if not ok],
+            'solve_ms': round(solve_ms, 3),
+            'weights': [
+                {
+                    'symbol': key.split(':', 1)[1],
+                    'current_weight': round(float(c), 4),
+                    'target_weight': round(float(t), 4),
+                    'observations': int(n),
+                }
+                for key, c, t, n in zip(keys, current, target, observations)
+            ],
+            'trades': trades,
+        }
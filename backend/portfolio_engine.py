@@ -0,0 +1,177 @@
+"""
+Portfolio Valuation Engine
+Purpose: Value stock and crypto holdings in vectorized NumPy passes
+Provides: Per-holding and total value, profit/loss, weights and day change
+"""
+
+from datetime import date
+
+import numpy as np
+
+
+def roll_previous_close(record, today=None):
+    """
+    Previous close to store with a fresh quote. On the first update of a new
+    day the price stored on an earlier day becomes the previous close;
+    later updates the same day keep it.
+    Args:
+        record (dict) - Stored stock or crypto record (current_price, last_updated, previous_close)
+        today (date) - Optional current date
+    Returns: float or None if the holding has never been priced
+    """
+    today = (today or date.today()).isoformat()
+    last_updated = (record.get('last_updated') or '')[:10]
+    if record.get('current_price') is not None and last_updated and last_updated < today:
+        return _as_float(record.get('current_price'))
+    previous = record.get('previous_close')
+    return _as_float(previous) if previous is not None else None
+
+
+class PortfolioValuation:
+    """
+    Holds a portfolio as parallel NumPy arrays (quantity, cost basis,
+    last price, previous close, FX rate) so every metric is one array pass.
+    Stocks and crypto are valued together; `asset_class` keeps them apart
+    for per-class subtotals.
+    """
+
+    ASSET_CLASSES = ('stock', 'crypto')
+
+    def __init__(self, records, asset_classes, fx_rates=None):
+        """
+        Build the position arrays.
+        Args:
+            records (list) - Holding dicts with quantity, buy_price, current_price
+            asset_classes (list) - 'stock' or 'crypto' for each record
+            fx_rates (dict) - Optional { currency: rate } to convert into the base currency
+        """
+        fx_rates = fx_rates or {}
+        self.records = records
+        self.asset_class = np.array(asset_classes, dtype=object)
+
+        n = len(records)
+        self.quantity = np.zeros(n)
+        self.cost_basis = np.zeros(n)
+        self.last_price = np.zeros(n)
+        self.previous_close = np.zeros(n)
+        self.fx_rate = np.ones(n)
+
+        for i, rec in enumerate(records):
+            buy_price = _as_float(rec.get('buy_price'))
+            # Holdings that were never priced are valued at cost (zero P/L)
+            last_price = _as_float(rec.get('current_price'), buy_price)
+            self.quantity[i] = _as_float(rec.get('quantity'))
+            self.cost_basis[i] = buy_price
+            self.last_price[i] = last_price
+            self.previous_close[i] = _as_float(rec.get('previous_close'), last_price)
+            self.fx_rate[i] = _as_float(
+                rec.get('fx_rate'), fx_rates.get(rec.get('currency'), 1.0)
+            )
+
+        self._compute()
+
+    @classmethod
+    def from_holdings(cls, stocks=None, cryptos=None, fx_rates=None):
+        """
+        Build a valuation from FirebaseService stock and crypto records.
+        Args:
+            stocks (list) - Records from get_stocks()
+            cryptos (list) - Records from get_crypto()
+            fx_rates (dict) - Optional { currency: rate }
+        Returns: PortfolioValuation
+        """
+        stocks = stocks or []
+        cryptos = cryptos or []
+        return cls(
+            list(stocks) + list(cryptos),
+            ['stock'] * len(stocks) + ['crypto'] * len(cryptos),
+            fx_rates=fx_rates,
+        )
+
+    def _compute(self):
+        """Run the vectorized valuation passes."""
+        units = self.quantity * self.fx_rate
+        self.invested = units * self.cost_basis
+        self.value = units * self.last_price
+        self.profit_loss = self.value - self.invested
+        self.day_change = units * (self.last_price - self.previous_close)
+
+        self.profit_loss_pct = _safe_pct(self.profit_loss, self.invested)
+        total_value = self.value.sum()
+        self.weights = self.value / total_value if total_value > 0 else np.zeros_like(self.value)
+
+    # ========================================================================
+    # RESULTS
+    # ========================================================================
+
+    def totals(self, mask=None):
+        """
+        Aggregate metrics over all holdings, or over those selected by mask.
+        Args: mask (ndarray) - Optional boolean selector
+        Returns: dict with investment, value, profit/loss and day change
+        """
+        if mask is None:
+            mask = np.ones(len(self.value), dtype=bool)
+
+        invested = float(self.invested[mask].sum())
+        value = float(self.value[mask].sum())
+        profit_loss = value - invested
+        day_change = float(self.day_change[mask].sum())
+        prior_value = value - day_change
+
+        return {
+            'total_investment': round(invested, 2),
+            'total_current_value': round(value, 2),
+            'total_profit_loss': round(profit_loss, 2),
+            'profit_loss_percentage': round(profit_loss / invested * 100 if invested > 0 else 0, 2),
+            'day_change': round(day_change, 2),
+            'day_change_percentage': round(day_change / prior_value * 100 if prior_value > 0 else 0, 2),
+        }
+
+    def totals_by_class(self):
+        """
+        Aggregate metrics per asset class.
+        Returns: dict - { 'stock': totals, 'crypto': totals }
+        """
+        return {
+            asset_class: self.totals(self.asset_class == asset_class)
+            for asset_class in self.ASSET_CLASSES
+        }
+
+    def holdings(self):
+        """
+        Per-holding metrics, in the order the records were given.
+        Returns: list of dicts keyed by symbol with value, P/L, weight and day change
+        """
+        rows = []
+        for i, rec in enumerate(self.records):
+            rows.append({
+                'id': rec.get('id'),
+                'symbol': rec.get('symbol'),
+                'asset_class': self.asset_class[i],
+                'quantity': float(self.quantity[i]),
+                'current_value': round(float(self.value[i]), 2),
+                'investment': round(float(self.invested[i]), 2),
+                'profit_loss': round(float(self.profit_loss[i]), 2),
+                'profit_loss_percentage': round(float(self.profit_loss_pct[i]), 2),
+                'weight': round(float(self.weights[i]), 4),
+                'day_change': round(float(self.day_change[i]), 2),
+            })
+        return rows
+
+
+def _as_float(value, default=0.0):
+    """Coerce a stored numeric field, treating missing values as default."""
+    if value is None:
+        return float(default)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float(default)
+
+
+def _safe_pct(numerator, denominator):
+    """Element-wise percentage that yields 0 where the denominator is 0."""
+    out = np.zeros_like(numerator)
+    np.divide(numerator * 100, denominator, out=out, where=denominator > 0)
+    return out
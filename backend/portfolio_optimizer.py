@@ -0,0 +1,108 @@
+"""
+Portfolio Optimizer Module
+Purpose: Long-only allocation solvers for rebalancing
+Provides: Mean-variance (projected accelerated gradient) and risk-parity (Newton) weights
+"""
+
+import numpy as np
+
+
+def project_capped_simplex(v, lower, upper, iterations=60):
+    """
+    Euclidean projection onto { w : sum(w) = 1, lower <= w <= upper }.
+    Bisects on the shift tau so that sum(clip(v - tau, lower, upper)) = 1.
+    Args:
+        v (ndarray) - Point to project
+        lower (float) - Minimum weight per asset
+        upper (float) - Maximum weight per asset
+    Returns: ndarray
+    Raises: ValueError if the bounds are invalid or infeasible
+    """
+    check_bounds(len(v), lower, upper)
+    lo = np.min(v) - upper
+    hi = np.max(v) - lower
+    for _ in range(iterations):
+        tau = (lo + hi) / 2
+        if np.clip(v - tau, lower, upper).sum() > 1:
+            lo = tau
+        else:
+            hi = tau
+    return np.clip(v - (lo + hi) / 2, lower, upper)
+
+
+def check_weight_range(lower, upper):
+    """
+    Validate per-asset weight bounds on their own.
+    Raises: ValueError unless 0 <= lower <= upper <= 1 (and upper > 0)
+    """
+    if not (0 <= lower <= upper <= 1) or upper <= 0:
+        raise ValueError('Weight bounds must satisfy 0 <= min_weight <= max_weight <= 1')
+
+
+def check_bounds(n, lower, upper):
+    """
+    Validate that weight bounds admit a fully invested portfolio.
+    Raises: ValueError if the bounds are invalid or infeasible
+    """
+    check_weight_range(lower, upper)
+    if n * lower > 1 + 1e-9 or n * upper < 1 - 1e-9:
+        raise ValueError(f'Weight bounds are infeasible for {n} assets')
+
+
+def mean_variance_weights(mu, cov, risk_aversion=3.0, lower=0.0, upper=1.0, max_iter=500, tol=1e-9):
+    """
+    Long-only mean-variance weights: maximize mu'w - (risk_aversion / 2) w'cov w.
+    Solved with FISTA (accelerated projected gradient) on the capped simplex.
+    Args:
+        mu (ndarray) - Expected returns
+        cov (ndarray) - Covariance matrix
+        risk_aversion (float) - Penalty on variance
+        lower, upper (float) - Per-asset weight bounds
+    Returns: ndarray of weights summing to 1
+    """
+    n = len(mu)
+    check_bounds(n, lower, upper)
+
+    lipschitz = risk_aversion * float(np.linalg.eigvalsh(cov)[-1])
+    step = 1 / lipschitz if lipschitz > 0 else 1.0
+
+    w = project_capped_simplex(np.full(n, 1 / n), lower, upper)
+    y, t = w.copy(), 1.0
+    for _ in range(max_iter):
+        grad = risk_aversion * (cov @ y) - mu
+        w_next = project_capped_simplex(y - step * grad, lower, upper)
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        y = w_next + ((t - 1) / t_next) * (w_next - w)
+        if np.abs(w_next - w).max() < tol:
+            w = w_next
+            break
+        w, t = w_next, t_next
+    return w
+
+
+def risk_parity_weights(cov, budgets=None, max_iter=50, tol=1e-10):
+    """
+    Long-only risk-parity weights (equal or budgeted risk contributions).
+    Solves the convex problem min 0.5 x'cov x - sum(b * log x) with damped
+    Newton steps, then normalizes x to sum to 1.
+    Args:
+        cov (ndarray) - Covariance matrix
+        budgets (ndarray) - Optional risk budgets (default equal)
+    Returns: ndarray of weights summing to 1
+    """
+    n = cov.shape[0]
+    b = np.full(n, 1 / n) if budgets is None else np.asarray(budgets, dtype=float) / np.sum(budgets)
+
+    x = b / np.sqrt(np.maximum(np.diag(cov), 1e-12))
+    for _ in range(max_iter):
+        grad = cov @ x - b / x
+        hessian = cov + np.diag(b / (x * x))
+        delta = np.linalg.solve(hessian, grad)
+
+        # Damp the step so every weight stays strictly positive
+        shrink = delta > 0
+        alpha = min(1.0, 0.95 * float(np.min(x[shrink] / delta[shrink]))) if shrink.any() else 1.0
+        x = x - alpha * delta
+        if np.abs(grad).max() < tol:
+            break
+    return x / x.sum()
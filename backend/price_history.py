@@ -0,0 +1,251 @@
+"""
+Price History Cache
+Purpose: Keep daily closing prices for held stocks and crypto in memory
+Provides: Incremental bar refresh and aligned dates x symbols price matrices
+"""
+
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+
+class PriceHistoryService:
+    """
+    In-memory cache of daily closes keyed by 'stock:<SYMBOL>' or
+    'crypto:<coin_id>'. Refreshes only fetch bars newer than what is cached,
+    and `version` is bumped whenever a refresh changes any bar so callers can
+    memoize results computed from the cache. Each change also records the
+    earliest date it touched, so incremental callers can tell a new bar at
+    the end from a revised or backfilled one earlier in the series.
+    """
+
+    REFRESH_SECONDS = 3600
+    # Change records kept per key; older versions are treated as "everything changed"
+    MAX_REVISIONS = 64
+
+    def __init__(self, stock_service, crypto_service):
+        self.stock_service = stock_service
+        self.crypto_service = crypto_service
+        self.version = 0
+        self._series = {}      # key -> (dates datetime64[D] array, closes array)
+        self._since = {}       # key -> earliest date the cache covers
+        self._checked = {}     # key -> epoch seconds of the last refresh
+        self._revisions = {}   # key -> [(version, earliest changed date)], oldest first
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(record, asset_class):
+        """
+        Cache key for a holding record.
+        Args:
+            record (dict) - Stock or crypto record
+            asset_class (str) - 'stock' or 'crypto'
+        Returns: str
+        """
+        if asset_class == 'crypto':
+            return f"crypto:{record.get('coin_id') or (record.get('symbol') or '').lower()}"
+        return f"stock:{(record.get('symbol') or '').upper()}"
+
+    # ========================================================================
+    # REFRESH
+    # ========================================================================
+
+    def refresh(self, keys, start):
+        """
+        Make sure every key has closes from `start` up to today.
+        Args:
+            keys (list) - Cache keys
+            start (date) - Earliest date needed
+        Returns: int - Current cache version
+        """
+        now = time.time()
+        today = date.today()
+        stale = {}
+        with self._lock:
+            for key in set(keys):
+                since = self._since.get(key)
+                if since is None or since > start:
+                    stale[key] = start
+                elif now - self._checked.get(key, 0) >= self.REFRESH_SECONDS:
+                    dates, _ = self._series.get(key, (None, None))
+                    stale[key] = dates[-1].astype(object) if dates is not None and len(dates) else start
+
+        if not stale:
+            return self.version
+
+        fetched = {}
+        stock_keys = [k for k in stale if k.startswith('stock:')]
+        if stock_keys:
+            fetch_from = min(stale[k] for k in stock_keys)
+            symbols = [k.split(':', 1)[1] for k in stock_keys]
+            for symbol, bars in self.stock_service.get_price_history(symbols, fetch_from.isoformat()).items():
+                fetched[f"stock:{symbol}"] = bars
+
+        for key in stale:
+            if key.startswith('crypto:'):
+                days = max((today - stale[key]).days, 1)
+                fetched[key] = self.crypto_service.get_price_history(key.split(':', 1)[1], days)
+
+        with self._lock:
+            changes = {}
+            for key, fetch_from in stale.items():
+                earliest = self._merge(key, fetched.get(key, []))
+                if earliest is not None:
+                    changes[key] = earliest
+                self._since[key] = min(self._since.get(key, fetch_from), fetch_from)
+                self._checked[key] = now
+            if changes:
+                self.version += 1
+                for key, earliest in changes.items():
+                    revisions = self._revisions.setdefault(key, [])
+                    revisions.append((self.version, earliest))
+                    del revisions[:-self.MAX_REVISIONS]
+            return self.version
+
+    def changed_since(self, keys, version):
+        """
+        Earliest bar date changed (added, revised or backfilled) in any of
+        the keys after a cache version.
+        Args:
+            keys (list) - Cache keys
+            version (int) - Version the caller's result was computed at
+        Returns: numpy.datetime64 or None if none of the keys changed;
+                 datetime64.min if the change records don't reach back that far
+        """
+        earliest = None
+        with self._lock:
+            for key in set(keys):
+                revisions = self._revisions.get(key, [])
+                if len(revisions) == self.MAX_REVISIONS and revisions[0][0] > version + 1:
+                    return np.datetime64('0001-01-01', 'D')
+                for revision, day in revisions:
+                    if revision > version and (earliest is None or day < earliest):
+                        earliest = day
+        return earliest
+
+    def _merge(self, key, bars):
+        """
+        Merge (date_str, close) bars into a cached series.
+        Returns: numpy.datetime64 - Earliest date added or changed, or None if nothing changed
+        """
+        if not bars:
+            return None
+        new_dates = np.array([d for d, _ in bars], dtype='datetime64[D]')
+        new_closes = np.array([c for _, c in bars], dtype=float)
+
+        old_dates, old_closes = self._series.get(key, (np.array([], dtype='datetime64[D]'), np.array([])))
+        dates = np.concatenate([old_dates, new_dates])
+        closes = np.concatenate([old_closes, new_closes])
+
+        # Keep the last close seen for each date (fresh bars overwrite cached ones)
+        order = np.argsort(dates, kind='stable')
+        dates, closes = dates[order], closes[order]
+        keep = np.append(dates[1:] != dates[:-1], True)
+        dates, closes = dates[keep], closes[keep]
+
+        # Dates that are new, or whose close differs from the cached one
+        pos = np.minimum(np.searchsorted(old_dates, dates), max(len(old_dates) - 1, 0))
+        known = (old_dates[pos] == dates) if len(old_dates) else np.zeros(len(dates), dtype=bool)
+        differs = ~known | (old_closes[pos] != closes if len(old_closes) else True)
+        if not differs.any():
+            return None
+        self._series[key] = (dates, closes)
+        return dates[differs].min()
+
+    # ========================================================================
+    # MATRICES
+    # ========================================================================
+
+    def matrix(self, keys, start, end):
+        """
+        Daily close matrix on a calendar-day grid, forward-filled across
+        weekends and holidays. The last close before `start` seeds row 0.
+        Args:
+            keys (list) - Cache keys, one column each
+            start (date) - First row
+            end (date) - Last row (inclusive)
+        Returns: (dates ndarray[datetime64[D]], prices ndarray of shape dates x keys)
+        """
+        grid = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+        prices = np.full((len(grid), len(keys)), np.nan)
+
+        with self._lock:
+            for col, key in enumerate(keys):
+                dates, closes = self._series.get(key, (None, None))
+                if dates is None or not len(dates):
+                    continue
+                rows = (dates - grid[0]).astype(int)
+                in_range = (rows >= 0) & (rows < len(grid))
+                prices[rows[in_range], col] = closes[in_range]
+
+                seed = np.searchsorted(dates, grid[0], side='right') - 1
+                if seed >= 0 and np.isnan(prices[0, col]):
+                    prices[0, col] = closes[seed]
+
+        return grid, forward_fill(prices)
+
+    def close_mask(self, keys, start, end):
+        """
+        Which cells of the matrix() grid hold a real (fetched, not filled) close.
+        Args:
+            keys (list) - Cache keys, one column each
+            start (date) - First row
+            end (date) - Last row (inclusive)
+        Returns: bool ndarray of shape dates x keys
+        """
+        grid = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+        mask = np.zeros((len(grid), len(keys)), dtype=bool)
+        with self._lock:
+            for col, key in enumerate(keys):
+                dates, _ = self._series.get(key, (None, None))
+                if dates is None or not len(dates):
+                    continue
+                rows = (dates - grid[0]).astype(int)
+                mask[rows[(rows >= 0) & (rows < len(grid))], col] = True
+        return mask
+
+    def observations(self, keys, start, end):
+        """
+        Number of real (fetched, not filled) daily closes per key in [start, end].
+        Args:
+            keys (list) - Cache keys
+            start (date) - First day counted
+            end (date) - Last day counted (inclusive)
+        Returns: ndarray of int aligned with keys
+        """
+        first, last = np.datetime64(start, 'D'), np.datetime64(end, 'D')
+        counts = np.zeros(len(keys), dtype=int)
+        with self._lock:
+            for col, key in enumerate(keys):
+                dates, _ = self._series.get(key, (None, None))
+                if dates is not None and len(dates):
+                    counts[col] = np.searchsorted(dates, last, side='right') - np.searchsorted(dates, first)
+        return counts
+
+
+def forward_fill(matrix):
+    """
+    Vectorized forward fill of NaNs down each column.
+    Args: matrix (ndarray) - 2-D array
+    Returns: ndarray - Filled copy (leading NaNs stay NaN)
+    """
+    if matrix.size == 0:
+        return matrix.copy()
+    rows = np.arange(matrix.shape[0])[:, None]
+    last_valid = np.where(np.isnan(matrix), 0, rows)
+    np.maximum.accumulate(last_valid, axis=0, out=last_valid)
+    return matrix[last_valid, np.arange(matrix.shape[1])]
+
+
+def date_window(days, today=None):
+    """
+    Inclusive (start, end) dates covering the last `days` days.
+    Args:
+        days (int) - Window length
+        today (date) - Optional end date
+    Returns: tuple of date
+    """
+    end = today or date.today()
+    return end - timedelta(days=days), end
@@ -0,0 +1,166 @@
+"""
+Quote Feed Module
+Purpose: Keep the latest price of watched symbols and publish changes
+Provides: Background quote refresher with change subscriptions
+"""
+
+import math
+import os
+import threading
+import time
+
+
+class QuoteFeed:
+    """
+    Latest-price cache for a watchlist of symbols. A background refresher
+    fetches the watchlist in one batched call per interval, and only quotes
+    that actually moved are published to subscribers. With an empty
+    watchlist the refresher blocks instead of polling. When a scheduler
+    (AdaptivePollScheduler) is given, each cycle fetches only the symbols it
+    says are due, so closed markets and quiet symbols are polled less often.
+    """
+
+    DEFAULT_INTERVAL = float(os.getenv('QUOTE_REFRESH_SECONDS', '15'))
+
+    def __init__(self, price_source, interval=None, scheduler=None):
+        """
+        Args:
+            price_source - Object with get_batch_prices(symbols) -> { symbol: price }
+            interval (float) - Seconds between refreshes (fixed-interval mode)
+            scheduler (AdaptivePollScheduler) - Optional per-symbol poll timetable
+        """
+        self.price_source = price_source
+        self.interval = interval or self.DEFAULT_INTERVAL
+        self.scheduler = scheduler
+        self._prices = {}
+        self._updated = {}
+        self._watched = set()
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    # ========================================================================
+    # SUBSCRIPTIONS & WATCHLIST
+    # ========================================================================
+
+    def subscribe(self, callback):
+        """
+        Register a callback for price changes.
+        Args: callback - Called with { symbol: price } of the quotes that moved
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def watch(self, symbols):
+        """Replace the set of symbols the refresher fetches."""
+        symbols = set(symbols)
+        with self._lock:
+            removed = self._watched - symbols
+            added = symbols - self._watched
+            self._watched = symbols
+        if self.scheduler and removed:
+            self.scheduler.forget(removed)
+        if added:
+            self._wake.set()
+
+    def watched(self):
+        with self._lock:
+            return sorted(self._watched)
+
+    def get(self, symbol):
+        """Latest known price for a symbol, or None."""
+        with self._lock:
+            return self._prices.get(symbol)
+
+    # ========================================================================
+    # PUBLISHING
+    # ========================================================================
+
+    def publish(self, prices):
+        """
+        Record new quotes and notify subscribers about the ones that changed.
+        Args: prices (dict) - { symbol: price }
+        Returns: dict - The quotes that changed
+        """
+        changed = {}
+        now = time.time()
+        with self._lock:
+            for symbol, price in prices.items():
+                if price is None or (isinstance(price, float) and math.isnan(price)):
+                    continue
+                price = float(price)
+                if self._prices.get(symbol) != price:
+                    changed[symbol] = price
+                    self._prices[symbol] = price
+                self._updated[symbol] = now
+            subscribers = list(self._subscribers)
+
+        if changed:
+            for callback in subscribers:
+                try:
+                    callback(changed)
+                except Exception as e:
+                    print(f"Quote subscriber error: {e}")
+        return changed
+
+    def _fetch(self, symbols):
+        try:
+            return self.price_source.get_batch_prices(symbols) or {}
+        except Exception as e:
+            print(f"Quote refresh failed: {e}")
+            return {}
+
+    def refresh(self, symbols=None):
+        """
+        Fetch the given (or all watched) symbols once and publish changes.
+        Returns: dict - The quotes that changed
+        """
+        symbols = sorted(symbols) if symbols is not None else self.watched()
+        if not symbols:
+            return {}
+
+        prices = self._fetch(symbols)
+        if self.scheduler:
+            for symbol in symbols:
+                self.scheduler.record(symbol, prices.get(symbol))
+        return self.publish(prices)
+
+    # ========================================================================
+    # BACKGROUND REFRESHER
+    # ========================================================================
+
+    def start(self):
+        """Start the background refresher thread (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='quote-feed', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            watched = self.watched()
+            if not watched:
+                # Nothing to watch: sleep until watch() adds symbols
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            if self.scheduler:
+                due = self.scheduler.due(watched)
+                if due:
+                    self.refresh(due)
+                timeout = self.scheduler.seconds_until_next(watched)
+            else:
+                self.refresh(watched)
+                timeout = self.interval
+
+            # Newly watched symbols wake the loop early
+            self._wake.wait(timeout)
+            self._wake.clear()
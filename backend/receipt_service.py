@@ -2,9 +2,47 @@ import os
 import google.generativeai as genai
 import json
 import base64
-from typing import Dict, Any, Optional
+import io
+from typing import BinaryIO, Dict, Any, Optional, Tuple, Union
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional: without it images are sent as uploaded
+    Image = None
+
+# Magic-byte signatures of the image formats Gemini accepts
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+HEIF_BRANDS = {b'heic': 'image/heic', b'heix': 'image/heic', b'hevc': 'image/heic',
+               b'mif1': 'image/heif', b'msf1': 'image/heif', b'heif': 'image/heif'}
+
+
+def sniff_mime_type(data: bytes) -> Optional[str]:
+    """
+    Image MIME type from the file's leading bytes (the client's claim is not trusted).
+    Returns: str or None if the format is not recognised
+    """
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[4:8] == b'ftyp':
+        return HEIF_BRANDS.get(data[8:12])
+    return None
+
 
 class ReceiptScanner:
+    # Longest image edge sent to the model; receipt text stays legible at this size
+    MAX_DIMENSION = int(os.getenv('RECEIPT_MAX_DIMENSION', '1600'))
+    JPEG_QUALITY = int(os.getenv('RECEIPT_JPEG_QUALITY', '80'))
+    # Images already this small and in a supported format are sent untouched
+    SKIP_BELOW_BYTES = 200 * 1024
+
     def __init__(self):
         self.api_key = os.getenv('GOOGLE_GEMINI_API_KEY')
         self.use_ai = False
@@ -18,16 +56,73 @@ class ReceiptScanner:
             except Exception as e:
                 print(f"⚠️ Receipt Scanner init failed: {e}")
 
-    def scan_receipt(self, base64_image: str) -> Optional[Dict[str, Any]]:
+    def prepare_image(self, image: Union[bytes, BinaryIO]) -> Tuple[bytes, str, Dict[str, Any]]:
+        """
+        Shrink a receipt photo before upload: sniff the real format, apply the
+        EXIF orientation, convert to grayscale, downscale to MAX_DIMENSION and
+        recompress as JPEG. Falls back to the original bytes when Pillow is
+        missing, the format can't be decoded, or the result would be larger.
+        Args: image (bytes or seekable file) - Uploaded image; a file is decoded
+              in place without reading it all into memory first
+        Returns: tuple - (image bytes, mime type, stats with before/after sizes)
+        """
+        source = io.BytesIO(image) if isinstance(image, (bytes, bytearray)) else image
+        source.seek(0, os.SEEK_END)
+        original_bytes = source.tell()
+        source.seek(0)
+        mime_type = sniff_mime_type(source.read(16))
+        source.seek(0)
+        stats = {'original_bytes': original_bytes, 'original_type': mime_type,
+                 'bytes': original_bytes, 'type': mime_type, 'processed': False}
+        if mime_type is None:
+            raise ValueError('Unsupported image format')
+        # GIF is always converted: the model doesn't take it
+        if Image is None or (original_bytes < self.SKIP_BELOW_BYTES and mime_type != 'image/gif'):
+            return source.read(), mime_type, stats
+
+        try:
+            with Image.open(source) as image:
+                stats['original_size'] = list(image.size)
+                # JPEG decodes at a reduced scale directly (much faster than full size, then resize)
+                image.draft('L', (self.MAX_DIMENSION, self.MAX_DIMENSION))
+                image = ImageOps.exif_transpose(image).convert('L')
+                image.thumbnail((self.MAX_DIMENSION, self.MAX_DIMENSION), Image.LANCZOS)
+                output = io.BytesIO()
+                image.save(output, format='JPEG', quality=self.JPEG_QUALITY, optimize=True)
+                stats['size'] = list(image.size)
+        except Exception as e:
+            print(f"⚠️ Receipt preprocessing skipped ({mime_type}): {e}")
+            source.seek(0)
+            return source.read(), mime_type, stats
+
+        processed = output.getvalue()
+        if len(processed) >= original_bytes:
+            source.seek(0)
+            return source.read(), mime_type, stats
+        stats.update({'bytes': len(processed), 'type': 'image/jpeg', 'processed': True})
+        return processed, 'image/jpeg', stats
+
+    def scan_receipt(self, image: Union[str, bytes, BinaryIO]) -> Optional[Dict[str, Any]]:
+        """
+        Args: image - Base64 string (optionally a data URI), raw bytes, or a
+              seekable file such as a spooled upload
+        """
         if not self.use_ai:
             return {"error": "AI Scanner not initialized. Check API key."}
 
         try:
-            # Clean up the base64 string if it contains the data URI prefix
-            if ',' in base64_image:
-                base64_image = base64_image.split(',')[1]
+            if isinstance(image, str):
+                # Clean up the base64 string if it contains the data URI prefix
+                if ',' in image:
+                    image = image.split(',')[1]
+                image = base64.b64decode(image)
 
-            image_data = base64.b64decode(base64_image)
+            try:
+                image_data, mime_type, image_stats = self.prepare_image(image)
+            except ValueError as e:
+                return {"error": str(e)}
+            print(f"🧾 Receipt image: {image_stats['original_bytes'] / 1024:.0f} KB {image_stats['original_type']} -> "
+                  f"{image_stats['bytes'] / 1024:.0f} KB {image_stats['type']}")
 
             prompt = """
             Analyze this receipt image and extract the following information. 
@@ -48,7 +143,7 @@ class ReceiptScanner:
 
             response = self.model.generate_content([
                 prompt,
-                {"mime_type": "image/jpeg", "data": image_data}
+                {"mime_type": mime_type, "data": image_data}
             ])
             
             # Clean up potential markdown formatting in the response
@@ -64,6 +159,8 @@ class ReceiptScanner:
             
             try:
                 parsed_data = json.loads(response_text)
+                if isinstance(parsed_data, dict):
+                    parsed_data['image'] = image_stats
                 return parsed_data
             except json.JSONDecodeError as e:
                 print(f"Error parsing Gemini response as JSON: {response_text}")
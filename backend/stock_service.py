@@ -8,6 +8,7 @@ import yfinance as yf
 import pandas as pd
 from datetime import datetime
 import logging
+from portfolio_engine import PortfolioValuation
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -175,26 +176,12 @@ class StockService:
         Returns: dict with total investment, current value, profit/loss
         """
         try:
-            total_investment = 0
-            total_current_value = 0
-            total_profit_loss = 0
-            
-            for stock in stocks:
-                investment = stock['quantity'] * stock['buy_price']
-                current_value = stock['quantity'] * stock['current_price']
-                
-                total_investment += investment
-                total_current_value += current_value
-                total_profit_loss += (current_value - investment)
-            
+            metrics = PortfolioValuation.from_holdings(stocks=stocks).totals()
             return {
-                'total_investment': round(total_investment, 2),
-                'total_current_value': round(total_current_value, 2),
-                'total_profit_loss': round(total_profit_loss, 2),
-                'profit_loss_percentage': round(
-                    (total_profit_loss / total_investment * 100) if total_investment > 0 else 0,
-                    2
-                )
+                'total_investment': metrics['total_investment'],
+                'total_current_value': metrics['total_current_value'],
+                'total_profit_loss': metrics['total_profit_loss'],
+                'profit_loss_percentage': metrics['profit_loss_percentage']
             }
         
         except Exception as e:
@@ -256,3 +243,39 @@ class StockService:
                     prices[symbol] = p
                     
         return prices
+
+    def get_price_history(self, symbols, start):
+        """
+        Fetch daily closes for several symbols in one batched download.
+        Args:
+            symbols (list) - Stock symbols
+            start (str) - First date to fetch (YYYY-MM-DD)
+        Returns: dict - { symbol: [(date_str, close), ...] }
+        """
+        history = {}
+        if not symbols:
+            return history
+
+        try:
+            data = yf.download(symbols, start=start, interval='1d', group_by='ticker', progress=False)
+        except Exception as e:
+            logger.error(f"History download failed for {symbols}: {e}")
+            return history
+
+        if data is None or data.empty:
+            return history
+
+        for symbol in symbols:
+            try:
+                if isinstance(data.columns, pd.MultiIndex):
+                    if symbol not in data.columns.get_level_values(0):
+                        continue
+                    closes = data[symbol]['Close']
+                else:
+                    closes = data['Close']
+                closes = closes.dropna()
+                history[symbol] = [(idx.strftime('%Y-%m-%d'), float(close)) for idx, close in closes.items()]
+            except Exception:
+                continue
+
+        return history
@@ -0,0 +1,59 @@
+from alert_index import AlertIndex
+
+
+def alert(alert_id, alert_type, value, symbol='AAPL', user_id='u1', **extra):
+    return {'id': alert_id, 'user_id': user_id, 'symbol': symbol, 'type': alert_type, 'value': value, **extra}
+
+
+def crossed_ids(index, symbol, price):
+    return sorted(a['id'] for a in index.crossed(symbol, price))
+
+
+print("Testing AlertIndex.crossed...")
+index = AlertIndex()
+index.rebuild([
+    alert('t100', 'target', 100),
+    alert('t150', 'target', 150),
+    alert('t200', 'target', 200),
+    alert('b90', 'below', 90),
+    alert('b50', 'below', 50),
+    alert('other', 'target', 10, symbol='MSFT'),
+    alert('done', 'target', 1, triggered=True),
+    alert('pl', 'profit', 5),
+])
+assert len(index) == 6, len(index)
+
+# Between the two sides nothing is crossed
+assert crossed_ids(index, 'AAPL', 95) == []
+# 'target' alerts trigger at or above their value, lowest thresholds first
+assert crossed_ids(index, 'AAPL', 100) == ['t100']
+assert crossed_ids(index, 'AAPL', 175) == ['t100', 't150']
+assert crossed_ids(index, 'AAPL', 1000) == ['t100', 't150', 't200']
+# 'below' alerts trigger at or below their value
+assert crossed_ids(index, 'AAPL', 90) == ['b90']
+assert crossed_ids(index, 'AAPL', 10) == ['b50', 'b90']
+# Symbols are matched case- and whitespace-insensitively, and never across symbols
+assert crossed_ids(index, ' aapl ', 120) == ['t100']
+assert crossed_ids(index, 'MSFT', 95) == ['other']
+assert crossed_ids(index, 'TSLA', 95) == []
+print("✓ Above/below thresholds bisected correctly")
+
+# Removed and re-added alerts move to their new threshold
+assert index.remove('u1', 't100')
+assert crossed_ids(index, 'AAPL', 120) == []
+index.add(alert('t150', 'target', 110))
+assert crossed_ids(index, 'AAPL', 120) == ['t150']
+assert crossed_ids(index, 'AAPL', 1000) == ['t150', 't200']
+print("✓ Removals and updates reflected")
+
+# Same alert id under two users is two alerts
+index.add(alert('t200', 'target', 200, user_id='u2'))
+assert sorted(a['user_id'] for a in index.crossed('AAPL', 200) if a['id'] == 't200') == ['u1', 'u2']
+print("✓ Alerts keyed per user")
+
+# Nearest pending threshold, relative to the price
+assert abs(index.nearest_distance('AAPL', 100) - 0.1) < 1e-12
+assert index.nearest_distance('TSLA', 100) is None
+print("✓ nearest_distance")
+
+print("All AlertIndex checks passed")
@@ -0,0 +1,44 @@
+import tempfile
+
+from ai_categorizer import ExpenseCategorizer
+from category_cache import CategoryCache
+from firebase_service import FirebaseService
+from merchant_classifier import MerchantClassifier
+
+print("Testing manual category corrections...")
+store = FirebaseService(credentials_path='missing-credentials.json', local_path=':memory:')
+model_dir = tempfile.mkdtemp(prefix='merchant_models_')
+categorizer = ExpenseCategorizer(cache=CategoryCache(':memory:'), classifier=MerchantClassifier(),
+                                 rule_store=store, user_model_dir=model_dir)
+
+# Exact corrections never leak into other merchants or other users
+assert categorizer.categorize('amazon.com', 'alice') == 'Shopping'
+categorizer.record_correction('OM', 'Food', user_id='alice')
+assert categorizer.categorize('om*4821', 'alice') == 'Food'
+assert categorizer.categorize('amazon.com', 'alice') == 'Shopping'
+assert categorizer.categorize('OM', 'bob') != 'Food'
+print("✓ Corrections match the exact merchant, per user")
+
+# Corrections train the user's own model: a new spelling of a merchant the
+# user keeps correcting is predicted from the corrections, not the defaults
+unseen = 'KIRANA - SHARMA BROS'
+before = categorizer._user_model('alice').predict(unseen)
+for merchant in ('Sharma Bros Kirana', 'Sharma Bros Kirana Store', 'Sharma Bros Kirana Bandra'):
+    categorizer.record_correction(merchant, 'Food', user_id='alice')
+for merchant in ('Metro Cash Carry', 'Metro Cash Carry Thane'):
+    categorizer.record_correction(merchant, 'Shopping', user_id='alice')
+
+after = categorizer._user_model('alice').predict(unseen)
+assert after[0] == 'Food' and after[1] >= MerchantClassifier.MIN_CONFIDENCE, (before, after)
+assert before[0] is None, before
+assert categorizer.categorize(unseen, 'alice') == 'Food'
+assert categorizer._user_model('bob').predict(unseen) == (None, 0.0)
+print(f"✓ Correction model prediction changed: {before} -> {after}")
+
+# The model is persisted per user
+reloaded = ExpenseCategorizer(cache=CategoryCache(':memory:'), classifier=MerchantClassifier(),
+                              rule_store=store, user_model_dir=model_dir)
+assert reloaded._user_model('alice').predict(unseen)[0] == 'Food'
+print("✓ Correction model reloaded from disk")
+
+print("All correction checks passed")
@@ -0,0 +1,47 @@
+from alert_monitor import AlertMonitor
+from firebase_service import FirebaseService
+
+
+class StubStocks:
+    """yfinance stand-in: 'BTC' resolves to an unrelated USD listing."""
+    def __init__(self):
+        self.requested = []
+
+    def get_batch_prices(self, symbols):
+        self.requested.extend(symbols)
+        return {symbol: 40.0 if symbol == 'BTC' else 190.0 for symbol in symbols}
+
+
+class StubCrypto:
+    """CoinGecko stand-in, INR prices by coin_id."""
+    def get_batch_prices(self, coin_ids):
+        return {coin_id: 5_600_000.0 for coin_id in coin_ids if coin_id == 'bitcoin'}
+
+
+print("Testing portfolio alerts on a crypto holding...")
+store = FirebaseService(credentials_path='missing-credentials.json', local_path=':memory:')
+btc = store.add_crypto({'symbol': 'BTC', 'coin_id': 'bitcoin', 'quantity': 0.01,
+                        'buy_price': 5_000_000.0, 'current_price': 5_000_000.0})
+aapl = store.add_stock({'symbol': 'AAPL', 'quantity': 1, 'buy_price': 150.0, 'current_price': 150.0})
+for alert_type, value, investment, symbol in (('loss', 10, btc, 'BTC'), ('profit', 5, btc, 'BTC'),
+                                              ('profit', 20, aapl, 'AAPL')):
+    store.add_alert({'investmentId': investment, 'symbol': symbol, 'type': alert_type,
+                     'value': value, 'triggered': False})
+
+stocks = StubStocks()
+monitor = AlertMonitor(store, stocks, notifier=lambda messages: [True] * len(messages),
+                       crypto_source=StubCrypto())
+monitor.load_index()
+
+assert monitor.asset_class('BTC') == 'crypto' and monitor.coin_id('btc') == 'bitcoin'
+prices = monitor.quotes.get_batch_prices(monitor.symbols())
+assert prices == {'BTC': 5_600_000.0, 'AAPL': 190.0}, prices
+assert 'BTC' not in stocks.requested, stocks.requested
+print("✓ Crypto symbols priced by coin_id, stocks by ticker")
+
+triggered = sorted((a['symbol'], a['type']) for a in monitor.evaluate(prices))
+# BTC is up 12% in INR: the profit alert fires, the loss alert must not
+assert triggered == [('AAPL', 'profit'), ('BTC', 'profit')], triggered
+print("✓ Crypto profit/loss evaluated against the coin's INR price")
+
+print("All crypto alert checks passed")
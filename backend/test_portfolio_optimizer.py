@@ -0,0 +1,124 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from portfolio_analytics import PortfolioAnalytics
+from portfolio_optimizer import (
+    check_bounds, mean_variance_weights, project_capped_simplex, risk_parity_weights,
+)
+from price_history import PriceHistoryService
+
+TOL = 1e-6
+
+
+def assert_weights(w, lower=0.0, upper=1.0, label=''):
+    assert abs(w.sum() - 1) < TOL, f"{label}: weights sum to {w.sum()}"
+    assert (w >= lower - TOL).all() and (w <= upper + TOL).all(), f"{label}: {w} outside [{lower}, {upper}]"
+
+
+def random_problem(rng, n):
+    returns = rng.normal(0.0005, 0.01, (250, n)) * rng.uniform(0.5, 2.0, n)
+    return returns.mean(axis=0) * 252, np.cov(returns, rowvar=False) * 252
+
+
+# ============================================================================
+# SOLVERS
+# ============================================================================
+
+print("Testing optimizer constraints...")
+rng = np.random.default_rng(7)
+for trial in range(20):
+    n = int(rng.integers(2, 12))
+    mu, cov = random_problem(rng, n)
+    lower = float(rng.uniform(0, 0.5 / n))
+    upper = float(rng.uniform(1.5 / n, 1.0))
+
+    assert_weights(project_capped_simplex(rng.normal(0, 1, n), lower, upper), lower, upper, 'projection')
+    assert_weights(mean_variance_weights(mu, cov, 3.0), label='mean_variance')
+    assert_weights(mean_variance_weights(mu, cov, 3.0, lower, upper), lower, upper, 'mean_variance bounded')
+
+    w = risk_parity_weights(cov)
+    assert_weights(w, label='risk_parity')
+    contributions = w * (cov @ w)
+    assert np.allclose(contributions / contributions.sum(), 1 / n, atol=1e-6), 'risk contributions not equal'
+print("✓ Weights sum to 1 and respect bounds (20 random problems)")
+
+for n, lower, upper in ((4, 0.3, 1.0), (4, 0.0, 0.2), (3, 0.5, 0.4), (3, -0.1, 0.5), (2, 0.0, 1.5)):
+    try:
+        check_bounds(n, lower, upper)
+    except ValueError:
+        continue
+    raise AssertionError(f"check_bounds accepted infeasible bounds {n} x [{lower}, {upper}]")
+check_bounds(4, 0.25, 0.25)
+print("✓ Infeasible bounds rejected")
+
+
+# ============================================================================
+# REBALANCE (stubbed price history, no network)
+# ============================================================================
+
+class StubStocks:
+    """Daily closes for every symbol starting with 'S'; nothing for the rest."""
+    def get_price_history(self, symbols, start):
+        rng = np.random.default_rng(1)
+        first = date.fromisoformat(start)
+        days = (date.today() - first).days + 1
+        history = {}
+        for i, symbol in enumerate(symbols):
+            if symbol.startswith('S'):
+                closes = 100 * np.exp(np.cumsum(rng.normal(0.0005, 0.01 + 0.005 * i, days)))
+                history[symbol] = [((first + timedelta(k)).isoformat(), float(closes[k])) for k in range(days)]
+        return history
+
+
+class StubCrypto:
+    def get_price_history(self, coin_id, days):
+        return []
+
+
+stocks = [{'symbol': f'S{i}', 'quantity': 10, 'buy_price': 100, 'current_price': 100, 'date': '2025-01-01'}
+          for i in range(5)]
+stocks.append({'symbol': 'NEWIPO', 'quantity': 10, 'buy_price': 100, 'current_price': 100, 'date': '2025-01-01'})
+cryptos = [{'symbol': 'BTC', 'coin_id': 'bitcoin', 'quantity': 0.01, 'buy_price': 50000,
+            'current_price': 60000, 'date': '2025-01-01'}]
+analytics = PortfolioAnalytics(PriceHistoryService(StubStocks(), StubCrypto()))
+
+print("\nTesting rebalance with missing history...")
+for method, bounds in (('mean_variance', {}), ('risk_parity', {}),
+                       ('mean_variance', {'min_weight': 0.05, 'max_weight': 0.2}),
+                       ('risk_parity', {'min_weight': 0.05, 'max_weight': 0.2})):
+    result = analytics.rebalance(stocks, cryptos, method=method, **bounds)
+    weights = {w['symbol']: w for w in result['weights']}
+    target = np.array([w['target_weight'] for w in result['weights']])
+
+    assert sorted(result['excluded']) == ['NEWIPO', 'bitcoin'], result['excluded']
+    for symbol in result['excluded']:
+        assert weights[symbol]['target_weight'] == weights[symbol]['current_weight'], symbol
+        assert weights[symbol]['observations'] < PortfolioAnalytics.MIN_OBSERVATIONS
+        assert not any(t['symbol'] == symbol for t in result['trades']), f"{symbol} was traded"
+    assert abs(target.sum() - 1) < 1e-3, target.sum()
+
+    covered = [w['target_weight'] for w in result['weights'] if w['symbol'] not in result['excluded']]
+    assert abs(sum(covered) - result['optimized_share']) < 1e-3
+    lower, upper = bounds.get('min_weight', 0.0), bounds.get('max_weight', 1.0)
+    assert all(lower - 1e-3 <= w <= upper + 1e-3 for w in covered), covered
+    print(f"✓ {method} {bounds or '(unbounded)'}: excluded {result['excluded']}, bounds respected")
+
+for method in ('mean_variance', 'risk_parity'):
+    for bounds in ({'min_weight': -0.1}, {'max_weight': 1.5}, {'min_weight': 0.3, 'max_weight': 0.2}):
+        try:
+            analytics.rebalance(stocks, cryptos, method=method, **bounds)
+        except ValueError:
+            continue
+        raise AssertionError(f"{method} accepted invalid bounds {bounds}")
+print("✓ Invalid weight bounds rejected by every method")
+
+no_history = [{'symbol': 'NEWIPO', 'quantity': 1, 'buy_price': 10, 'current_price': 10, 'date': '2025-01-01'}]
+try:
+    analytics.rebalance(no_history, [])
+except ValueError as e:
+    print(f"✓ Rebalance without any history refused: {e}")
+else:
+    raise AssertionError("rebalance accepted a portfolio with no price history")
+
+print("\nAll optimizer checks passed")
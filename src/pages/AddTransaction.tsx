@@ -159,57 +159,42 @@ export default function AddTransaction() {
     });
 
     try {
-      const reader = new FileReader();
-      reader.onloadend = async () => {
-        const base64String = reader.result as string;
+      // Upload the file as multipart form data (no base64 inflation)
+      const formData = new FormData();
+      formData.append('image', file);
 
-        try {
-          // Send to our new backend endpoint using the centralized API_BASE_URL
-          const response = await fetch(`${API_BASE_URL}/receipt/scan`, {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ image_base64: base64String }),
-          });
+      const response = await fetch(`${API_BASE_URL}/receipt/scan`, {
+        method: 'POST',
+        body: formData,
+      });
 
-          const data = await response.json();
-
-          if (data.success && data.data) {
-            const result = data.data;
-            setType('expense');
-            if (result.merchant) setTitle(result.merchant);
-            if (result.amount) setAmount(result.amount.toString());
-            if (result.date) setDate(result.date);
-            if (result.category) setCategory(result.category);
-
-            toast({
-              title: 'Scan Complete! ✨',
-              description: 'We filled in what we could find. Please verify the details.',
-            });
-          } else {
-            throw new Error(data.message || 'Failed to scan receipt');
-          }
-        } catch (error: any) {
-          toast({
-            title: 'Scan Failed',
-            description: error.message || 'Could not process the receipt image.',
-            variant: 'destructive',
-          });
-        } finally {
-          setIsScanning(false);
-          if (fileInputRef.current) fileInputRef.current.value = '';
-          if (cameraInputRef.current) cameraInputRef.current.value = '';
-        }
-      };
-      reader.readAsDataURL(file);
-    } catch (error) {
-      setIsScanning(false);
+      const data = await response.json();
+
+      if (data.success && data.data) {
+        const result = data.data;
+        setType('expense');
+        if (result.merchant) setTitle(result.merchant);
+        if (result.amount) setAmount(result.amount.toString());
+        if (result.date) setDate(result.date);
+        if (result.category) setCategory(result.category);
+
+        toast({
+          title: 'Scan Complete! ✨',
+          description: 'We filled in what we could find. Please verify the details.',
+        });
+      } else {
+        throw new Error(data.message || 'Failed to scan receipt');
+      }
+    } catch (error: any) {
       toast({
-        title: 'Error',
-        description: 'Failed to read the file.',
+        title: 'Scan Failed',
+        description: error.message || 'Could not process the receipt image.',
         variant: 'destructive',
       });
+    } finally {
+      setIsScanning(false);
+      if (fileInputRef.current) fileInputRef.current.value = '';
+      if (cameraInputRef.current) cameraInputRef.current.value = '';
     }
   };
 